@@ -0,0 +1,143 @@
+# Attendance held as a columnar AttendanceStore against the previous layout, an entry object per tap
+# kept in both AppData.attendance_data and the staff member's list.
+import gc
+import time
+import pickle
+import argparse
+import tracemalloc
+from dataclasses import dataclass
+from common import make_app_data, make_staff
+import numpy as np
+from models.collection_data_models import Teacher, Prefect, Time, local_months, local_timestamps
+from others import DAYS_OF_THE_WEEK, MONTHS_OF_THE_YEAR
+
+MONTHS = list(MONTHS_OF_THE_YEAR)
+
+
+@dataclass
+class LegacyEntry:
+    # AttendanceEntry's fields before the store
+    time: Time
+    day: str
+    date: int
+    month: str
+    year: int
+    staff: Teacher | Prefect
+    reader: str | None = None
+
+
+def traced(build):
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    
+    return result, size
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - start
+
+def main(taps: int, staff_count: int):
+    base = int(time.mktime((2025, 1, 6, 7, 0, 0, 0, 0, -1)))
+    stamps = [base + index * 137 for index in range(taps)]
+    
+    def build_lists():
+        teachers, prefects = make_staff(staff_count)
+        staff = [*teachers.values(), *prefects.values()]
+        entries = []
+        for index, timestamp in enumerate(stamps):
+            local = time.localtime(timestamp)
+            entry = LegacyEntry(Time(local.tm_hour, local.tm_min, local.tm_sec), DAYS_OF_THE_WEEK[local.tm_wday], local.tm_mday, MONTHS[local.tm_mon - 1], local.tm_year, staff[index % staff_count], "gate-1")
+            entries.append(entry)
+            entry.staff.attendance.append(entry)
+        
+        return entries, staff
+    
+    teachers, prefects = make_staff(staff_count)
+    staff = [*teachers.values(), *prefects.values()]
+    data = make_app_data(teachers, prefects)
+    
+    def build_store():
+        for index, timestamp in enumerate(stamps):
+            data.add_attendance(staff[index % staff_count], timestamp, "gate-1")
+    
+    (entries, legacy_staff), list_memory = traced(build_lists)
+    _, store_memory = traced(build_store)
+    
+    appender = make_app_data(*make_staff(staff_count))
+    appender_staff = [*appender.teachers.values(), *appender.prefects.values()]
+    _, append = timed(lambda: [appender.add_attendance(appender_staff[index % staff_count], timestamp, "gate-1") for index, timestamp in enumerate(stamps)])
+    
+    print(f"{taps} taps over {staff_count} staff")
+    print(f"  memory       entries in both lists {list_memory / taps:5.0f} B/tap, store {store_memory / taps:5.1f} B/tap")
+    print(f"  pickle       lists {len(pickle.dumps((entries, legacy_staff))) / taps:5.1f} B/tap, store {len(pickle.dumps(data)) / taps:5.1f} B/tap")
+    print(f"  append       {append / taps * 1e6:.2f} us/tap through add_attendance, including the returned entry")
+    
+    march = int(time.mktime((2025, 3, 1, 0, 0, 0, 0, 0, -1))), int(time.mktime((2025, 4, 1, 0, 0, 0, 0, 0, -1)))
+    timestamps = data.attendance_data.column("timestamp")
+    counts = [
+        timed(lambda: sum(1 for entry in entries if entry.month == "March")),
+        timed(lambda: sum(1 for entry in data.attendance_data if entry.month == "March")),
+        timed(lambda: int(((timestamps >= march[0]) & (timestamps < march[1])).sum())),
+    ]
+    assert len({count for count, _ in counts}) == 1
+    print(f"  March taps   {counts[0][0]}: prebuilt entries {counts[0][1] * 1e3:.1f} ms, lazy entries {counts[1][1] * 1e3:.1f} ms, timestamp column {counts[2][1] * 1e3:.2f} ms")
+    
+    old_dates, old_time = timed(lambda: [entry.date for entry in legacy_staff[7].attendance])
+    new_dates, new_time = timed(lambda: [entry.date for entry in staff[7].attendance])
+    assert old_dates == new_dates
+    print(f"  one staff    {len(new_dates)} taps: list {old_time * 1e3:.2f} ms, view {new_time * 1e3:.2f} ms")
+    
+    # Every staff page asks for its rows again after a tap comes in
+    _, first = timed(lambda: [len(member.attendance) for member in staff])
+    data.add_attendance(staff[0], stamps[-1] + 60, "gate-1")
+    _, again = timed(lambda: [len(member.attendance) for member in staff])
+    print(f"  all views    {staff_count} views: first read {first * 1e3:.1f} ms, again after one more tap {again * 1e3:.1f} ms")
+    
+    # What the attendance, punctuality and staff pages compute, through the entries and through the columns
+    def weekly_entries(member):
+        weeks = {}
+        for entry in member.attendance:
+            week = (entry.day_number + 3) // 7
+            weeks[week] = weeks.get(week, 0) + (7 - entry.time.hour) * 60 - entry.time.min
+        return list(weeks.values())
+    
+    def weekly_columns():
+        local = local_timestamps(data.attendance_data.column("timestamp"))
+        
+        results = []
+        for member in staff:
+            staff_local = local[member.attendance.rows()]
+            weeks = (staff_local // 86400 + 3) // 7
+            minutes = (7 - staff_local % 86400 // 3600) * 60 - staff_local % 3600 // 60
+            results.append(np.add.reduceat(minutes, np.flatnonzero(np.diff(weeks, prepend=weeks[0] - 1))).tolist())
+        
+        return results
+    
+    def monthly_entries(member):
+        months = {}
+        for entry in member.attendance:
+            months[(entry.year, entry.month_number)] = months.get((entry.year, entry.month_number), 0) + 1
+        return list(months.values())
+    
+    aggregations = [
+        ("tap counts  ", lambda: [len(list(member.attendance)) for member in staff], lambda: data.attendance_data.counts()[[member.attendance.staff_index for member in staff]].tolist()),
+        ("weekly      ", lambda: [weekly_entries(member) for member in staff], weekly_columns),
+        ("one month   ", lambda: monthly_entries(staff[7]), lambda: np.unique(local_months(local_timestamps(staff[7].attendance.timestamps())), return_counts=True)[1].tolist()),
+    ]
+    for label, through_entries, through_columns in aggregations:
+        (old, old_time), (new, new_time) = timed(through_entries), timed(through_columns)
+        assert old == new
+        print(f"  {label} entries {old_time * 1e3:7.1f} ms, columns {new_time * 1e3:6.1f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Columnar attendance store vs per-tap entry lists")
+    parser.add_argument("--taps", type=int, default=200_000)
+    parser.add_argument("--staff", type=int, default=500)
+    args = parser.parse_args()
+    
+    main(args.taps, args.staff)
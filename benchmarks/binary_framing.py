@@ -0,0 +1,53 @@
+# Bytes on the wire and frames/s per baud rate for text and binary framing, and decode time of each.
+import random
+import timeit
+import common  # Puts the repo root on sys.path
+from communication import BinaryFrameDecoder, encode_binary_frame, parse_frame
+
+BAUD_RATES = [9600, 119500, 336000, 7844000]  # SetupScreen's choices
+BITS_PER_BYTE = 10  # 8N1
+
+
+def text_value(value: str | float | list):
+    if isinstance(value, str):
+        return f"str({value})"
+    if isinstance(value, list):
+        return "collection(" + ",".join(map(text_value, value)) + ")"
+    return f"number({value:g})"
+
+def text_line(frame: dict):
+    # As the readers send it, CRLF terminated with a trailing separator
+    return ("|".join(f"{name}:{text_value(value)}" for name, value in frame.items()) + "|\r\n").encode()
+
+def decode_text(line: bytes):
+    return parse_frame(line.decode().strip().removesuffix("|").strip())
+
+def decode_binary(frame: bytes):
+    return BinaryFrameDecoder().feed(frame)[0]
+
+def main():
+    rng = random.Random(0)
+    angles = [float(angle) for angle in range(180)]
+    frames = {
+        "IUD": {"IUD": "04A3B2C1D0"},
+        "Gas+Fire": {"Gas": 312.0, "Fire": 0.0},
+        "sonar 180pt": {"angles": angles, "distances": [round(rng.uniform(2, 60), 1) for _ in angles]},
+    }
+    
+    print(f"{'frame':12s} {'text':>7s} {'binary':>7s}  " + "  ".join(f"{baud:>16d}" for baud in BAUD_RATES) + "   frames/s text->binary")
+    for name, frame in frames.items():
+        text, binary = text_line(frame), encode_binary_frame(frame)
+        rates = "  ".join(f"{baud / BITS_PER_BYTE / len(text):>7.1f}->{baud / BITS_PER_BYTE / len(binary):<7.1f}" for baud in BAUD_RATES)
+        print(f"{name:12s} {len(text):5d} B {len(binary):5d} B  {rates}")
+    
+    sonar = frames["sonar 180pt"]
+    text, binary = text_line(sonar), encode_binary_frame(sonar)
+    assert decode_text(text) == sonar and decode_binary(binary)["angles"] == angles
+    
+    for name, func, data in (("text", decode_text, text), ("binary", decode_binary, binary)):
+        best = min(timeit.repeat(lambda: func(data), number=500, repeat=5)) / 500 * 1e6
+        print(f"decode a 180-point sweep, {name:6s} {best:7.1f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+# A worker thread floods coalesced sonar and Gas data points while the sonar slot takes as long
+# as a matplotlib redraw; counts what reaches the GUI thread.
+import time
+import argparse
+import threading
+import common  # Puts the repo root on sys.path
+from PyQt6.QtCore import QCoreApplication, QObject, QTimer, pyqtSignal
+from communication import DataPointRouter
+
+
+class Hub(QObject):
+    sonar = pyqtSignal(list)
+    gas = pyqtSignal(float)
+
+
+def main(frames: int, interval: float, slot_time: float):
+    app = QCoreApplication.instance() or QCoreApplication([])
+    hub = Hub()
+    
+    received = {"sonar": 0, "gas": 0}
+    last = {}
+    
+    def on_sonar(value: list):
+        received["sonar"] += 1
+        last["sonar"] = value
+        time.sleep(slot_time)
+    
+    def on_gas(value: float):
+        received["gas"] += 1
+        last["gas"] = value
+    
+    hub.sonar.connect(on_sonar)
+    hub.gas.connect(on_gas)
+    
+    router = DataPointRouter()
+    router.set_data_point(("angles", "distances"), hub.sonar, coalesce=True)
+    router.set_data_point("Gas", hub.gas, coalesce=True)
+    
+    def feed():
+        for index in range(frames):
+            router.dispatch({"angles": [index], "distances": [index], "Gas": float(index)}, "")
+            time.sleep(interval)
+    
+    feeder = threading.Thread(target=feed, daemon=True)
+    start = time.perf_counter()
+    feeder.start()
+    
+    def check():
+        if feeder.is_alive() or router.coalescer.pending:
+            QTimer.singleShot(50, check)
+        else:
+            app.quit()
+    
+    QTimer.singleShot(50, check)
+    app.exec()
+    elapsed = time.perf_counter() - start
+    
+    print(f"{frames} frames of each topic over {elapsed:.1f} s, sonar slot {slot_time * 1e3:.0f} ms")
+    for topic, stats in router.coalescer.stats().items():
+        print(f"  {topic:18s} delivered {stats['delivered']:5d}  merged {stats['merged']:5d}")
+    print(f"  last values delivered: sonar {last['sonar'][0][0]}, Gas {last['gas']:g} (sent {frames - 1})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Delivery counts through the coalescing data points")
+    parser.add_argument("--frames", type=int, default=2000)
+    parser.add_argument("--interval", type=float, default=0.001, help="seconds between frames from the worker")
+    parser.add_argument("--slot-time", type=float, default=0.03, help="seconds the sonar slot takes")
+    args = parser.parse_args()
+    
+    main(args.frames, args.interval, args.slot_time)
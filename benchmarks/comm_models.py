@@ -0,0 +1,77 @@
+# Thread per reader against the shared asyncio engine: N pty readers sending timestamped frames,
+# timed to the data-point emit.
+import os
+import time
+import argparse
+import resource
+import threading
+from common import drive, open_pty, os_threads, percentile, stop_readers
+from PyQt6.QtCore import QCoreApplication, QObject, Qt, pyqtSignal
+from communication import AsyncCommEngine, BaseCommSystem, CommDevice
+from models.data_models import LiveData
+
+
+class Hub(QObject):
+    raw = pyqtSignal(dict)
+    connection_changed = pyqtSignal(bool)
+    stamp = pyqtSignal(str)
+
+
+def run(shared_loop: bool, readers: int, rate: float, seconds: float):
+    app = QCoreApplication.instance() or QCoreApplication([])
+    hub = Hub()
+    engine = AsyncCommEngine() if shared_loop else None
+    
+    latencies = []
+    lock = threading.Lock()
+    
+    def on_stamp(sent: str):
+        latency = time.perf_counter() - float(sent)
+        with lock:
+            latencies.append(latency * 1e6)
+    
+    hub.stamp.connect(on_stamp, Qt.ConnectionType.DirectConnection)
+    
+    ptys, comm_systems = [], []
+    for _ in range(readers):
+        master, slave, port = open_pty()
+        ptys.append((master, slave))
+        
+        comm_system = BaseCommSystem(CommDevice(LiveData(hub.raw), hub.connection_changed, port, None, 115200), print)
+        comm_system.init_wait = 0
+        comm_system.set_serial(True)
+        comm_system.set_engine(engine)
+        comm_system.set_data_point("T", hub.stamp)
+        comm_system.start_connection()
+        comm_systems.append(comm_system)
+    
+    time.sleep(0.5)
+    threads = os_threads()
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    start = time.perf_counter()
+    
+    drive([master for master, _ in ptys], rate, seconds, lambda index: f"T:str({time.perf_counter()!r})|\n".encode())
+    time.sleep(0.3)
+    
+    end = resource.getrusage(resource.RUSAGE_SELF)
+    cpu = (end.ru_utime + end.ru_stime - usage.ru_utime - usage.ru_stime) / (time.perf_counter() - start) * 100
+    
+    stop_readers(comm_systems, engine)
+    app.processEvents()
+    for master, slave in ptys:
+        os.close(master)
+        os.close(slave)
+    
+    print(f"{'engine' if shared_loop else 'thread':6s} {readers:2d} dev x {rate:g}/s: {threads:2d} OS threads, {len(latencies)} frames, p50 {percentile(latencies, 0.5):.0f} us, p99 {percentile(latencies, 0.99):.0f} us, process CPU {cpu:.1f}%")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Thread per reader vs the shared event loop on pty readers")
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--load", action="append", metavar="READERSxRATE", help="e.g. 16x50, may be repeated (default 16x50 and 4x200)")
+    args = parser.parse_args()
+    
+    for load in args.load or ["16x50", "4x200"]:
+        readers, rate = load.split("x")
+        for shared_loop in (False, True):
+            run(shared_loop, int(readers), float(rate), args.seconds)
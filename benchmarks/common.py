@@ -0,0 +1,75 @@
+import os
+import sys
+import time
+import random
+from typing import Callable
+
+# Benchmarks run as python benchmarks/<name>.py; the app modules live in the repo root
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def percentile(values: list[float], q: float):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+def open_pty():
+    import pty
+    import tty
+    
+    # The master side stands in for the reader, the slave path is what the app opens
+    master, slave = pty.openpty()
+    tty.setraw(slave)
+    
+    return master, slave, os.ttyname(slave)
+
+def os_threads():
+    # QThreads don't show up in threading.active_count()
+    return len(os.listdir("/proc/self/task"))
+
+def drive(masters: list[int], rate: float, seconds: float, frame: Callable[[int], bytes]):
+    # Every pty gets rate frames/s, each starting at a random phase so the writes interleave
+    start = time.perf_counter()
+    due = [start + random.random() / rate for _ in masters]
+    
+    while True:
+        index = min(range(len(masters)), key=due.__getitem__)
+        if due[index] >= start + seconds:
+            break
+        
+        delay = due[index] - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        
+        os.write(masters[index], frame(index))
+        due[index] += 1 / rate
+
+def stop_readers(comm_systems: list, engine=None):
+    for comm_system in comm_systems:
+        if comm_system.connected:
+            comm_system.stop_connection()
+    
+    for comm_system in comm_systems:
+        if comm_system.connection_thread is not None:
+            comm_system.connection_thread.wait(5000)
+    
+    if engine is not None:
+        engine.stop()
+
+def make_staff(count: int):
+    # Half teachers, half prefects, each with a card
+    from models.collection_data_models import CharacterName, Class, Department, Prefect, Teacher
+    
+    name = CharacterName("Sur", "First", "Middle", "Abbr")
+    cls = Class("c", "SS3", "A", "SS3 A")
+    
+    teachers = {f"t{index}": Teacher(f"t{index}", f"T{index:08d}", name, Department("d", "Dept"), [], "img.png", []) for index in range(count // 2)}
+    prefects = {f"p{index}": Prefect(f"p{index}", f"P{index:08d}", name, "Post", cls, "img.png", {}, []) for index in range(count - count // 2)}
+    
+    return teachers, prefects
+
+def make_app_data(teachers: dict, prefects: dict):
+    from models.collection_data_models import AppData, AttendanceEntry, Time
+    
+    start = AttendanceEntry.at(2025, 1, 6)
+    return AppData(Time(7, 0, 0), Time(8, 0, 0), (start, start), (start, start), [], teachers, prefects)
@@ -0,0 +1,88 @@
+# The SQLite attendance database with a school-sized history: writing taps one transaction each,
+# a full save, reopening, and the date-range reads the attendance pages use.
+import os
+import time
+import timeit
+import argparse
+import tempfile
+from common import make_app_data, make_staff
+from storage import AttendanceDatabase
+
+DAY = 86400
+
+
+def report(label: str, result: str):
+    print(f"  {label:44s} {result}")
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - start
+
+def school_stamps(start: int, taps: int, staff_count: int):
+    # One tap per staff member per weekday, spread over the first hour
+    return [start + (day // 5 * 7 + day % 5) * DAY + index % 3600 for day in range(taps // staff_count) for index in range(staff_count)]
+
+def main(staff_count: int, taps: int, scans: int, directory: str):
+    teachers, prefects = make_staff(staff_count)
+    staff = [*teachers.values(), *prefects.values()]
+    data = make_app_data(teachers, prefects)
+    
+    start = data.teacher_timeline_dates[0].timestamp + 7 * 3600
+    stamps = school_stamps(start, taps, staff_count)
+    print(f"{staff_count} staff, {len(stamps)} taps over {len(stamps) // staff_count} school days, 4 gates")
+    
+    # Taps as they are scanned, each in its own transaction
+    scanned = AttendanceDatabase(os.path.join(directory, "scanned.db"))
+    scanned.save(data)
+    _, elapsed = timed(lambda: [data.add_attendance(staff[index % staff_count], timestamp, f"gate-{index % 4}") for index, timestamp in enumerate(stamps[:scans])])
+    report("per-scan append, store + own transaction", f"{elapsed / scans * 1e6:.1f} us/scan over {scans} scans")
+    scanned.close()
+    
+    data = make_app_data(teachers, prefects)
+    for index, timestamp in enumerate(stamps):
+        data.attendance_data.append(staff[index % staff_count], timestamp, f"gate-{index % 4}")
+    
+    path = os.path.join(directory, "attendance.db")
+    database = AttendanceDatabase(path)
+    _, elapsed = timed(lambda: database.save(data))
+    database.close()
+    report(f"full save of {len(stamps)} rows", f"{elapsed:.2f} s, {os.path.getsize(path) / 2**20:.0f} MiB")
+    
+    def open_and_load():
+        database = AttendanceDatabase(path)
+        return database, database.load()
+    
+    (database, loaded), elapsed = timed(open_and_load)
+    report("open + load staff", f"{elapsed * 1e3:.1f} ms")
+    
+    # What the Attendance page reads at startup, while the history is still on disk
+    middle = start + 100 * DAY
+    today, elapsed = timed(lambda: loaded.attendance_data.between(middle, middle + DAY))
+    report("one day through the store, history on disk", f"{elapsed * 1e3:.1f} ms ({len(today)} rows)")
+    
+    for label, span in (("one day", DAY), ("one week", 7 * DAY), ("one month", 30 * DAY)):
+        rows = len(database.attendance_between(middle, middle + span))
+        number = 100 if span == DAY else 20
+        elapsed = timeit.timeit(lambda: database.attendance_between(middle, middle + span), number=number) / number
+        report(f"attendance_between, {label}", f"{elapsed * 1e3:.1f} ms ({rows} rows)")
+    
+    member = loaded.teachers["t5"]
+    rows = len(database.attendance_between(start, start + 365 * DAY, member))
+    elapsed = timeit.timeit(lambda: database.attendance_between(start, start + 365 * DAY, member), number=200) / 200
+    report("attendance_between, one staff, one year", f"{elapsed * 1e3:.2f} ms ({rows} rows)")
+    
+    size, elapsed = timed(lambda: len(loaded.attendance_data))
+    report("whole history fetched on first full read", f"{elapsed:.2f} s ({size} rows)")
+    database.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="SQLite attendance storage at school scale")
+    parser.add_argument("--staff", type=int, default=2000)
+    parser.add_argument("--taps", type=int, default=1_000_000, help="history written by the full save")
+    parser.add_argument("--scans", type=int, default=20_000, help="taps written one transaction each")
+    args = parser.parse_args()
+    
+    with tempfile.TemporaryDirectory() as directory:
+        main(args.staff, args.taps, args.scans, directory)
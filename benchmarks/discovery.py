@@ -0,0 +1,98 @@
+# When discovered devices reach SetupScreen: DeviceDiscovery against simulated Bluetooth radios,
+# with inquiry and name lookup times scaled down. Also how quickly a cancelled run reports finished.
+import time
+import asyncio
+import argparse
+import common  # Puts the repo root on sys.path
+import main
+from PyQt6.QtCore import QCoreApplication, QTimer
+
+
+class SimulatedClassic:
+    # Stands in for the bluetooth module: an inquiry takes duration x 1.28 s, a name lookup 0.2 s
+    def __init__(self, scale: float):
+        self.scale = scale
+        self.rounds = 0
+    
+    def discover_devices(self, duration: int, lookup_names: bool):
+        time.sleep(duration * 1.28 * self.scale)
+        self.rounds += 1
+        
+        return ["AA:01", "AA:02"] + (["AA:03"] if self.rounds > 1 else [])
+    
+    def lookup_name(self, addr: str):
+        time.sleep(0.8 * self.scale)
+        return f"Classic {addr}"
+
+class _Device:
+    def __init__(self, address: str, name: str | None):
+        self.address = address
+        self.name = name
+
+class _Advertisement:
+    local_name = None
+
+def simulated_ble_scanner(scale: float):
+    # Stands in for BleakScanner: two devices advertising every 80 ms, their names resolve after a while
+    class SimulatedBleakScanner:
+        def __init__(self, detection_callback):
+            self.detection_callback = detection_callback
+            self.task: asyncio.Task | None = None
+        
+        async def advertise(self):
+            for index in range(50):
+                address = "AA:01" if index % 2 else "BB:01"  # AA:01 is dual-mode, the classic scan sees it too
+                self.detection_callback(_Device(address, f"BLE {address}" if index >= 10 else None), _Advertisement())
+                await asyncio.sleep(0.08 * scale)
+        
+        async def __aenter__(self):
+            self.task = asyncio.ensure_future(self.advertise())
+            return self
+        
+        async def __aexit__(self, *exc_info):
+            self.task.cancel()
+    
+    return SimulatedBleakScanner
+
+def main_run(scale: float, cancel_after: float):
+    app = QCoreApplication.instance() or QCoreApplication([])
+    main.bt_classic = SimulatedClassic(scale)
+    main.BleakScanner = simulated_ble_scanner(scale)
+    
+    discovery = main.DeviceDiscovery(ble_timeout=8.0 * scale)
+    events = []
+    start = [0.0]
+    
+    discovery.found.connect(lambda kind, address, name: events.append((time.perf_counter() - start[0], address, name)))
+    discovery.failed.connect(lambda scanner, e: events.append((time.perf_counter() - start[0], scanner, f"failed: {e}")))
+    discovery.finished.connect(lambda: (events.append((time.perf_counter() - start[0], "finished", "")), app.quit()))
+    
+    start[0] = time.perf_counter()
+    discovery.start()
+    app.exec()
+    
+    print(f"full run, radio timings x{scale:g}:")
+    for elapsed, address, name in events:
+        print(f"  {elapsed * 1e3:7.0f} ms  {address:12s} {name}")
+    
+    events.clear()
+    start[0] = time.perf_counter()
+    discovery.start()
+    QTimer.singleShot(int(cancel_after * 1000), discovery.cancel)
+    app.exec()
+    
+    print(f"run cancelled at {cancel_after * 1e3:.0f} ms: finished at {events[-1][0] * 1e3:.0f} ms, {len(events) - 1} found signals before that")
+    
+    # Scanner threads notice the cancel at their next check, keep the app alive until they exit
+    while discovery.workers:
+        app.processEvents()
+        time.sleep(0.01)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Streaming and cancel latency of device discovery on simulated radios")
+    parser.add_argument("--scale", type=float, default=0.25, help="multiplier for the simulated radio timings")
+    parser.add_argument("--cancel-after", type=float, default=0.3, help="seconds into the second run to cancel it")
+    args = parser.parse_args()
+    
+    main_run(args.scale, args.cancel_after)
@@ -0,0 +1,60 @@
+# Widget operations SetupScreen does with the DiscoveryCache over repeated rescans, against rebuilding
+# the device list on every refresh, and the cost of a sighting.
+import time
+import argparse
+import common  # Puts the repo root on sys.path
+from main import DiscoveryCache
+
+
+def main_run(devices: int, ports: int, minutes: float, rescan: float, reports: int):
+    # Serial ports expire after 15 s as they did when discovery rescanned them; SetupScreen now takes them
+    # from the hotplug watcher and keeps them until it reports a removal
+    cache = DiscoveryCache({"ser": 15.0, "bt": 30.0})
+    operations = {"added": 0, "renamed": 0, "removed": 0}
+    sightings = 0
+    seen_time = 0.0
+    
+    # 5 Bluetooth devices leave after a minute, one port is unplugged at 100 s. Names resolve after the first scan
+    refreshes = int(minutes * 60 / rescan)
+    for refresh in range(refreshes):
+        now = refresh * rescan
+        
+        for device in range(devices):
+            if device < 5 and now >= 60:
+                continue
+            
+            # BLE advertisements and classic rounds report each device many times per scan
+            for _ in range(reports):
+                start = time.perf_counter()
+                change = cache.seen("bt", f"AA:{device:04X}", f"Device {device}" if refresh else "", now=now)
+                seen_time += time.perf_counter() - start
+                sightings += 1
+                
+                if change:
+                    operations[change] += 1
+        
+        for port in range(ports):
+            if port == ports - 1 and now >= 100:
+                continue
+            
+            change = cache.seen("ser", f"/dev/ttyUSB{port}", "USB serial", now=now)
+            if change:
+                operations[change] += 1
+        
+        operations["removed"] += len(cache.expire(now=now + 5))  # The 1 s expiry timer between rescans
+    
+    rebuild = refreshes * (devices + ports) * 2  # Clear and re-add every row
+    print(f"{refreshes} refreshes of {devices} Bluetooth devices and {ports} ports: {operations}, {sum(operations.values())} widget operations vs about {rebuild} for a full rebuild each time")
+    print(f"{sightings} sightings at {seen_time / sightings * 1e6:.2f} us each")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Widget churn of the discovery TTL cache")
+    parser.add_argument("--devices", type=int, default=40)
+    parser.add_argument("--ports", type=int, default=4)
+    parser.add_argument("--minutes", type=float, default=5.0)
+    parser.add_argument("--rescan", type=float, default=10.0, help="seconds between discovery runs")
+    parser.add_argument("--reports", type=int, default=20, help="times each device is reported per run")
+    args = parser.parse_args()
+    
+    main_run(args.devices, args.ports, args.minutes, args.rescan, args.reports)
@@ -0,0 +1,99 @@
+# Timestamp-based AttendanceEntry against the calendar-field entry it replaced: building entries from
+# the store for one staff member's year, and grouping them into weeks for the punctuality graph.
+import time
+import timeit
+import argparse
+from common import make_app_data, make_staff
+from models.collection_data_models import Prefect, Teacher, Time, intern_fields, slotted
+from others import DAYS_OF_THE_WEEK, MONTHS_OF_THE_YEAR
+
+MONTHS = list(MONTHS_OF_THE_YEAR)
+
+
+@slotted
+class LegacyEntry:
+    # AttendanceEntry before the timestamp change
+    time: Time
+    day: str
+    date: int
+    month: str
+    year: int
+    staff: Teacher | Prefect | None = None
+    reader: str | None = None
+    
+    def __post_init__(self):
+        intern_fields(self, "day", "month", "reader")
+
+
+def legacy_entries(store, rows):
+    # AttendanceStore._entry before the timestamp change, calendar fields filled in for every entry
+    for staff, timestamp, reader in rows.tolist():
+        local = time.localtime(timestamp)
+        yield LegacyEntry(Time(local.tm_hour, local.tm_min, local.tm_sec), DAYS_OF_THE_WEEK[local.tm_wday], local.tm_mday, MONTHS[local.tm_mon - 1], local.tm_year, store.staff[staff], store.readers[reader] if reader >= 0 else None)
+
+def legacy_weeks(attendance):
+    # PunctualityGraphWidget's grouping before week_number
+    weeks = []
+    prev_day = DAYS_OF_THE_WEEK[0]
+    prev_dt = 1
+    
+    for entry in attendance:
+        if DAYS_OF_THE_WEEK.index(entry.day) > DAYS_OF_THE_WEEK.index(prev_day) or (prev_dt != entry.date and DAYS_OF_THE_WEEK.index(entry.day) == DAYS_OF_THE_WEEK.index(prev_day)):
+            weeks.append([entry.time])
+        else:
+            weeks[-1].append(entry.time)
+        
+        prev_day = entry.day
+        prev_dt = entry.date
+    
+    return weeks
+
+def weeks(attendance):
+    # PunctualityGraphWidget.get_punctuality_data's grouping
+    weeks = []
+    prev_week = None
+    
+    for entry in attendance:
+        week = entry.week_number
+        if week != prev_week:
+            weeks.append([entry.time])
+        else:
+            weeks[-1].append(entry.time)
+        
+        prev_week = week
+    
+    return weeks
+
+def main(days: int, runs: int):
+    teachers, prefects = make_staff(2)
+    data = make_app_data(teachers, prefects)
+    staff = teachers["t0"]
+    
+    start = int(time.mktime((2025, 1, 6, 7, 0, 0, 0, 0, -1)))
+    for day in range(days):
+        data.add_attendance(staff, start + (day // 5 * 7 + day % 5) * 86400 + day * 7, "gate")
+    
+    store = data.attendance_data
+    rows = store.rows[staff.attendance.rows()]
+    
+    def per_entry_us(func):
+        return timeit.timeit(func, number=runs) / runs / days * 1e6
+    
+    old_entries = list(legacy_entries(store, rows))
+    new_entries = list(staff.attendance)
+    assert [(entry.date, entry.time) for entry in old_entries] == [(entry.date, entry.time) for entry in new_entries]
+    
+    print(f"one staff member, {days} school days, mean of {runs} runs")
+    print(f"  materialise entries     calendar fields {per_entry_us(lambda: list(legacy_entries(store, rows))):5.2f} us/entry, timestamp {per_entry_us(lambda: list(staff.attendance)):5.2f} us/entry")
+    # The graph reads staff.attendance every time, so grouping includes building the entries
+    print(f"  weekly grouping         day-name order {per_entry_us(lambda: legacy_weeks(legacy_entries(store, rows))):5.2f} us/entry, week_number {per_entry_us(lambda: weeks(staff.attendance)):5.2f} us/entry")
+    print(f"  weeks found             day-name order {len(legacy_weeks(old_entries))}, week_number {len(weeks(new_entries))}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Timestamp entries vs calendar-field entries")
+    parser.add_argument("--days", type=int, default=200)
+    parser.add_argument("--runs", type=int, default=200)
+    args = parser.parse_args()
+    
+    main(args.days, args.runs)
@@ -0,0 +1,79 @@
+# Cost of logging a sonar-sized frame: print() against the FrameLog ring buffer, with and without a
+# log file, and what each does when the stdout consumer stalls.
+import os
+import sys
+import time
+import logging
+import argparse
+import tempfile
+import subprocess
+import common  # Puts the repo root on sys.path
+from communication import FrameLog
+
+SONAR_LINE = "angles:collection(" + ",".join(f"number({angle})" for angle in range(180)) + ")|distances:collection(" + ",".join(f"number({angle}.5)" for angle in range(180)) + ")"
+
+
+def per_frame_us(log_frame, frames: int):
+    start = time.perf_counter()
+    for _ in range(frames):
+        log_frame()
+    
+    return (time.perf_counter() - start) / frames * 1e6
+
+def child(mode: str, frames: int):
+    # Writes to a pipe whose reader sleeps before reading anything
+    log = FrameLog()
+    
+    start = time.perf_counter()
+    for _ in range(frames):
+        if mode == "print":
+            print(SONAR_LINE, flush=True)
+        else:
+            log.log(logging.DEBUG, SONAR_LINE)
+    
+    sys.stderr.write(f"  {mode:5s}: {frames} frames took {(time.perf_counter() - start) * 1e3:.1f} ms\n")
+
+def main(frames: int, stall: float):
+    print(f"{len(SONAR_LINE)}-byte sonar line, {frames} frames")
+    
+    with open(os.devnull, "w") as devnull:
+        print(f"  print to {os.devnull}  {per_frame_us(lambda: print(SONAR_LINE, file=devnull), frames):6.2f} us/frame")
+    
+    unlimited = FrameLog(rate=1e9)
+    print(f"  ring buffer         {per_frame_us(lambda: unlimited.log(logging.DEBUG, SONAR_LINE), frames):6.2f} us/frame")
+    
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "comm.log")
+        
+        unlimited.start_file(path, max_bytes=2_000_000, backups=2)
+        cost = per_frame_us(lambda: unlimited.log(logging.DEBUG, SONAR_LINE), frames)
+        unlimited.stop_file()
+        
+        files = sorted(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))
+        print(f"  ring buffer + file  {cost:6.2f} us/frame, {unlimited.stats()['file_dropped']} dropped, files {files}")
+    
+    limited = FrameLog()
+    for _ in range(frames):
+        limited.log(logging.DEBUG, SONAR_LINE)
+    limited.log(logging.WARNING, "Link down")
+    print(f"  default rate limit  {limited.stats()}, last record {limited.recent()[-1][2:4]}")
+    
+    print(f"stdout pipe consumer stalled for {stall:g} s:")
+    for mode in ("print", "ring"):
+        process = subprocess.Popen([sys.executable, os.path.abspath(__file__), "--child", mode, "--frames", "200"], stdout=subprocess.PIPE)
+        time.sleep(stall)
+        process.stdout.read()
+        process.wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="print() vs the bounded frame log")
+    parser.add_argument("--frames", type=int, default=20000)
+    parser.add_argument("--stall", type=float, default=2.0, help="seconds the pipe reader waits before reading")
+    parser.add_argument("--child", choices=("print", "ring"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    
+    if args.child:
+        child(args.child, args.frames)
+    else:
+        main(args.frames, args.stall)
@@ -0,0 +1,57 @@
+# parse_frame against the split-based parser it replaced, on the frame shapes the readers send.
+import timeit
+import argparse
+import common  # Puts the repo root on sys.path
+from communication import parse_frame
+
+
+def legacy_parse(data: str):
+    # BaseCommSystem._process_data/_process_sub_data before the single-pass parser
+    processed_data = {}
+    for sub_data_string in data.split("|"):
+        name, value = sub_data_string.strip().split(":")
+        processed_data[name] = legacy_parse_value(value)
+    
+    return processed_data
+
+def legacy_parse_value(data: str):
+    data = data.strip()
+    
+    var_type = data[:data.find("(")]
+    
+    data = data.removeprefix(var_type).strip().removeprefix("(").removesuffix(")")
+    
+    if var_type == "collection":
+        return [legacy_parse_value(sub_data) for sub_data in data.split(",")]
+    elif var_type == "str":
+        return data
+    elif var_type == "number":
+        return float(data)
+    else:
+        raise Exception(f"Type: ({var_type}) is not a valid type")
+
+
+FRAMES = {
+    "IUD": "IUD:str(04A3B2C1D0)",
+    "Gas/Fire": "Gas:number(312)|Fire:number(0)",
+    "sonar 180pt": "angles:collection(" + ",".join(f"number({angle})" for angle in range(180)) + ")|distances:collection(" + ",".join(f"number({angle % 40}.25)" for angle in range(180)) + ")",
+}
+
+def best_us(func, frame: str, number: int):
+    return min(timeit.repeat(lambda: func(frame), number=number, repeat=5)) / number * 1e6
+
+def main(number: int):
+    for name, frame in FRAMES.items():
+        assert legacy_parse(frame) == parse_frame(frame), name
+        
+        runs = max(1, number // (len(frame) // 20 + 1))
+        old, new = best_us(legacy_parse, frame, runs), best_us(parse_frame, frame, runs)
+        print(f"{name:12s} {len(frame):5d} B  legacy {old:8.2f} us  parse_frame {new:8.2f} us  x{old / new:.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Frame parser micro-benchmark, best of 5")
+    parser.add_argument("--number", type=int, default=20000, help="parses per timing run for the smallest frame")
+    args = parser.parse_args()
+    
+    main(args.number)
@@ -0,0 +1,122 @@
+# SerialHotplugWatcher on a stand-in /dev: how soon port changes are reported with inotify and with
+# polling, and how soon a backing-off reader gets taps again once its port reappears.
+import os
+import time
+import argparse
+import tempfile
+from common import stop_readers
+from PyQt6.QtCore import QCoreApplication, QObject, Qt, QTimer, pyqtSignal
+from communication import AsyncCommEngine, ReaderRegistry, SerialHotplugWatcher
+from models.data_models import LiveData
+from simulator import DeviceSimulator
+
+
+class Hub(QObject):
+    raw = pyqtSignal(dict)
+    connection_changed = pyqtSignal(bool)
+    iud = pyqtSignal(str, str)
+
+class PollingWatcher(SerialHotplugWatcher):
+    # The fallback used off Linux or when inotify is out of watches
+    def _inotify_open(self):
+        raise OSError("inotify left out for the benchmark")
+
+
+def touch(path: str):
+    open(path, "w").close()
+
+def watch_events(app: QCoreApplication, directory: str, watcher: SerialHotplugWatcher):
+    touch(os.path.join(directory, "ttyS0"))  # Not a port name the watcher tracks
+    touch(os.path.join(directory, "ttyUSB5"))
+    watcher.start()
+    time.sleep(0.1)  # Let the watcher thread reach its wait, startup isn't what is measured
+    
+    events = []
+    watcher.port_added.connect(lambda port: events.append((time.perf_counter() - start, "+", os.path.basename(port))), Qt.ConnectionType.DirectConnection)
+    watcher.port_removed.connect(lambda port: events.append((time.perf_counter() - start, "-", os.path.basename(port))), Qt.ConnectionType.DirectConnection)
+    
+    start = time.perf_counter()
+    touch(os.path.join(directory, "ttyACM0"))
+    touch(os.path.join(directory, "ttyS1"))
+    os.remove(os.path.join(directory, "ttyUSB5"))
+    
+    deadline = time.perf_counter() + 3 * watcher.poll_interval
+    while time.perf_counter() < deadline:
+        app.processEvents()
+        time.sleep(0.005)
+    
+    watcher.stop()
+    for name in os.listdir(directory):
+        os.remove(os.path.join(directory, name))
+    
+    print(f"{watcher.mode:7s} events: " + ", ".join(f"{sign}{name} at {elapsed * 1e3:.1f} ms" for elapsed, sign, name in events))
+
+def replug(app: QCoreApplication, directory: str, shared_loop: bool, unplugged: float, backoff: float):
+    hub = Hub()
+    engine = AsyncCommEngine() if shared_loop else None
+    link = os.path.join(directory, "ttyUSB9")
+    
+    taps = []
+    hub.iud.connect(lambda IUD, reader_id: taps.append(time.perf_counter()), Qt.ConnectionType.DirectConnection)
+    
+    watcher = SerialHotplugWatcher(directory)
+    watcher.start()
+    
+    registry = ReaderRegistry(LiveData(hub.raw), hub.connection_changed, lambda e, reader_id: print(f"error {reader_id}: {e}"))
+    registry.set_data_point("IUD", hub.iud, with_reader=True)
+    watcher.port_added.connect(registry.port_appeared)
+    
+    simulators = [DeviceSimulator(iud_rate=50, all_streams=True), DeviceSimulator(iud_rate=50, all_streams=True)]
+    os.symlink(simulators[0].start(), link)
+    
+    reader = registry.add_reader("gate", link, None, 115200)
+    reader.init_wait = 0
+    reader.reconnect_initial = backoff  # Without the watcher the reader would wait this long
+    reader.set_serial(True)
+    reader.set_engine(engine)
+    reader.start_connection()
+    
+    plugged_at = []
+    
+    def unplug():
+        simulators[0].stop()
+        os.remove(link)
+    
+    def plug():
+        plugged_at.append(time.perf_counter())
+        os.symlink(simulators[1].start(), link)
+    
+    QTimer.singleShot(500, unplug)
+    QTimer.singleShot(int((0.5 + unplugged) * 1000), plug)
+    QTimer.singleShot(int((2 + unplugged) * 1000), app.quit)
+    app.exec()
+    
+    stats = registry.link_stats()["gate"]
+    resumed = [tap - plugged_at[0] for tap in taps if tap > plugged_at[0]]
+    
+    stop_readers([reader], engine)
+    watcher.stop()
+    simulators[1].stop()
+    os.remove(link)
+    
+    first = f"{resumed[0] * 1e3:.0f} ms" if resumed else "never"
+    print(f"{'engine' if shared_loop else 'thread':6s} port back after {unplugged:g} s -> first tap {first} (backoff alone: {backoff / 2:g}-{backoff:g} s), downtime {stats['downtime']:.2f} s, reconnects {stats['reconnects']}")
+
+def main(unplugged: float, backoff: float):
+    app = QCoreApplication.instance() or QCoreApplication([])
+    
+    with tempfile.TemporaryDirectory() as directory:
+        watch_events(app, directory, SerialHotplugWatcher(directory, poll_interval=0.2))
+        watch_events(app, directory, PollingWatcher(directory, poll_interval=0.2))
+        
+        for shared_loop in (False, True):
+            replug(app, directory, shared_loop, unplugged, backoff)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Hotplug event latency and reconnect on port return")
+    parser.add_argument("--unplugged", type=float, default=1.0, help="seconds the reader's port is gone")
+    parser.add_argument("--backoff", type=float, default=20.0, help="the reader's first reconnect delay")
+    args = parser.parse_args()
+    
+    main(args.unplugged, args.backoff)
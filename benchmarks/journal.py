@@ -0,0 +1,93 @@
+# The tap journal: what a tap costs the GUI thread with the journal and with a transaction per scan,
+# how long until it is fsynced, a 100k tap burst, and the restart replay and compaction that follow.
+import os
+import time
+import argparse
+import tempfile
+from common import make_app_data, make_staff, percentile
+from storage import AttendanceDatabase
+
+JOURNAL_ARGS = {"compact_interval": 3600, "compact_records": 10**9}  # Compaction only when asked for
+
+
+def steady(data, staff: list, taps: int, rate: float, journal=None):
+    # One tap at a time from the GUI thread, waiting for each to be fsynced when there is a journal
+    start = data.teacher_timeline_dates[0].timestamp + 7 * 3600
+    costs, durable = [], []
+    
+    for index in range(taps):
+        before = time.perf_counter()
+        data.add_attendance(staff[index % len(staff)], start + index, f"gate-{index % 4}")
+        handed = time.perf_counter()
+        costs.append(handed - before)
+        
+        if journal is not None:
+            journal.wait_durable(journal.seq)
+            durable.append(time.perf_counter() - handed)
+        time.sleep(1 / rate)
+    
+    return costs, durable
+
+def us(values: list[float], q: float):
+    return percentile(values, q) * 1e6
+
+def main(staff_count: int, taps: int, rate: float, burst: int, directory: str):
+    teachers, prefects = make_staff(staff_count)
+    staff = [*teachers.values(), *prefects.values()]
+    print(f"{len(staff)} staff, 4 gates, {rate:g} taps/s")
+    
+    data = make_app_data(teachers, prefects)
+    database = AttendanceDatabase(os.path.join(directory, "scanned.db"))
+    database.save(data)
+    costs, _ = steady(data, staff, taps, rate)
+    print(f"  transaction per scan: add_attendance p50 {us(costs, 0.5):.0f} us, p99 {us(costs, 0.99):.0f} us")
+    database.close()
+    
+    path = os.path.join(directory, "attendance.db")
+    data = make_app_data(teachers, prefects)
+    database = AttendanceDatabase(path)
+    database.save(data)
+    database.open_journal(data, **JOURNAL_ARGS)
+    journal = database.journal
+    
+    costs, durable = steady(data, staff, taps, rate, journal)
+    print(f"  journal:              add_attendance p50 {us(costs, 0.5):.0f} us, p99 {us(costs, 0.99):.0f} us")
+    print(f"                        tap to durable p50 {percentile(durable, 0.5) * 1e3:.2f} ms, p99 {percentile(durable, 0.99) * 1e3:.2f} ms")
+    
+    # As fast as the GUI thread can hand them over
+    start = data.teacher_timeline_dates[0].timestamp + 8 * 3600
+    batches = journal.batches
+    before = time.perf_counter()
+    for index in range(burst):
+        data.add_attendance(staff[index % len(staff)], start + index, f"gate-{index % 4}")
+    handed = time.perf_counter() - before
+    journal.wait_durable(journal.seq)
+    elapsed = time.perf_counter() - before
+    
+    size = os.path.getsize(journal.path)
+    print(f"  burst of {burst}: {handed / burst * 1e6:.1f} us/tap handed over, all durable after {elapsed:.2f} s "
+          f"in {journal.batches - batches} fsyncs, max fsync {journal.stats()['fsync_ms_max']:.1f} ms")
+    print(f"  journal {size / 1024:.0f} KiB, {size / journal.records:.0f} B/tap")
+    database.close()
+    
+    before = time.perf_counter()
+    database = AttendanceDatabase(path)
+    replayed = database.open_journal(database.load(), **JOURNAL_ARGS)
+    print(f"  restart, load + replay of {replayed} taps: {(time.perf_counter() - before) * 1e3:.0f} ms")
+    
+    before = time.perf_counter()
+    database.journal.compact()
+    print(f"  compaction of {replayed} taps into the database: {(time.perf_counter() - before) * 1e3:.0f} ms")
+    database.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tap journal latency, throughput, replay and compaction")
+    parser.add_argument("--staff", type=int, default=2000)
+    parser.add_argument("--taps", type=int, default=500, help="taps in each steady run")
+    parser.add_argument("--rate", type=float, default=50.0, help="steady taps per second")
+    parser.add_argument("--burst", type=int, default=100_000)
+    args = parser.parse_args()
+    
+    with tempfile.TemporaryDirectory() as directory:
+        main(args.staff, args.taps, args.rate, args.burst, directory)
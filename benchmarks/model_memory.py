@@ -0,0 +1,77 @@
+# Traced memory of the model objects for a school: 2,000 staff and a year of taps as AttendanceEntry
+# objects, against plain dataclasses with the same fields (no slots, no interning).
+import gc
+import time
+import argparse
+import tracemalloc
+import dataclasses
+import common  # Puts the repo root on sys.path
+from models.collection_data_models import AttendanceEntry, CharacterName, Class, Department, Prefect, Subject, Teacher, Time
+
+
+def plain(cls: type):
+    # What the model looked like before @slotted: a regular dataclass, strings kept as given
+    spec = []
+    for field in dataclasses.fields(cls):
+        if not field.init:
+            continue  # Caches added with the slots
+        
+        if field.default is not dataclasses.MISSING:
+            spec.append((field.name, field.type, dataclasses.field(default=field.default)))
+        else:
+            spec.append((field.name, field.type))
+    
+    return dataclasses.make_dataclass(cls.__name__, spec)
+
+MODELS = (Time, CharacterName, Department, Class, Subject, Teacher, Prefect, AttendanceEntry)
+
+
+def build(models: dict[str, type], staff_count: int, days: int):
+    Time, CharacterName, Department, Class, Subject, Teacher, Prefect, AttendanceEntry = (models[cls.__name__] for cls in MODELS)
+    
+    gc.collect()
+    tracemalloc.start()
+    
+    # Strings are formatted per record like a loader produces them, so equal values are separate objects unless interned
+    staff = []
+    for index in range(staff_count):
+        cls = Class(f"c{index % 40}", f"SS{index % 3 + 1}", "ABCD"[index % 4], f"SS{index % 3 + 1} {'ABCD'[index % 4]}")
+        name = CharacterName(f"Sur{index % 300}", f"First{index % 150}", f"Mid{index % 200}", f"Ab{index % 100}")
+        
+        if index % 2:
+            subjects = [Subject(f"s{index % 30}", f"Subject {index % 30}", cls, [("Monday", 1), ("Friday", 3)])]
+            staff.append(Teacher(f"t{index}", f"T{index:08d}", name, Department(f"d{index % 8}", f"Dept {index % 8}"), subjects, "img.png", []))
+        else:
+            staff.append(Prefect(f"p{index}", f"P{index:08d}", name, f"Post {index % 20}", cls, "img.png", {"Friday": ["Morning"]}, []))
+    
+    staff_memory = tracemalloc.get_traced_memory()[0]
+    
+    start = int(time.mktime((2025, 1, 6, 7, 0, 0, 0, 0, -1)))
+    entries = []
+    began = time.perf_counter()
+    for day in range(days):
+        base = start + (day // 5 * 7 + day % 5) * 86400  # Weekdays only
+        for index, member in enumerate(staff):
+            entries.append(AttendanceEntry(base + index % 3600, member, f"gate-{index % 4}"))
+    elapsed = time.perf_counter() - began
+    
+    total = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    
+    return staff_memory, total, len(entries), elapsed
+
+def main(staff_count: int, days: int):
+    print(f"{staff_count} staff, {days} school days, one tap each")
+    
+    for label, models in (("plain", {cls.__name__: plain(cls) for cls in MODELS}), ("models", {cls.__name__: cls for cls in MODELS})):
+        staff_memory, total, taps, elapsed = build(models, staff_count, days)
+        print(f"  {label:6s} {staff_memory / staff_count:6.0f} B/staff  {(total - staff_memory) / taps:5.0f} B/tap  {total / 2**20:6.1f} MiB total  {elapsed / taps * 1e6:.2f} us/tap build (traced)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="tracemalloc footprint of the slotted, interned models")
+    parser.add_argument("--staff", type=int, default=2000)
+    parser.add_argument("--days", type=int, default=200)
+    args = parser.parse_args()
+    
+    main(args.staff, args.days)
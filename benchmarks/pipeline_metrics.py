@@ -0,0 +1,46 @@
+# Per-frame cost of the pipeline metrics: the same batch of IUD frames through _stream_data_process
+# with metrics disabled and enabled.
+import time
+import argparse
+import common  # Puts the repo root on sys.path
+from PyQt6.QtCore import QCoreApplication, QObject, pyqtSignal
+from communication import BaseCommSystem, CommDevice
+from models.data_models import LiveData
+
+
+class Hub(QObject):
+    raw = pyqtSignal(dict)
+    connection_changed = pyqtSignal(bool)
+    iud = pyqtSignal(str)
+
+
+def main(frames: int, rounds: int):
+    app = QCoreApplication.instance() or QCoreApplication([])
+    hub = Hub()
+    
+    comm_system = BaseCommSystem(CommDevice(LiveData(hub.raw), hub.connection_changed, ""), print)
+    comm_system.set_data_point("IUD", hub.iud)
+    
+    data = b"".join(f"IUD:str(SIM{index:08d})|\r\n".encode() for index in range(frames))
+    
+    # Alternate so drift in the machine's speed doesn't land on one side
+    for enabled in (False, True, False, True):
+        comm_system.metrics.enabled = enabled
+        
+        best = float("inf")
+        for _ in range(rounds):
+            start = time.perf_counter()
+            comm_system._stream_data_process(data)
+            best = min(best, time.perf_counter() - start)
+            app.processEvents()  # Deliver the queued emits so they don't pile up
+        
+        print(f"metrics {'enabled ' if enabled else 'disabled'} {best / frames * 1e6:.2f} us/frame")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Overhead of the per-stage latency histograms")
+    parser.add_argument("--frames", type=int, default=200, help="IUD frames per read")
+    parser.add_argument("--rounds", type=int, default=20, help="reads per setting, the best is reported")
+    args = parser.parse_args()
+    
+    main(args.frames, args.rounds)
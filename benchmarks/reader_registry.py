@@ -0,0 +1,76 @@
+# Many pty readers behind one ReaderRegistry: per-reader throughput and tap latency to the
+# attendance data point, on threads and on the shared engine.
+import os
+import time
+import argparse
+import threading
+from collections import defaultdict
+from common import drive, open_pty, percentile, stop_readers
+from PyQt6.QtCore import QCoreApplication, QObject, Qt, pyqtSignal
+from communication import AsyncCommEngine, ReaderRegistry
+from models.data_models import LiveData
+
+
+class Hub(QObject):
+    raw = pyqtSignal(dict)
+    connection_changed = pyqtSignal(bool)
+    iud = pyqtSignal(str, str)
+
+
+def run(shared_loop: bool, readers: int, rate: float, seconds: float):
+    app = QCoreApplication.instance() or QCoreApplication([])
+    hub = Hub()
+    engine = AsyncCommEngine() if shared_loop else None
+    errors = []
+    
+    latencies: dict[str, list[float]] = defaultdict(list)
+    lock = threading.Lock()
+    
+    def on_iud(IUD: str, reader_id: str):
+        latency = time.perf_counter() - float(IUD.split("@")[1])
+        with lock:
+            latencies[reader_id].append(latency * 1e6)
+    
+    hub.iud.connect(on_iud, Qt.ConnectionType.DirectConnection)
+    
+    registry = ReaderRegistry(LiveData(hub.raw), hub.connection_changed, lambda e, reader_id: errors.append(f"{reader_id}: {e}"))
+    registry.set_data_point("IUD", hub.iud, with_reader=True)
+    
+    ptys = []
+    for index in range(readers):
+        master, slave, port = open_pty()
+        ptys.append((master, slave))
+        
+        reader = registry.add_reader(f"gate-{index}", port, None, 115200)
+        reader.init_wait = 0
+        reader.set_serial(True)
+        reader.set_engine(engine)
+        reader.start_connection()
+    
+    time.sleep(0.5)
+    drive([master for master, _ in ptys], rate, seconds, lambda index: f"IUD:str(CARD{index}@{time.perf_counter()!r})|\n".encode())
+    time.sleep(0.3)
+    
+    per_reader = [len(latencies[f"gate-{index}"]) / seconds for index in range(readers)]
+    every = [latency for values in latencies.values() for latency in values]
+    
+    stop_readers(list(registry.readers.values()), engine)
+    app.processEvents()
+    for master, slave in ptys:
+        os.close(master)
+        os.close(slave)
+    
+    print(f"{'engine' if shared_loop else 'thread':6s} {readers:2d} x {rate:g}/s: {min(per_reader):.1f}-{max(per_reader):.1f} frames/s per reader, p50 {percentile(every, 0.5):.0f} us, p99 {percentile(every, 0.99):.0f} us, connected after stop_all {registry.connected}")
+    for error in errors:
+        print(f"  error {error}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Throughput and latency of many readers through a ReaderRegistry")
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--readers", type=int, default=16)
+    args = parser.parse_args()
+    
+    run(False, args.readers, 20, args.seconds)
+    run(True, args.readers, 20, args.seconds)
+    run(True, args.readers, 100, args.seconds)
@@ -0,0 +1,74 @@
+# Unplugs a simulated reader for a moment and measures how long taps take to resume, without the
+# error dialog path. The port is a symlink that gets pointed at a fresh pty, like a re-enumerated adapter.
+import os
+import time
+import argparse
+import tempfile
+from common import stop_readers
+from PyQt6.QtCore import QCoreApplication, QObject, QTimer, pyqtSignal
+from communication import AsyncCommEngine, ReaderRegistry
+from models.data_models import LiveData
+from simulator import DeviceSimulator
+
+
+class Hub(QObject):
+    raw = pyqtSignal(dict)
+    connection_changed = pyqtSignal(bool)
+    iud = pyqtSignal(str, str)
+
+
+def run(shared_loop: bool, unplugged: float, link: str):
+    app = QCoreApplication.instance() or QCoreApplication([])
+    hub = Hub()
+    engine = AsyncCommEngine() if shared_loop else None
+    
+    taps = []
+    errors = []
+    hub.iud.connect(lambda IUD, reader_id: taps.append(time.perf_counter()))
+    
+    registry = ReaderRegistry(LiveData(hub.raw), hub.connection_changed, lambda e, reader_id: errors.append(str(e)))
+    registry.set_data_point("IUD", hub.iud, with_reader=True)
+    
+    simulators = [DeviceSimulator(iud_rate=20, all_streams=True), DeviceSimulator(iud_rate=20, all_streams=True)]
+    os.symlink(simulators[0].start(), link)
+    
+    reader = registry.add_reader("gate", link, None, 115200)
+    reader.init_wait = 0
+    reader.set_serial(True)
+    reader.set_engine(engine)
+    reader.start_connection()
+    
+    plugged_at = []
+    
+    def unplug():
+        simulators[0].stop()
+        os.remove(link)
+    
+    def plug():
+        os.symlink(simulators[1].start(), link)
+        plugged_at.append(time.perf_counter())
+    
+    QTimer.singleShot(1000, unplug)
+    QTimer.singleShot(int((1 + unplugged) * 1000), plug)
+    QTimer.singleShot(int((4 + unplugged) * 1000), app.quit)
+    app.exec()
+    
+    stats = registry.link_stats()["gate"]
+    resumed = [tap - plugged_at[0] for tap in taps if tap > plugged_at[0]]
+    
+    stop_readers([reader], engine)
+    simulators[1].stop()
+    os.remove(link)
+    
+    first = f"{resumed[0]:.2f} s after the port returned" if resumed else "never"
+    print(f"{'engine' if shared_loop else 'thread':6s} unplugged {unplugged:g} s: taps resumed {first}, downtime {stats['downtime']:.2f} s, outages {stats['outages']}, reconnects {stats['reconnects']}, error callbacks {len(errors)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tap outage when a reader's port disappears and comes back")
+    parser.add_argument("--unplugged", type=float, default=1.0, help="seconds the port is gone")
+    args = parser.parse_args()
+    
+    with tempfile.TemporaryDirectory() as directory:
+        for shared_loop in (False, True):
+            run(shared_loop, args.unplugged, os.path.join(directory, "ttyUSB0"))
@@ -0,0 +1,80 @@
+# Replays a synthetic morning-rush capture through the reader pipeline at several speeds.
+import os
+import time
+import random
+import argparse
+import tempfile
+from common import stop_readers
+from PyQt6.QtCore import QCoreApplication, QObject, Qt, pyqtSignal
+from communication import AsyncCommEngine, ReaderRegistry, StreamRecorder, read_capture
+from models.data_models import LiveData
+
+
+class Hub(QObject):
+    raw = pyqtSignal(dict)
+    connection_changed = pyqtSignal(bool)
+    iud = pyqtSignal(str, str)
+
+
+def write_rush(path: str, minutes: float, reads_per_tap: int):
+    # About one tap a second, each card read reads_per_tap times 0.1 s apart while it is held
+    recorder = StreamRecorder(path)
+    rng = random.Random(3)
+    
+    taps = 0
+    elapsed = rng.expovariate(1)
+    while elapsed < minutes * 60:
+        for read in range(reads_per_tap):
+            recorder.start = time.monotonic_ns() - int((elapsed + read * 0.1) * 1e9)
+            recorder.record(f"IUD:str(CARD{taps:04d})|\r\n".encode())
+        
+        taps += 1
+        elapsed += rng.expovariate(1)
+    
+    recorder.close()
+    return taps
+
+def replay(path: str, speed: float, shared_loop: bool):
+    app = QCoreApplication.instance() or QCoreApplication([])
+    hub = Hub()
+    engine = AsyncCommEngine() if shared_loop else None
+    
+    frames = []
+    hub.iud.connect(lambda IUD, reader_id: frames.append(IUD), Qt.ConnectionType.DirectConnection)
+    
+    registry = ReaderRegistry(LiveData(hub.raw), hub.connection_changed, lambda e, reader_id: print(f"error {reader_id}: {e}"))
+    registry.set_data_point("IUD", hub.iud, with_reader=True)
+    
+    reader = registry.add_reader("replay", "")
+    reader.set_replay(path, speed)
+    reader.set_engine(engine)
+    
+    start = time.perf_counter()
+    reader.start_connection()
+    while reader.connected:
+        time.sleep(0.001)
+    elapsed = time.perf_counter() - start
+    
+    stop_readers([reader], engine)
+    app.processEvents()
+    
+    print(f"speed {f'{speed:g}x' if speed else 'max':>6s} {'engine' if shared_loop else 'thread':6s}: {len(frames)} frames in {elapsed * 1e3:7.0f} ms, {len(frames) / elapsed:8.0f} frames/s")
+
+def main(minutes: float, speeds: list[float]):
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "rush.rfidcap")
+        taps = write_rush(path, minutes, 3)
+        print(f"{minutes:g} minute rush: {taps} taps, {sum(1 for _ in read_capture(path))} records, {os.path.getsize(path) / 1000:.0f} KB")
+        
+        for speed in speeds:
+            for shared_loop in (False, True):
+                replay(path, speed, shared_loop)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Capture replay throughput at several speeds")
+    parser.add_argument("--minutes", type=float, default=10.0, help="length of the synthetic capture")
+    parser.add_argument("--speed", type=float, action="append", help="multiple of real time, 0 for as fast as possible (default 0, 1000 and 100)")
+    args = parser.parse_args()
+    
+    main(args.minutes, args.speed or [0, 1000, 100])
@@ -0,0 +1,97 @@
+# File > Save and Save As (an export) through SaveManager with a big journal behind them, while a timer keeps
+# scanning taps on the event loop. Reports each save's GUI thread snapshot and worker time, and the event loop gaps.
+import os
+import time
+import argparse
+import tempfile
+from common import make_app_data, make_staff, percentile
+from main import SaveManager
+from storage import AttendanceDatabase
+from PyQt6.QtCore import QCoreApplication, QTimer
+
+JOURNAL_ARGS = {"compact_interval": 3600, "compact_records": 10**9}  # Only saves fold the journal
+
+
+def main(staff_count: int, journaled: int, rate: int, directory: str):
+    app = QCoreApplication.instance() or QCoreApplication([])
+    
+    teachers, prefects = make_staff(staff_count)
+    staff = [*teachers.values(), *prefects.values()]
+    data = make_app_data(teachers, prefects)
+    
+    database = AttendanceDatabase(os.path.join(directory, "attendance.db"))
+    database.save(data)
+    database.open_journal(data, **JOURNAL_ARGS)
+    
+    start = data.teacher_timeline_dates[0].timestamp + 7 * 3600
+    for index in range(journaled):
+        data.add_attendance(staff[index % staff_count], start + index, f"gate-{index % 4}")
+    database.journal.wait_durable(database.journal.seq)
+    print(f"{staff_count} staff, {journaled} journaled taps, scanning {rate} taps/s during the saves")
+    
+    saver = SaveManager(database, data, 0)
+    
+    # 4 gates, rate / 1000 taps every millisecond between them, timing the gaps between ticks
+    scanned = [journaled]
+    ticks: list[float] = []
+    
+    def scan():
+        ticks.append(time.perf_counter())
+        for _ in range(max(1, rate // 1000)):
+            index = scanned[0]
+            data.add_attendance(staff[index % staff_count], start + index, f"gate-{index % 4}")
+            scanned[0] += 1
+    
+    scanner = QTimer()
+    scanner.timeout.connect(scan)
+    scanner.start(1)
+    
+    save_as_path = os.path.join(directory, "copy.db")
+    steps = [
+        lambda: (data.assign_iud(staff[0], "NEW00001"), data.assign_iud(staff[-1], "NEW00002"), saver.save()),
+        saver.save,
+        lambda: saver.save_as(save_as_path),
+        lambda: data.assign_iud(staff[1], "NEW00003"),
+    ]
+    
+    def report(metrics: dict):
+        print(f"  {metrics['kind']:8s} {metrics['staff']:5d} staff {metrics['attendance']:7d} taps  snapshot {metrics['snapshot_ms']:5.1f} ms  "
+              f"worker {metrics['write_ms']:7.1f} ms  total {metrics['duration_ms']:7.1f} ms  {metrics['bytes'] / 2**20:5.1f} MiB")
+        QTimer.singleShot(1000, next_step)
+    
+    def next_step():
+        if steps:
+            steps.pop(0)()
+        if not steps:
+            QTimer.singleShot(1000, app.quit)
+    
+    saver.saved.connect(report)
+    saver.failed.connect(lambda error: (print(f"  {error}"), app.quit()))
+    QTimer.singleShot(1000, next_step)
+    ticks.clear()
+    app.exec()
+    
+    scanner.stop()
+    gaps = [(after - before) * 1e3 for before, after in zip(ticks, ticks[1:])]
+    print(f"  event loop while saving: p50 gap {percentile(gaps, 0.5):.1f} ms, p99 {percentile(gaps, 0.99):.1f} ms, max {max(gaps):.1f} ms")
+    
+    saver.close()
+    
+    # The open database has everything, the Save As copy what there was when it was made
+    for label, path in (("database", database.path), ("Save As copy", save_as_path)):
+        reopened = AttendanceDatabase(path)
+        loaded = reopened.load()
+        reopened.open_journal(loaded, **JOURNAL_ARGS)
+        assigned = sorted(member.IUD for member in [*loaded.teachers.values(), *loaded.prefects.values()] if member.IUD.startswith("NEW"))
+        print(f"  reloaded {label}: {len(loaded.attendance_data)} of {scanned[0]} taps, cards {assigned}")
+        reopened.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Background saves while scanning goes on")
+    parser.add_argument("--staff", type=int, default=2000)
+    parser.add_argument("--journaled", type=int, default=200_000, help="taps in the journal before the first save")
+    parser.add_argument("--rate", type=int, default=4000, help="taps per second scanned during the saves")
+    args = parser.parse_args()
+    
+    with tempfile.TemporaryDirectory() as directory:
+        main(args.staff, args.journaled, args.rate, directory)
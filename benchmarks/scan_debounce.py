@@ -0,0 +1,35 @@
+# ScanDebouncer: a card held against the reader, then per-scan cost as the number of scans grows.
+import time
+import argparse
+from common import make_staff
+from others import ScanDebouncer
+from models.collection_data_models import Prefect, Teacher
+
+
+def main(cards: int):
+    teachers, prefects = make_staff(2)
+    teacher, prefect = teachers["t0"], prefects["p0"]
+    
+    # AttendanceWidget's windows. A card held for 3 s at 5 reads/s, then tapped again 2 minutes later
+    debouncer = ScanDebouncer({Teacher: 60.0, Prefect: 30.0})
+    accepted = sum(debouncer.accept(teacher.IUD, teacher, now=read * 0.2) for read in range(15))
+    accepted += debouncer.accept(teacher.IUD, teacher, now=120.0)
+    print(f"held card: {accepted} accepted, {debouncer.suppressed} suppressed {debouncer.suppressed_by_type}")
+    
+    for scans in (10_000, 100_000, 1_000_000):
+        debouncer = ScanDebouncer({Teacher: 60.0, Prefect: 30.0})
+        
+        start = time.perf_counter()
+        for index in range(scans):
+            debouncer.accept(f"C{index % cards}", teacher if index & 1 else prefect, now=index * 0.01)
+        elapsed = time.perf_counter() - start
+        
+        print(f"{scans} scans over {cards} cards: {elapsed / scans * 1e6:.2f} us/scan, cache {len(debouncer.recent)}, suppressed {debouncer.suppressed}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Repeated-tap debouncing cost")
+    parser.add_argument("--cards", type=int, default=5000)
+    args = parser.parse_args()
+    
+    main(args.cards)
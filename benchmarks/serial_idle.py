@@ -0,0 +1,77 @@
+# Idle CPU and tap-to-emit latency of one serial reader, with a pty standing in for the port.
+# Only the original BaseCommSystem interface is used, so the same script runs on older trees.
+import io
+import os
+import time
+import argparse
+import resource
+import threading
+import contextlib
+from common import percentile, open_pty
+from PyQt6.QtCore import QCoreApplication, QObject, Qt, pyqtSignal
+from communication import BaseCommSystem, CommDevice
+from models.data_models import LiveData
+
+
+class Hub(QObject):
+    raw = pyqtSignal(dict)
+    connection_changed = pyqtSignal(bool)
+    iud = pyqtSignal(str)
+
+
+def cpu_seconds():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+def main(idle: float, taps: int):
+    app = QCoreApplication.instance() or QCoreApplication([])
+    hub = Hub()
+    master, slave, port = open_pty()
+    
+    tapped = threading.Event()
+    stamp = [0.0]
+    
+    def on_tap(IUD: str):
+        stamp[0] = time.perf_counter()
+        tapped.set()
+    
+    # Measured at the emit on the comm thread, not after a trip through the GUI event loop
+    hub.iud.connect(on_tap, Qt.ConnectionType.DirectConnection)
+    
+    comm_system = BaseCommSystem(CommDevice(LiveData(hub.raw), hub.connection_changed, port, None, 9600), print)
+    comm_system.set_serial(True)
+    comm_system.set_data_point("IUD", hub.iud)
+    comm_system.start_connection()
+    time.sleep(2.5)  # Past the Arduino reset wait
+    
+    cpu, wall = cpu_seconds(), time.perf_counter()
+    time.sleep(idle)
+    idle_cpu = (cpu_seconds() - cpu) / (time.perf_counter() - wall) * 100
+    
+    latencies = []
+    with contextlib.redirect_stdout(io.StringIO()):  # Older trees print every frame
+        for index in range(taps):
+            tapped.clear()
+            start = time.perf_counter()
+            os.write(master, f"IUD:str(CARD{index:06d})|\n".encode())
+            if tapped.wait(2):
+                latencies.append((stamp[0] - start) * 1e6)
+            time.sleep(0.005)
+    
+    comm_system.stop_connection()
+    comm_system.connection_thread.wait(5000)
+    app.processEvents()
+    os.close(master)
+    os.close(slave)
+    
+    print(f"idle CPU {idle_cpu:.1f}% over {idle:.0f} s")
+    print(f"tap-to-emit over {len(latencies)}/{taps} taps: p50 {percentile(latencies, 0.5):.0f} us  p99 {percentile(latencies, 0.99):.0f} us")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Idle CPU and tap latency of a serial reader on a pty")
+    parser.add_argument("--idle", type=float, default=5.0, help="seconds to measure with no traffic")
+    parser.add_argument("--taps", type=int, default=200)
+    args = parser.parse_args()
+    
+    main(args.idle, args.taps)
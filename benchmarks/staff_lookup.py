@@ -0,0 +1,46 @@
+# Resolving a tapped card to a staff member: AppData.staff_by_iud against the two linear scans
+# AttendanceWidget used before the index.
+import time
+import random
+import argparse
+from common import make_app_data, make_staff
+
+
+def linear_lookup(data, IUD: str):
+    staff = next((prefect for _, prefect in data.prefects.items() if prefect.IUD == IUD), None)
+    if staff is None:
+        staff = next((teacher for _, teacher in data.teachers.items() if teacher.IUD == IUD), None)
+    return staff
+
+def main(sizes: list[int]):
+    rng = random.Random(0)
+    
+    for size in sizes:
+        data = make_app_data(*make_staff(size))
+        
+        start = time.perf_counter()
+        data.rebuild_iud_index()
+        build = time.perf_counter() - start
+        
+        # Hits on both kinds plus cards nobody owns, which scan everything
+        cards = [f"T{rng.randrange(size // 2):08d}" for _ in range(200)] + [f"P{rng.randrange(size // 2):08d}" for _ in range(200)] + ["UNKNOWN"] * 100
+        
+        start = time.perf_counter()
+        expected = [linear_lookup(data, IUD) for IUD in cards]
+        linear = (time.perf_counter() - start) / len(cards)
+        
+        start = time.perf_counter()
+        for _ in range(100):
+            found = [data.staff_by_iud(IUD) for IUD in cards]
+        indexed = (time.perf_counter() - start) / len(cards) / 100
+        
+        assert all(a is b for a, b in zip(expected, found))
+        print(f"{size:7d} staff: linear {linear * 1e6:8.0f} us/lookup, index {indexed * 1e9:4.0f} ns/lookup ({linear / indexed:.0f}x), index build {build * 1e3:.1f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Card to staff lookup, linear scans vs the IUD index")
+    parser.add_argument("--staff", type=int, action="append", help="staff count, may be repeated (default 10000 and 100000)")
+    args = parser.parse_args()
+    
+    main(args.staff or [10_000, 100_000])
@@ -1,12 +1,767 @@
 
+import os
+import re
+import json
 import time
+import ctypes
+import queue
+import random
 import serial
+import logging
 import socket
+import struct
+import sys
+import asyncio
+import binascii
+import threading
+import selectors
 from others import Thread
+from logging.handlers import QueueListener, RotatingFileHandler
+from serial.tools.list_ports import comports
 from typing import Callable
-from dataclasses import dataclass
+from collections import OrderedDict, deque
+from dataclasses import dataclass, replace
 from models.data_models import LiveData
-from PyQt6.QtCore import pyqtBoundSignal
+from PyQt6.QtCore import QObject, QTimer, pyqtSignal, pyqtBoundSignal
+
+_FIELD_NAME = re.compile(r"([^:|]*):\s*")
+_NUMBER = re.compile(r"number\(\s*([^)]*?)\s*\)\s*")
+_STR = re.compile(r"str\(((?:[^()]|\([^()]*\))*)\)\s*")  # Allows one level of balanced parentheses, e.g. str(Room (B))
+_COLLECTION = re.compile(r"collection\(\s*")
+_NUMBER_COLLECTION = re.compile(r"collection\(\s*(?:number\([^)]*\)\s*(?:,\s*number\([^)]*\)\s*)*)?\)\s*")
+_SEPARATOR = re.compile(r"([,)|])\s*")
+_VAR_TYPE = re.compile(r"[^(]*")
+# Most frames (cards, gas, fire) are plain str/number fields, one match takes a whole field and the '|' after it
+_SIMPLE_FIELD = re.compile(r"([^:|]*+):\s*+(?:str\(([^()]*+(?:\([^()]*+\)[^()]*+)*+)\)|number\(\s*+([^)]*?)\s*\))\s*+(?:\|\s*+|\Z)")
+
+
+def _parse_value(data: str, index: int) -> tuple[str | float | list, int]:
+    var_type = data[index:index + 1]
+    
+    if var_type == "n":
+        match = _NUMBER.match(data, index)
+        if match is not None:
+            return float(match.group(1)), match.end()
+    elif var_type == "s":
+        match = _STR.match(data, index)
+        if match is not None:
+            return match.group(1), match.end()
+    elif var_type == "c":
+        # Sonar sweeps are flat number collections, so convert them with one findall over the frame instead of per item
+        match = _NUMBER_COLLECTION.match(data, index)
+        if match is not None:
+            return list(map(float, _NUMBER.findall(data, index, match.end()))), match.end()
+        
+        match = _COLLECTION.match(data, index)
+    else:
+        match = None
+    
+    if match is None:
+        var_type = _VAR_TYPE.match(data, index).group().strip()
+        if var_type in ("number", "str", "collection"):
+            raise Exception(f"Malformed {var_type} value at position {index} in: {data}")
+        
+        raise Exception(f"Type: ({var_type}) is not a valid type")
+    
+    items = []
+    index = match.end()
+    
+    separator = _SEPARATOR.match(data, index)
+    if separator is not None and separator.group(1) == ")":
+        return items, separator.end()
+    
+    while True:
+        item, index = _parse_value(data, index)
+        items.append(item)
+        
+        separator = _SEPARATOR.match(data, index)
+        if separator is None or separator.group(1) == "|":
+            raise Exception(f"Unterminated collection at position {index} in: {data}")
+        
+        index = separator.end()
+        if separator.group(1) == ")":
+            return items, index
+
+def parse_frame(data: str):
+    frame = {}
+    
+    index = 0
+    end = len(data)
+    while index < end:
+        field = _SIMPLE_FIELD.match(data, index)
+        if field is not None:
+            name, text, number = field.groups()
+            frame[name.strip()] = text if number is None else float(number)
+            index = field.end()
+            continue
+        
+        name = _FIELD_NAME.match(data, index)
+        if name is None:
+            raise Exception(f"Missing ':' after position {index} in: {data}")
+        
+        frame[name.group(1).strip()], index = _parse_value(data, name.end())
+        
+        if index < end:
+            separator = _SEPARATOR.match(data, index)
+            if separator is None or separator.group(1) != "|":
+                raise Exception(f"Unexpected '{data[index]}' at position {index} in: {data}")
+            
+            index = separator.end()
+    
+    return frame
+
+
+# Binary framing: MAGIC (A5 5A) | u16 payload length | payload | u16 CRC16-CCITT of payload, all little-endian
+# Payload is a run of fields: u8 name length | name | u8 type tag | value
+# Devices that support it reply to the handshake with the text frame PROTOCOL:str(BINARY). From then on they send binary frames,
+# and take our commands newline terminated so several can share a write. Before that, and with older firmware, commands go out bare
+BINARY_HANDSHAKE = "PROTOCOL:BINARY"
+BINARY_MAGIC = b"\xa5\x5a"
+BINARY_MAX_PAYLOAD = 4096
+
+_BINARY_NUMBER = 1  # f32
+_BINARY_STR = 2  # u16 length | utf-8 bytes
+_BINARY_COLLECTION = 3  # u16 count | tagged values
+_BINARY_NUMBER_ARRAY = 4  # u16 count | packed f32s
+
+_BINARY_HEADER = struct.Struct("<2sH")
+_BINARY_U8 = struct.Struct("<B")
+_BINARY_U16 = struct.Struct("<H")
+_BINARY_F32 = struct.Struct("<f")
+
+
+def crc16(data: bytes | bytearray | memoryview):
+    return binascii.crc_hqx(data, 0xFFFF)
+
+def _encode_binary_value(value: str | float | list, out: bytearray):
+    if isinstance(value, str):
+        encoded = value.encode()
+        out += _BINARY_U8.pack(_BINARY_STR) + _BINARY_U16.pack(len(encoded)) + encoded
+    elif isinstance(value, (int, float)):
+        out += _BINARY_U8.pack(_BINARY_NUMBER) + _BINARY_F32.pack(value)
+    elif isinstance(value, (list, tuple)):
+        if all(isinstance(item, (int, float)) for item in value):
+            out += _BINARY_U8.pack(_BINARY_NUMBER_ARRAY) + _BINARY_U16.pack(len(value)) + struct.pack(f"<{len(value)}f", *value)
+        else:
+            out += _BINARY_U8.pack(_BINARY_COLLECTION) + _BINARY_U16.pack(len(value))
+            for item in value:
+                _encode_binary_value(item, out)
+    else:
+        raise Exception(f"Type: ({type(value)}) can not be sent in a binary frame")
+
+def encode_binary_frame(frame: dict[str, str | float | list]):
+    payload = bytearray()
+    for name, value in frame.items():
+        encoded_name = name.encode()
+        payload += _BINARY_U8.pack(len(encoded_name)) + encoded_name
+        _encode_binary_value(value, payload)
+    
+    return _BINARY_HEADER.pack(BINARY_MAGIC, len(payload)) + payload + _BINARY_U16.pack(crc16(payload))
+
+def _decode_binary_value(payload: memoryview, offset: int) -> tuple[str | float | list, int]:
+    tag, = _BINARY_U8.unpack_from(payload, offset)
+    offset += 1
+    
+    if tag == _BINARY_NUMBER:
+        return _BINARY_F32.unpack_from(payload, offset)[0], offset + 4
+    elif tag == _BINARY_NUMBER_ARRAY:
+        count, = _BINARY_U16.unpack_from(payload, offset)
+        return list(struct.unpack_from(f"<{count}f", payload, offset + 2)), offset + 2 + count * 4
+    elif tag == _BINARY_STR:
+        length, = _BINARY_U16.unpack_from(payload, offset)
+        return str(payload[offset + 2:offset + 2 + length], "utf-8"), offset + 2 + length
+    elif tag == _BINARY_COLLECTION:
+        count, = _BINARY_U16.unpack_from(payload, offset)
+        offset += 2
+        
+        items = []
+        for _ in range(count):
+            item, offset = _decode_binary_value(payload, offset)
+            items.append(item)
+        
+        return items, offset
+    else:
+        raise Exception(f"Binary type tag: ({tag}) is not a valid type")
+
+def decode_binary_payload(payload: memoryview):
+    frame = {}
+    
+    offset = 0
+    while offset < len(payload):
+        name_length, = _BINARY_U8.unpack_from(payload, offset)
+        name = str(payload[offset + 1:offset + 1 + name_length], "utf-8")
+        
+        frame[name], offset = _decode_binary_value(payload, offset + 1 + name_length)
+    
+    return frame
+
+class BinaryFrameDecoder:
+    def __init__(self):
+        self.buffer = bytearray()
+        self.crc_errors = 0
+        self.payload_errors = 0
+    
+    def reset(self):
+        self.buffer.clear()
+    
+    def feed(self, data: bytes, on_error: Callable[[Exception], None] | None = None):
+        self.buffer += data
+        
+        frames = []
+        start = 0
+        end = len(self.buffer)
+        with memoryview(self.buffer) as view:
+            while True:
+                magic_start = self.buffer.find(BINARY_MAGIC, start)
+                if magic_start == -1:
+                    # Keep a trailing partial magic for the next read
+                    start = max(start, end - len(BINARY_MAGIC) + 1)
+                    break
+                
+                start = magic_start
+                if end - start < _BINARY_HEADER.size:
+                    break
+                
+                _, length = _BINARY_HEADER.unpack_from(view, start)
+                if length > BINARY_MAX_PAYLOAD:
+                    self.crc_errors += 1
+                    start += 1
+                    continue
+                
+                frame_end = start + _BINARY_HEADER.size + length + 2
+                if frame_end > end:
+                    break
+                
+                with view[start + _BINARY_HEADER.size:frame_end - 2] as payload:
+                    if crc16(payload) != _BINARY_U16.unpack_from(view, frame_end - 2)[0]:
+                        # Not a real frame start (or a corrupted frame), resync on the next magic byte
+                        self.crc_errors += 1
+                        start += 1
+                        continue
+                    
+                    try:
+                        frames.append(decode_binary_payload(payload))
+                    except Exception as e:
+                        # The CRC matched, so the sender built a bad payload. Skip just this frame
+                        self.payload_errors += 1
+                        if on_error is not None:
+                            on_error(e)
+                
+                start = frame_end
+        
+        del self.buffer[:start]
+        
+        return frames
+
+class LineFrameBuffer:
+    def __init__(self, delimiter: bytes = b"\n", max_size: int = 65536):
+        self.delimiter = delimiter
+        self.max_size = max_size
+        
+        self.buffer = bytearray()
+        self.scan_start = 0  # Everything before this is known to hold no delimiter
+        self.overflows = 0
+    
+    def reset(self):
+        self.buffer.clear()
+        self.scan_start = 0
+    
+    def feed(self, data: bytes):
+        self.buffer += data
+        
+        while True:
+            end = self.buffer.find(self.delimiter, self.scan_start)
+            if end == -1:
+                if len(self.buffer) > self.max_size:
+                    # No delimiter in sight (line noise or a device in the wrong mode), drop it rather than grow forever
+                    self.overflows += 1
+                    self.reset()
+                else:
+                    self.scan_start = max(0, len(self.buffer) - len(self.delimiter) + 1)
+                return
+            
+            frame = bytes(self.buffer[:end])
+            
+            # Deleting from the front of a bytearray only moves its start offset, the tail is not copied
+            del self.buffer[:end + len(self.delimiter)]
+            self.scan_start = 0
+            
+            yield frame
+    
+    def drain(self):
+        data = bytes(self.buffer)
+        self.reset()
+        
+        return data
+
+# Capture log: CAPTURE_MAGIC, then per read: u64 ns since capture start | u32 length | raw bytes
+CAPTURE_MAGIC = b"RFIDCAP1"
+_CAPTURE_RECORD = struct.Struct("<QI")
+
+
+class StreamRecorder:
+    def __init__(self, path: str | os.PathLike):
+        self.lock = threading.Lock()
+        self.file = open(path, "wb", buffering=65536)
+        self.file.write(CAPTURE_MAGIC)
+        
+        self.start = time.monotonic_ns()
+        self.records = 0
+    
+    def record(self, data: bytes):
+        timestamp = time.monotonic_ns() - self.start
+        
+        with self.lock:
+            if not self.file.closed:
+                self.file.write(_CAPTURE_RECORD.pack(timestamp, len(data)))
+                self.file.write(data)
+                self.records += 1
+    
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+def read_capture(path: str | os.PathLike):
+    with open(path, "rb") as file:
+        if file.read(len(CAPTURE_MAGIC)) != CAPTURE_MAGIC:
+            raise Exception(f"{path} is not a capture log")
+        
+        while True:
+            header = file.read(_CAPTURE_RECORD.size)
+            if len(header) < _CAPTURE_RECORD.size:
+                return  # End of log, or a record cut short when the capture was interrupted
+            
+            timestamp, length = _CAPTURE_RECORD.unpack(header)
+            data = file.read(length)
+            if len(data) < length:
+                return
+            
+            yield timestamp, data
+
+
+class CommandQueue:
+    def __init__(self, max_size: int = 32):
+        self.max_size = max_size
+        self.lock = threading.Lock()
+        
+        # coalescing key -> latest command, in send order
+        self.pending: OrderedDict[str, str] = OrderedDict()
+        
+        self.sent = 0
+        self.batches = 0
+        self.coalesced = 0
+        self.dropped = 0
+    
+    def coalescing_key(self, msg: str):
+        # "SAFETY:30" and "SAFETY:35" replace each other, bare commands like "SAFETY" only replace themselves
+        name, sep, _ = msg.partition(":")
+        return name + sep
+    
+    def put(self, msg: str):
+        key = self.coalescing_key(msg)
+        
+        with self.lock:
+            if self.pending.pop(key, None) is not None:
+                self.coalesced += 1
+            elif len(self.pending) >= self.max_size:
+                self.pending.popitem(last=False)
+                self.dropped += 1
+            
+            self.pending[key] = msg
+    
+    def take_all(self):
+        with self.lock:
+            if not self.pending:
+                return []
+            
+            messages = list(self.pending.values())
+            self.pending.clear()
+            
+            self.sent += len(messages)
+            self.batches += 1
+        
+        return messages
+    
+    def clear(self):
+        with self.lock:
+            self.pending.clear()
+    
+    def depth(self):
+        return len(self.pending)
+    
+    def stats(self):
+        with self.lock:
+            return {
+                "depth": len(self.pending),
+                "sent": self.sent,
+                "batches": self.batches,
+                "coalesced": self.coalesced,
+                "dropped": self.dropped,
+            }
+
+
+class _LogFileWriter(QueueListener):
+    def enqueue_sentinel(self):
+        self.queue.put(self._sentinel)  # The queue is bounded, wait for room instead of failing on a full one
+
+class FrameLog:
+    # Recent frames and link events in memory, replaces printing every frame from the comm threads
+    def __init__(self, capacity: int = 2000, level: int = logging.DEBUG, rate: float = 100.0):
+        self.records: deque[tuple[int, float, int, str, str]] = deque(maxlen=capacity)  # seq, time, level, reader, message
+        self.level = level
+        self.rate = rate  # Records per second below WARNING, warnings and errors always get through
+        
+        self.lock = threading.Lock()
+        self.seq = 0
+        self.tokens = rate
+        self.last_refill = time.monotonic()
+        self.suppressed = 0
+        
+        self.file_queue: queue.Queue | None = None
+        self.file_listener: _LogFileWriter | None = None
+        self.file_dropped = 0
+    
+    def log(self, level: int, message: str, reader_id: str = ""):
+        if level < self.level:
+            return
+        
+        with self.lock:
+            if level < logging.WARNING:
+                now = time.monotonic()
+                self.tokens = min(self.rate, self.tokens + (now - self.last_refill) * self.rate)
+                self.last_refill = now
+                
+                if self.tokens < 1:
+                    self.suppressed += 1
+                    return
+                self.tokens -= 1
+            
+            self.seq += 1
+            record = (self.seq, time.time(), level, reader_id, message)
+            self.records.append(record)
+        
+        file_queue = self.file_queue
+        if file_queue is not None:
+            try:
+                file_queue.put_nowait(logging.makeLogRecord({"created": record[1], "levelno": level, "levelname": logging.getLevelName(level), "name": reader_id or "comm", "msg": message}))
+            except queue.Full:
+                self.file_dropped += 1  # Never wait on the disk from a comm thread
+    
+    def recent(self, after: int = 0, level: int = logging.NOTSET):
+        with self.lock:
+            records = list(self.records)
+        
+        return [record for record in records if record[0] > after and record[2] >= level]
+    
+    def start_file(self, path: str | os.PathLike, max_bytes: int = 1_048_576, backups: int = 3):
+        self.stop_file()
+        
+        handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups, encoding="utf-8")
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s %(message)s"))
+        
+        self.file_queue = queue.Queue(maxsize=10000)
+        self.file_listener = _LogFileWriter(self.file_queue, handler)
+        self.file_listener.start()  # Writes on its own thread
+    
+    def stop_file(self):
+        listener, self.file_listener = self.file_listener, None
+        self.file_queue = None
+        
+        if listener is not None:
+            listener.stop()
+            for handler in listener.handlers:
+                handler.close()
+    
+    def stats(self):
+        with self.lock:
+            return {
+                "records": len(self.records),
+                "logged": self.seq,
+                "suppressed": self.suppressed,
+                "file_dropped": self.file_dropped,
+            }
+
+
+class LatencyHistogram:
+    # Log-linear buckets: exact below 32 ns, then 16 per power of two (within ~6%), up to about a minute
+    SUB_BUCKETS = 16
+    MAX_NS = 60_000_000_000
+    
+    def __init__(self):
+        self.buckets = [0] * (self._index(self.MAX_NS) + 1)
+        self.count = 0
+        self.total = 0
+        self.max = 0
+    
+    def _index(self, ns: int):
+        if ns < 2 * self.SUB_BUCKETS:
+            return ns
+        
+        shift = ns.bit_length() - 5
+        return (shift << 4) + (ns >> shift)
+    
+    def _value(self, index: int):
+        if index < 2 * self.SUB_BUCKETS:
+            return index
+        
+        shift = index // self.SUB_BUCKETS - 1
+        return ((index - self.SUB_BUCKETS * shift) << shift) + (1 << shift) // 2
+    
+    def record(self, ns: int):
+        ns = min(max(ns, 0), self.MAX_NS)
+        
+        self.buckets[self._index(ns)] += 1
+        self.count += 1
+        self.total += ns
+        if ns > self.max:
+            self.max = ns
+    
+    def quantile(self, q: float):
+        if not self.count:
+            return 0
+        
+        target = q * self.count
+        seen = 0
+        for index, count in enumerate(self.buckets):
+            seen += count
+            if count and seen >= target:
+                return min(self._value(index), self.max)
+        
+        return self.max
+    
+    def reset(self):
+        self.buckets = [0] * len(self.buckets)
+        self.count = 0
+        self.total = 0
+        self.max = 0
+    
+    def summary(self):
+        return {
+            "count": self.count,
+            "mean_us": self.total / self.count / 1e3 if self.count else 0.0,
+            "p50_us": self.quantile(0.5) / 1e3,
+            "p95_us": self.quantile(0.95) / 1e3,
+            "p99_us": self.quantile(0.99) / 1e3,
+            "max_us": self.max / 1e3,
+        }
+
+class PipelineMetrics(QObject):
+    # read -> decode -> parse -> dispatch on the comm thread, then delivered once the queued slots ran
+    STAGES = ("decode", "parse", "dispatch", "delivered")
+    
+    _delivered = pyqtSignal(object)  # perf_counter_ns overflows a C int
+    
+    def __init__(self):
+        # Must be created on the GUI thread, delivered is measured there
+        super().__init__()
+        self.enabled = True
+        
+        self.lock = threading.Lock()
+        self.histograms: dict[str, LatencyHistogram] = {stage: LatencyHistogram() for stage in self.STAGES}
+        
+        self.frames = 0
+        self.bytes = 0
+        self.since = time.perf_counter()
+        self.last_snapshot = (self.since, 0, 0)
+        
+        self._delivered.connect(self._on_delivered)
+    
+    def record(self, stage: str, ns: int):
+        if not self.enabled:
+            return
+        
+        with self.lock:
+            histogram = self.histograms.get(stage)
+            if histogram is None:
+                histogram = self.histograms[stage] = LatencyHistogram()
+            histogram.record(ns)
+    
+    def batch_dispatched(self, read_ns: int, frames: int, amount: int):
+        with self.lock:
+            self.frames += frames
+            self.bytes += amount
+        
+        if self.enabled and frames:
+            # Posted after the widget signals of these frames, so it runs once their slots have
+            self._delivered.emit(read_ns)
+    
+    def timed_slot(self, name: str, slot: Callable):
+        stage = f"slot:{name}"
+        
+        def timed(*args):
+            start = time.perf_counter_ns()
+            try:
+                return slot(*args)
+            finally:
+                self.record(stage, time.perf_counter_ns() - start)
+        
+        return timed
+    
+    def reset(self):
+        with self.lock:
+            for histogram in self.histograms.values():
+                histogram.reset()
+            
+            self.frames = 0
+            self.bytes = 0
+            self.since = time.perf_counter()
+            self.last_snapshot = (self.since, 0, 0)
+    
+    def snapshot(self):
+        now = time.perf_counter()
+        
+        with self.lock:
+            last_time, last_frames, last_bytes = self.last_snapshot
+            self.last_snapshot = (now, self.frames, self.bytes)
+            
+            elapsed = max(now - self.since, 1e-9)
+            interval = max(now - last_time, 1e-9)
+            
+            return {
+                "elapsed_s": elapsed,
+                "frames": self.frames,
+                "bytes": self.bytes,
+                "frames_per_sec": self.frames / elapsed,
+                "bytes_per_sec": self.bytes / elapsed,
+                # Since the previous snapshot, for polling a live rate
+                "recent_frames_per_sec": (self.frames - last_frames) / interval,
+                "recent_bytes_per_sec": (self.bytes - last_bytes) / interval,
+                "stages": {stage: histogram.summary() for stage, histogram in self.histograms.items()},
+            }
+    
+    def dump(self, path: str | os.PathLike):
+        with open(path, "w") as file:
+            json.dump(self.snapshot(), file, indent=4)
+    
+    def _on_delivered(self, read_ns: int):
+        self.record("delivered", time.perf_counter_ns() - read_ns)
+
+
+class _CoalescedSignal:
+    def __init__(self, coalescer: "SignalCoalescer", topic: str, signal: pyqtBoundSignal):
+        self.coalescer = coalescer
+        self.topic = topic
+        self.signal = signal
+    
+    def emit(self, *args):
+        self.coalescer._post(self, args)
+
+class SignalCoalescer(QObject):
+    _kick = pyqtSignal()
+    
+    def __init__(self, frame_interval: float = 1 / 60):
+        # Must be created on the GUI thread, flushes run there
+        super().__init__()
+        self.frame_interval = frame_interval
+        
+        self.lock = threading.Lock()
+        self.pending: dict[_CoalescedSignal, tuple] = {}
+        self.scheduled = False
+        self.last_flush = 0.0
+        
+        self.delivered: dict[str, int] = {}
+        self.merged: dict[str, int] = {}
+        
+        self._kick.connect(self._schedule)
+    
+    def wrap(self, topic: str, signal: pyqtBoundSignal):
+        self.delivered.setdefault(topic, 0)
+        self.merged.setdefault(topic, 0)
+        
+        return _CoalescedSignal(self, topic, signal)
+    
+    def stats(self):
+        with self.lock:
+            return {topic: {"delivered": self.delivered[topic], "merged": self.merged[topic]} for topic in self.delivered}
+    
+    def _post(self, target: _CoalescedSignal, args: tuple):
+        with self.lock:
+            if target in self.pending:
+                self.merged[target.topic] += 1
+            self.pending[target] = args
+            
+            if self.scheduled:
+                return
+            self.scheduled = True
+        
+        self._kick.emit()  # Queued to the GUI thread when posted from a comm thread
+    
+    def _schedule(self):
+        delay = self.last_flush + self.frame_interval - time.perf_counter()
+        QTimer.singleShot(max(0, round(delay * 1000)), self._flush)
+    
+    def _flush(self):
+        with self.lock:
+            pending, self.pending = self.pending, {}
+            self.scheduled = False
+            
+            for target in pending:
+                self.delivered[target.topic] += 1
+        
+        self.last_flush = time.perf_counter()
+        
+        for target, args in pending.items():
+            target.signal.emit(*args)
+
+
+class DataPointRouter:
+    def __init__(self):
+        self.data_points: list[tuple[str | tuple[str, ...], pyqtBoundSignal]] = []
+        self.coalescer: SignalCoalescer | None = None
+        
+        # key -> (signal, extras) for single keys, key -> (group index, slot) for composite keys
+        # extras picks what follows the value: bit 0 the reader id, bit 1 the read time
+        self.key_routes: dict[str, list[tuple[pyqtBoundSignal, int]]] = {}
+        self.group_routes: dict[str, list[tuple[int, int]]] = {}
+        self.groups: list[tuple[tuple[str, ...], pyqtBoundSignal, int]] = []
+    
+    def set_data_point(self, key: str | list[str] | tuple[str, ...], signal: pyqtBoundSignal, with_reader: bool = False, coalesce: bool = False, with_time: bool = False):
+        extras = with_reader | (with_time << 1)
+        
+        if coalesce:
+            # Only the latest value per display frame reaches the slot, for streams faster than the widget can draw
+            if self.coalescer is None:
+                self.coalescer = SignalCoalescer()
+            signal = self.coalescer.wrap(key if isinstance(key, str) else "/".join(key), signal)
+        
+        if isinstance(key, str):
+            self.data_points.append((key, signal))
+            self.key_routes.setdefault(key, []).append((signal, extras))
+        elif isinstance(key, (list, tuple)):
+            key = tuple(key)
+            if len(set(key)) != len(key):
+                raise Exception(f"Duplicate keys in data point: {key}")
+            
+            self.data_points.append((key, signal))
+            
+            group_index = len(self.groups)
+            self.groups.append((key, signal, extras))
+            for slot, sub_key in enumerate(key):
+                self.group_routes.setdefault(sub_key, []).append((group_index, slot))
+        else:
+            raise Exception(f"Bad key type: {type(key)}")
+    
+    def dispatch(self, full_data: dict, reader_id: str, read_time: int = 0):
+        tails = ((), (reader_id, ), (read_time, ), (reader_id, read_time))
+        
+        # group index -> [slot values, slots still missing], only for groups touched by this frame
+        group_slots: dict[int, list] = {}
+        for key, info in full_data.items():
+            for d_signal, extras in self.key_routes.get(key, ()):
+                d_signal.emit(info, *tails[extras])
+            
+            for group_index, slot in self.group_routes.get(key, ()):
+                slots = group_slots.get(group_index)
+                if slots is None:
+                    group_size = len(self.groups[group_index][0])
+                    slots = group_slots[group_index] = [[None] * group_size, group_size]
+                
+                slots[0][slot] = info
+                slots[1] -= 1
+                if not slots[1]:
+                    _, d_signal, extras = self.groups[group_index]
+                    d_signal.emit(slots[0], *tails[extras])
+
 
 @dataclass
 class CommDevice:
@@ -17,21 +772,67 @@ class CommDevice:
     baud_rate: int | None = None
 
 class BaseCommSystem:
-    def __init__(self, device: CommDevice, error_func: Callable[[Exception], None]):
+    def __init__(self, device: CommDevice, error_func: Callable[[Exception], None], reader_id: str = "", router: DataPointRouter | None = None, metrics: PipelineMetrics | None = None, log: FrameLog | None = None):
         self.device = device
         self.error_func = error_func
+        self.reader_id = reader_id
         
         self.connected = False
         self.device.connection_changed.emit(self.connected)
         
-        self.connection_message = ""
-        self.data_points: list[tuple[int | str | list[str], pyqtBoundSignal]] = []
+        self.command_queue = CommandQueue()
+        self.router = router if router is not None else DataPointRouter()
+        self.metrics = metrics if metrics is not None else PipelineMetrics()
+        self.log = log if log is not None else FrameLog()
+        self._read_ns = 0  # When the bytes being processed came off the wire
+        self._read_time = 0  # The same moment in epoch seconds, for data points that record when they happened
+        self._batch_frames = 0
         
         self.direct_signal = self.device.live_data.data_signal
         self.connection_changed_signal = self.device.connection_changed
         
         self.serial_mode = False
         self.bluetooth_mode = False
+        self.init_wait = 2.0  # Arduinos reset when the port opens
+        
+        self.engine: "AsyncCommEngine | None" = None
+        self.connection_thread: Thread | None = None
+        
+        # A link that drops after it has worked once is retried in the background instead of crashing
+        self.auto_reconnect = True
+        self.reconnect_initial = 0.5
+        self.reconnect_max = 30.0
+        self.reconnect_stable = 10.0  # Seconds up before the backoff starts over
+        self.reconnect_attempt = 0
+        self._retry_now = False
+        
+        self.last_good_device: CommDevice | None = None
+        self.link_up_since: float | None = None
+        self.link_down_since: float | None = None
+        self.downtime = 0.0
+        self.outages = 0
+        self.reconnects = 0
+        self.frame_errors = 0
+        self.last_error = ""
+        
+        self.recorder: StreamRecorder | None = None
+        self.replay_path: str | os.PathLike | None = None
+        self.replay_speed = 1.0
+        
+        self.binary_requested = False
+        self.binary_active = False
+        self.binary_decoder = BinaryFrameDecoder()
+        self.line_buffer = LineFrameBuffer()
+        
+        self._wakeup_event = threading.Event()
+        self._wakeup_recv, self._wakeup_send = socket.socketpair()
+        self._wakeup_recv.setblocking(False)
+        self._wakeup_send.setblocking(False)
+        
+        # Connection threads and engine runs still using the wakeup sockets, close() leaves them to the last one out
+        self._close_lock = threading.Lock()
+        self._runs = 0
+        self.closed = False
     
     def set_bluetooth(self, a0: bool):
         self.bluetooth_mode = a0
@@ -39,123 +840,849 @@ class BaseCommSystem:
     def set_serial(self, a0: bool):
         self.serial_mode = a0
     
-    def set_data_point(self, key: int | str | list[str], signal: pyqtBoundSignal):
-        if isinstance(key, str):
-            self.data_points.append((key, signal))
-        elif isinstance(key, (list, set, tuple)):
-            self.data_points.append((list[key], signal))
-        else:
-            raise Exception(f"Bad key type: {type(key)}")
+    def set_binary(self, a0: bool):
+        self.binary_requested = a0
+    
+    def set_engine(self, engine: "AsyncCommEngine | None"):
+        self.engine = engine
+    
+    def set_replay(self, path: str | os.PathLike | None, speed: float = 1.0):
+        # speed is a multiple of real time, 0 replays as fast as the pipeline can take it
+        self.replay_path = path
+        self.replay_speed = speed
+    
+    def start_capture(self, path: str | os.PathLike):
+        self.stop_capture()
+        self.recorder = StreamRecorder(path)
+    
+    def stop_capture(self):
+        recorder, self.recorder = self.recorder, None
+        if recorder is not None:
+            recorder.close()
+    
+    def set_data_point(self, key: str | list[str] | tuple[str, ...], signal: pyqtBoundSignal, with_reader: bool = False, coalesce: bool = False, with_time: bool = False):
+        self.router.set_data_point(key, signal, with_reader, coalesce, with_time)
     
     def send_message(self, msg: str):
-        self.connection_message = msg.strip()
+        msg = msg.strip()
+        if msg:
+            self.command_queue.put(msg)
+            self._wake()
     
     def start_connection(self):
         if self.connected:
             raise Exception("Comm device already connected")
+        if self.closed:
+            raise Exception("Comm device is closed")
         
         self.connected = True
         self.device.connection_changed.emit(self.connected)
         
-        self.connection_thread = Thread(self._connect)
-        self.connection_thread.crashed.connect(self._crashed)
-        self.connection_thread.start()
+        if self.engine is not None:
+            self.connection_thread = None
+            self.engine.add(self)
+        else:
+            self._run_started()
+            self.connection_thread = Thread(self._run_thread)
+            self.connection_thread.crashed.connect(self._crashed)
+            self.connection_thread.start()
     
     def stop_connection(self):
         self.connected = False
         self.device.connection_changed.emit(self.connected)
+        self._wake()
+    
+    def close(self):
+        # For good, e.g. when the registry replaces this reader. The wakeup sockets go once the run has exited
+        if self.connected:
+            self.stop_connection()
+        
+        with self._close_lock:
+            self.closed = True
+            release = not self._runs
+        
+        if release:
+            self._release()
+    
+    def _run_started(self):
+        with self._close_lock:
+            self._runs += 1
+    
+    def _run_finished(self):
+        with self._close_lock:
+            self._runs -= 1
+            release = self.closed and not self._runs
+        
+        if release:
+            self._release()
+    
+    def _release(self):
+        self._wakeup_recv.close()
+        self._wakeup_send.close()
+    
+    def _wake(self):
+        self._wakeup_event.set()
+        try:
+            self._wakeup_send.send(b"\0")
+        except (BlockingIOError, OSError):
+            pass  # Wakeup already pending
+    
+    def _clear_wakeup(self):
+        self._wakeup_event.clear()
+        try:
+            while self._wakeup_recv.recv(64):
+                pass
+        except (BlockingIOError, OSError):
+            pass
+    
+    def link_stats(self):
+        now = time.monotonic()
+        current = now - self.link_down_since if self.link_down_since is not None else 0.0
+        
+        return {
+            "up": self.link_up_since is not None,
+            "down": self.link_down_since is not None,
+            "downtime": self.downtime + current,
+            "current_downtime": current,
+            "outages": self.outages,
+            "reconnects": self.reconnects,
+            "frame_errors": self.frame_errors,
+            "attempt": self.reconnect_attempt,
+            "last_error": self.last_error,
+        }
+    
+    def _link_up(self):
+        now = time.monotonic()
+        
+        if self.link_down_since is not None:
+            self.downtime += now - self.link_down_since
+            self.link_down_since = None
+            self.reconnects += 1
+        
+        self.link_up_since = now
+        self.last_good_device = replace(self.device)
+        
+        self.log.log(logging.INFO, f"Link up on {self.device.addr or self.device.port}", self.reader_id)
+    
+    def _link_down(self, e: Exception):
+        now = time.monotonic()
+        
+        if self.link_up_since is not None:
+            self.outages += 1
+            if now - self.link_up_since >= self.reconnect_stable:
+                self.reconnect_attempt = 0
+            self.link_up_since = None
+        
+        if self.link_down_since is None:
+            self.link_down_since = now
+        self.last_error = str(e)
+        
+        self.log.log(logging.WARNING, f"Link down: {e}", self.reader_id)
+        
+        # Replays and devices that never came up are reported, everything else is retried
+        if not (self.connected and self.auto_reconnect and self.last_good_device is not None and self.replay_path is None):
+            return None
+        
+        # Exponential backoff with jitter so a room full of readers doesn't reconnect in lockstep
+        delay = min(self.reconnect_max, self.reconnect_initial * 2 ** self.reconnect_attempt)
+        self.reconnect_attempt += 1
+        self.device = self.last_good_device
+        
+        return random.uniform(delay / 2, delay)
+    
+    def retry_now(self):
+        # The port is back (e.g. the hotplug watcher saw it), skip the rest of the backoff
+        self.reconnect_attempt = 0
+        self._retry_now = True
+        self._wake()
+    
+    def _run_thread(self):
+        try:
+            self._supervise()
+        finally:
+            self._run_finished()
+    
+    def _supervise(self):
+        while self.connected:
+            self._retry_now = False
+            
+            try:
+                self._connect()
+                return
+            except Exception as e:
+                if not self.connected:
+                    return  # Stopped while the link was failing
+                
+                delay = self._link_down(e)
+                if delay is None:
+                    raise
+            
+            deadline = time.monotonic() + delay
+            while self.connected and not self._retry_now and time.monotonic() < deadline:
+                if self._wakeup_event.wait(deadline - time.monotonic()):
+                    self._clear_wakeup()
     
     def _init_process_data(self, data: bytes):
         return data.decode().strip().removesuffix("|").strip()
     
+    def _frame_error(self, e: Exception):
+        # One garbled frame is line noise, not a dropped link. Only I/O errors reach _link_down
+        self.frame_errors += 1
+        self.log.log(logging.WARNING, f"Bad frame: {e}", self.reader_id)
+    
     def _crashed(self, e: Exception):
-        self.connection_thread.quit()
+        if self.connection_thread is not None:
+            self.connection_thread.quit()
         self.error_func(e)
     
     def _data_process(self, msg_recv: str):
+        start = time.perf_counter_ns()
         full_data = self._process_data(msg_recv)
+        self.metrics.record("parse", time.perf_counter_ns() - start)
         
-        data_key_mapping = {}
-        for key, info in full_data.items():
-            for d_k, d_signal in self.data_points:
-                if isinstance(d_k, str):
-                    if key == d_k:
-                        d_signal.emit(info)
-                        # break
-                elif isinstance(d_k, list):
-                    if key in d_k:
-                        if d_k not in data_key_mapping:
-                            data_key_mapping[d_k] = [None for _ in range(len(d_k))]
-                        data_key_mapping[d_k][d_k.index(key)] = info
-                        if None not in data_key_mapping[d_k]:
-                            d_signal.emit(data_key_mapping[d_k])
-                            # break
+        if self.binary_requested and full_data.get("PROTOCOL") == "BINARY":
+            self.binary_active = True
         
+        self._dispatch_frame(full_data)
+    
+    def _binary_data_process(self, data: bytes):
+        # Binary payloads come out already typed, so decode covers parsing too
+        start = time.perf_counter_ns()
+        frames = self.binary_decoder.feed(data, self._frame_error)
+        if frames:
+            self.metrics.record("decode", (time.perf_counter_ns() - start) // len(frames))
+        
+        for full_data in frames:
+            self._dispatch_frame(full_data)
+    
+    def _dispatch_frame(self, full_data: dict):
+        start = time.perf_counter_ns()
+        self.router.dispatch(full_data, self.reader_id, self._read_time)
+        
+        if self.reader_id:
+            full_data["reader"] = self.reader_id
         self.direct_signal.emit(full_data)
+        
+        self.metrics.record("dispatch", time.perf_counter_ns() - start)
+        self._batch_frames += 1
     
     def _connect(self):
-        if self.serial_mode:
+        if self.replay_path is not None:
+            self._replay_loop()
+        elif self.serial_mode:
             assert self.device.baud_rate is not None, "Invalid device"
             
             serial_target = serial.Serial(self.device.port, self.device.baud_rate, timeout=1)
             
-            time.sleep(2)  # Wait for Target to initialize
+            time.sleep(self.init_wait)  # Wait for Target to initialize
             
-            while self.connected:
-                if self.connection_message:
-                    serial_target.write(self.connection_message.encode())
-                
-                if serial_target.in_waiting > 0:
-                    msg_recv = self._init_process_data(serial_target.readline())
-                    
-                    if msg_recv:
-                        print(msg_recv)
-                        self._data_process(msg_recv)
-                
-                self.connection_message = ""
+            self._reset_protocol()
+            self._link_up()
+            
+            if os.name == "posix":
+                self._serial_select_loop(serial_target)
+            else:
+                self._serial_wait_loop(serial_target)
             
             serial_target.close()
         elif self.bluetooth_mode:
-            assert self.device.baud_rate is not None, "Invalid device"
+            assert self.device.addr is not None, "Invalid device"
             
             with socket.socket(socket.AF_BLUETOOTH, socket.SOCK_STREAM, socket.BTPROTO_RFCOMM) as bt_comm:
                 bt_comm.connect((self.device.addr, self.device.port))
                 
-                while self.connected:
-                    bt_comm.send(self.connection_message.encode())
-                    msg_recv = self._init_process_data(bt_comm.recv(1024))
+                self._reset_protocol()
+                self._link_up()
+                
+                self._bluetooth_select_loop(bt_comm)
+    
+    def _reset_protocol(self):
+        self.binary_active = False
+        self.binary_decoder.reset()
+        self.line_buffer.reset()
+        
+        if self.binary_requested:
+            self.command_queue.put(BINARY_HANDSHAKE)
+    
+    def _send_pending(self, write: Callable[[bytes], object]):
+        messages = self.command_queue.take_all()
+        
+        if self.binary_active:
+            # Firmware that answered the handshake takes newline terminated commands, so a whole batch goes out in one write
+            if messages:
+                write("".join(f"{msg}\n" for msg in messages).encode())
+        else:
+            # The original framing: each command bare in its own write, older firmware compares the raw string
+            for msg in messages:
+                write(msg.encode())
+    
+    def _bluetooth_select_loop(self, bt_comm: socket.socket):
+        with selectors.DefaultSelector() as selector:
+            selector.register(bt_comm, selectors.EVENT_READ, "bluetooth")
+            selector.register(self._wakeup_recv, selectors.EVENT_READ, "wakeup")
+            
+            while self.connected:
+                self._send_pending(bt_comm.sendall)
+                
+                for key, _ in selector.select(timeout=1):
+                    if key.data == "wakeup":
+                        self._clear_wakeup()
+                    else:
+                        data = bt_comm.recv(1024)
+                        
+                        if not data:
+                            raise Exception("Bluetooth device closed the connection")
+                        
+                        self._stream_data_process(data)
+    
+    def _stream_data_process(self, data: bytes):
+        self._read_ns = time.perf_counter_ns()
+        self._read_time = int(time.time())
+        self._batch_frames = 0
+        
+        recorder = self.recorder
+        if recorder is not None:
+            recorder.record(data)
+        
+        self._decode_stream(data)
+        self.metrics.batch_dispatched(self._read_ns, self._batch_frames, len(data))
+    
+    def _decode_stream(self, data: bytes):
+        mark = self._read_ns
+        
+        if not self.binary_active:
+            for line in self.line_buffer.feed(data):
+                try:
+                    msg_recv = self._init_process_data(line)
                     
                     if msg_recv:
+                        # Line splitting and utf-8 decoding since the read or the previous frame
+                        self.metrics.record("decode", time.perf_counter_ns() - mark)
+                        self.log.log(logging.DEBUG, msg_recv, self.reader_id)
                         self._data_process(msg_recv)
-                    
-                    self.connection_message = ""
+                except Exception as e:
+                    self._frame_error(e)
+                
+                mark = time.perf_counter_ns()
+                
+                if self.binary_active:
+                    # The device switched right after its handshake reply, so the rest is binary
+                    data = self.line_buffer.drain()
+                    break
+            else:
+                return
+        
+        self._binary_data_process(data)
     
-    def _process_data(self, data: str):
-        processed_data = {}
-        for sub_data_string in data.split("|"):
-            name, data = sub_data_string.strip().split(":")
+    def _replay_delay(self, start: int, timestamp: int):
+        if not self.replay_speed:
+            return 0
+        
+        return (start + timestamp / self.replay_speed - time.perf_counter_ns()) / 1e9
+    
+    def _replay_loop(self):
+        self._reset_protocol()
+        
+        start = time.perf_counter_ns()
+        for timestamp, data in read_capture(self.replay_path):
+            delay = self._replay_delay(start, timestamp)
+            while self.connected and delay > 0:
+                if self._wakeup_event.wait(delay):
+                    self._clear_wakeup()
+                delay = self._replay_delay(start, timestamp)
             
-            processed_data[name] = self._process_sub_data(data)
+            if not self.connected:
+                return
+            
+            self._send_pending(lambda _: None)  # Nothing to answer commands during a replay
+            self._stream_data_process(data)
         
-        return processed_data
+        self.stop_connection()
+    
+    def _serial_read(self, serial_target: serial.Serial):
+        self._stream_data_process(serial_target.read(serial_target.in_waiting or 1))
+    
+    def _serial_select_loop(self, serial_target: serial.Serial):
+        # Sleeps in the kernel until the port has bytes or send_message/stop_connection wakes us up
+        with selectors.DefaultSelector() as selector:
+            selector.register(serial_target.fileno(), selectors.EVENT_READ, "serial")
+            selector.register(self._wakeup_recv, selectors.EVENT_READ, "wakeup")
+            
+            while self.connected:
+                self._send_pending(serial_target.write)
+                
+                for key, _ in selector.select(timeout=1):
+                    if key.data == "wakeup":
+                        self._clear_wakeup()
+                
+                while self.connected and serial_target.in_waiting > 0:
+                    self._serial_read(serial_target)
+    
+    def _serial_wait_loop(self, serial_target: serial.Serial):
+        # Serial handles are not selectable on Windows, so wait on the wakeup event between short polls
+        while self.connected:
+            self._send_pending(serial_target.write)
+            
+            if serial_target.in_waiting > 0:
+                self._serial_read(serial_target)
+            elif self._wakeup_event.wait(0.01):
+                self._clear_wakeup()
     
-    def _process_sub_data(self, data: str):
-        data = data.strip()
+    def _process_data(self, data: str):
+        return parse_frame(data)
+
+
+class _ReaderConnectionChanged:
+    def __init__(self, registry: "ReaderRegistry", reader_id: str):
+        self.registry = registry
+        self.reader_id = reader_id
+        self.removed = False  # The reader's run can outlive it, by then the id may belong to its replacement
+    
+    def emit(self, state: bool):
+        if not self.removed:
+            self.registry._reader_connection_changed(self.reader_id, state)
+
+class ReaderRegistry:
+    def __init__(self, live_data: LiveData, connection_changed: pyqtBoundSignal, error_func: Callable[[Exception, str], None]):
+        self.live_data = live_data
+        self.error_func = error_func
         
-        var_type = data[:data.find("(")]
+        self.router = DataPointRouter()
+        self.metrics = PipelineMetrics()  # Shared, so the numbers cover every gate
+        self.log = FrameLog()
+        self.readers: dict[str, BaseCommSystem] = {}
+        self.connected_readers: set[str] = set()
+        
+        # Widgets subscribe to the registry exactly like a single BaseCommSystem
+        self.connected = False
+        self.direct_signal = live_data.data_signal
+        self.connection_changed_signal = connection_changed
+        self.connection_changed_signal.emit(self.connected)
+    
+    def add_reader(self, reader_id: str, port: int | str, addr: str | None = None, baud_rate: int | None = None):
+        if reader_id in self.readers:
+            self.remove_reader(reader_id)
         
-        data = data.removeprefix(var_type).strip().removeprefix(f"(").removesuffix(")")
+        device = CommDevice(self.live_data, _ReaderConnectionChanged(self, reader_id), port, addr, baud_rate)
+        reader = BaseCommSystem(device, lambda e: self.error_func(e, reader_id), reader_id, self.router, self.metrics, self.log)
+        self.readers[reader_id] = reader
         
-        if var_type == "collection":
-            data = [self._process_sub_data(sub_data) for sub_data in data.split(",")]
-        elif var_type == "str":
-            data = data
-        elif var_type == "number":
-            data = float(data)
+        return reader
+    
+    def remove_reader(self, reader_id: str):
+        reader = self.readers.pop(reader_id, None)
+        if reader is not None:
+            reader.device.connection_changed.removed = True
+            reader.close()
+        
+        self._reader_connection_changed(reader_id, False)
+    
+    def stop_reader(self, reader_id: str):
+        reader = self.readers.get(reader_id)
+        if reader is not None and reader.connected:
+            reader.stop_connection()
+    
+    def stop_all(self):
+        for reader in list(self.readers.values()):
+            if reader.connected:
+                reader.stop_connection()
+    
+    def set_data_point(self, key: str | list[str] | tuple[str, ...], signal: pyqtBoundSignal, with_reader: bool = False, coalesce: bool = False, with_time: bool = False):
+        self.router.set_data_point(key, signal, with_reader, coalesce, with_time)
+    
+    def link_stats(self):
+        return {reader_id: reader.link_stats() for reader_id, reader in self.readers.items() if reader.connected}
+    
+    def port_appeared(self, port: str):
+        for reader in self.readers.values():
+            device = reader.last_good_device or reader.device
+            
+            if reader.connected and reader.link_down_since is not None and device.port == port:
+                reader.retry_now()
+    
+    def start_capture(self, directory: str | os.PathLike):
+        for reader_id, reader in self.readers.items():
+            reader.start_capture(os.path.join(directory, re.sub(r"[^\w.-]", "_", reader_id) + ".rfidcap"))
+    
+    def stop_capture(self):
+        for reader in self.readers.values():
+            reader.stop_capture()
+    
+    def send_message(self, msg: str, reader_id: str | None = None):
+        if reader_id is not None:
+            self.readers[reader_id].send_message(msg)
         else:
-            raise Exception(f"Type: ({var_type}) is not a valid type")
+            for reader in self.readers.values():
+                if reader.connected:
+                    reader.send_message(msg)
+    
+    def _reader_connection_changed(self, reader_id: str, state: bool):
+        if state:
+            self.connected_readers.add(reader_id)
+        else:
+            self.connected_readers.discard(reader_id)
         
-        return data
+        if self.connected != bool(self.connected_readers):
+            self.connected = bool(self.connected_readers)
+            self.connection_changed_signal.emit(self.connected)
+
+
+class SerialHotplugWatcher(QObject):
+    port_added = pyqtSignal(str)
+    port_removed = pyqtSignal(str)
+    
+    # USB serial adapters, Arduinos and bound RFCOMM channels, plus the macOS names
+    PORT_NAME = re.compile(r"tty(?:USB|ACM)\d+|rfcomm\d+|cu\.usb\S*|tty\.usb\S*")
+    
+    _IN_ATTRIB = 0x004
+    _IN_CREATE = 0x100
+    _IN_DELETE = 0x200
+    _IN_Q_OVERFLOW = 0x4000
+    _INOTIFY_EVENT = struct.Struct("iIII")
+    
+    def __init__(self, directory: str = "/dev", poll_interval: float = 2.0):
+        super().__init__()
+        self.directory = directory
+        self.poll_interval = poll_interval
+        
+        self.lock = threading.Lock()
+        self.known: set[str] = set()
+        
+        self.mode: str | None = None  # "inotify" or "poll"
+        self.thread: threading.Thread | None = None
+        self.stop_event = threading.Event()
+        self._stop_recv, self._stop_send = socket.socketpair()
+        self._stop_recv.setblocking(False)  # Drained in stop(), Windows has no MSG_DONTWAIT
+    
+    def ports(self):
+        with self.lock:
+            return sorted(self.known)
+    
+    def start(self):
+        if self.thread is not None and self.thread.is_alive():
+            return
+        
+        self.stop_event.clear()
+        with self.lock:
+            self.known = self._list_ports()
+        
+        self.mode = "poll"  # Not Linux, or inotify is unavailable/out of watches
+        target = self._poll_loop
+        if sys.platform.startswith("linux"):
+            try:
+                inotify_fd = self._inotify_open()
+                self.mode = "inotify"
+                target = lambda: self._inotify_loop(inotify_fd)
+            except (OSError, AttributeError):
+                pass
+        
+        self.thread = threading.Thread(target=target, name="serial-hotplug", daemon=True)
+        self.thread.start()
+    
+    def stop(self):
+        self.stop_event.set()
+        self._stop_send.send(b"\0")
+        
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        
+        try:
+            while self._stop_recv.recv(64):
+                pass
+        except (BlockingIOError, OSError):
+            pass
+    
+    def _list_ports(self):
+        if os.path.isdir(self.directory):
+            return {os.path.join(self.directory, name) for name in os.listdir(self.directory) if self.PORT_NAME.fullmatch(name)}
+        
+        return {port.device for port in comports()}  # No /dev to look at, e.g. Windows
+    
+    def _apply(self, current: set[str]):
+        with self.lock:
+            added = current - self.known
+            removed = self.known - current
+            self.known = current
+        
+        for port in sorted(removed):
+            self.port_removed.emit(port)
+        for port in sorted(added):
+            self.port_added.emit(port)
+    
+    def _inotify_open(self):
+        libc = ctypes.CDLL(None, use_errno=True)
+        
+        fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        
+        # IN_ATTRIB as well, udev may create the node before it fixes up its permissions
+        if libc.inotify_add_watch(fd, os.fsencode(self.directory), self._IN_CREATE | self._IN_DELETE | self._IN_ATTRIB) < 0:
+            error = ctypes.get_errno()
+            os.close(fd)
+            raise OSError(error, f"inotify_add_watch {self.directory} failed")
+        
+        return fd
+    
+    def _inotify_loop(self, inotify_fd: int):
+        with selectors.DefaultSelector() as selector:
+            selector.register(inotify_fd, selectors.EVENT_READ)
+            selector.register(self._stop_recv, selectors.EVENT_READ)
+            
+            try:
+                while not self.stop_event.is_set():
+                    if not any(key.fd == inotify_fd for key, _ in selector.select()):
+                        continue
+                    
+                    try:
+                        data = os.read(inotify_fd, 4096)
+                    except BlockingIOError:
+                        continue
+                    
+                    with self.lock:
+                        current = set(self.known)
+                    
+                    offset = 0
+                    while offset < len(data):
+                        _, mask, _, length = self._INOTIFY_EVENT.unpack_from(data, offset)
+                        name = data[offset + self._INOTIFY_EVENT.size:offset + self._INOTIFY_EVENT.size + length].rstrip(b"\0").decode(errors="replace")
+                        offset += self._INOTIFY_EVENT.size + length
+                        
+                        if mask & self._IN_Q_OVERFLOW:
+                            current = self._list_ports()  # Lost events, resync with a single listing
+                        elif self.PORT_NAME.fullmatch(name):
+                            path = os.path.join(self.directory, name)
+                            
+                            if mask & self._IN_DELETE:
+                                current.discard(path)
+                            elif os.path.exists(path):
+                                current.add(path)
+                    
+                    self._apply(current)
+            finally:
+                os.close(inotify_fd)
+    
+    def _poll_loop(self):
+        while not self.stop_event.wait(self.poll_interval):
+            self._apply(self._list_ports())
+
+
+class _CommEngineSignals(QObject):
+    crashed = pyqtSignal(object, Exception)
+
+class AsyncCommEngine:
+    def __init__(self):
+        # Created on the GUI thread, so crashes are delivered there like Thread.crashed
+        self.signals = _CommEngineSignals()
+        self.signals.crashed.connect(lambda comm_system, e: comm_system._crashed(e))
+        
+        self.loop: asyncio.AbstractEventLoop | None = None
+        self.thread: threading.Thread | None = None
+        
+        # id(comm_system) -> its run. Only touched on the loop thread, and a cancelled run finishes after its
+        # restart was stored, so a run only removes its own entry
+        self.connections: dict[int, asyncio.Task] = {}
+    
+    def start(self):
+        if self.thread is not None and self.thread.is_alive():
+            return
+        
+        # Selector loop on every platform since we need add_reader for serial fds
+        self.loop = asyncio.SelectorEventLoop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="comm-engine", daemon=True)
+        self.thread.start()
+    
+    def stop(self):
+        if self.loop is None:
+            return
+        
+        # The runs unwind on the loop before it stops, closing their ports and removing their fd readers
+        asyncio.run_coroutine_threadsafe(self._cancel_all(), self.loop).result()
+        
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+        
+        self.loop = None
+        self.thread = None
+    
+    def add(self, comm_system: BaseCommSystem):
+        if comm_system.serial_mode and os.name != "posix":
+            raise Exception("The shared event loop can only drive serial ports on POSIX systems")
+        
+        self.start()
+        self.remove(comm_system)  # A restarted reader must not leave the old coroutine backing off
+        
+        comm_system._run_started()
+        self.loop.call_soon_threadsafe(self._spawn, comm_system)
+    
+    def remove(self, comm_system: BaseCommSystem):
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self._cancel, comm_system)
+    
+    def _spawn(self, comm_system: BaseCommSystem):
+        # The done callback also fires for a task cancelled before its first step, whose finally never runs
+        task = self.loop.create_task(self._run(comm_system))
+        task.add_done_callback(lambda _: comm_system._run_finished())
+        self.connections[id(comm_system)] = task
+    
+    def _cancel(self, comm_system: BaseCommSystem):
+        task = self.connections.pop(id(comm_system), None)
+        if task is not None:
+            task.cancel()
+    
+    async def _cancel_all(self):
+        # Runs already cancelled by remove() may still be unwinding, so every task on the loop is waited for
+        tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        
+        await asyncio.gather(*tasks, return_exceptions=True)
+    
+    async def _run(self, comm_system: BaseCommSystem):
+        try:
+            while comm_system.connected:
+                comm_system._retry_now = False
+                
+                try:
+                    await self._connect(comm_system)
+                    return
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    if not comm_system.connected:
+                        return
+                    
+                    delay = comm_system._link_down(e)
+                    if delay is None:
+                        self.signals.crashed.emit(comm_system, e)
+                        return
+                
+                await self._backoff(comm_system, delay)
+        finally:
+            if self.connections.get(id(comm_system)) is asyncio.current_task():
+                del self.connections[id(comm_system)]
+    
+    async def _connect(self, comm_system: BaseCommSystem):
+        if comm_system.replay_path is not None:
+            await self._run_replay(comm_system)
+        elif comm_system.serial_mode:
+            await self._run_serial(comm_system)
+        elif comm_system.bluetooth_mode:
+            await self._run_bluetooth(comm_system)
+    
+    async def _backoff(self, comm_system: BaseCommSystem, delay: float):
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + delay
+        
+        # Sleep out the delay, stop_connection and retry_now wake us up early
+        while comm_system.connected and not comm_system._retry_now and loop.time() < deadline:
+            woken = loop.create_future()
+            loop.add_reader(comm_system._wakeup_recv, lambda: woken.done() or woken.set_result(None))
+            
+            try:
+                await asyncio.wait((woken, ), timeout=deadline - loop.time())
+            finally:
+                loop.remove_reader(comm_system._wakeup_recv)
+            
+            comm_system._clear_wakeup()
+    
+    async def _run_replay(self, comm_system: BaseCommSystem):
+        comm_system._reset_protocol()
+        
+        start = time.perf_counter_ns()
+        for index, (timestamp, data) in enumerate(read_capture(comm_system.replay_path)):
+            delay = comm_system._replay_delay(start, timestamp)
+            while comm_system.connected and delay > 0:
+                await asyncio.sleep(min(delay, 1))
+                delay = comm_system._replay_delay(start, timestamp)
+            
+            if not comm_system.connected:
+                return
+            
+            comm_system._send_pending(lambda _: None)
+            comm_system._stream_data_process(data)
+            
+            if index % 64 == 63:
+                await asyncio.sleep(0)  # Let the other devices run during a max speed replay
+        
+        comm_system.stop_connection()
+    
+    async def _run_serial(self, comm_system: BaseCommSystem):
+        assert comm_system.device.baud_rate is not None, "Invalid device"
+        
+        serial_target = serial.Serial(comm_system.device.port, comm_system.device.baud_rate, timeout=0)
+        
+        try:
+            await asyncio.sleep(comm_system.init_wait)  # Wait for Target to initialize, without holding up the other devices
+            
+            comm_system._reset_protocol()
+            comm_system._link_up()
+            
+            await self._pump(comm_system, serial_target.fileno(), lambda: serial_target.read(serial_target.in_waiting or 1), serial_target.write)
+        finally:
+            serial_target.close()
+    
+    async def _run_bluetooth(self, comm_system: BaseCommSystem):
+        assert comm_system.device.addr is not None, "Invalid device"
+        
+        def read():
+            data = bt_comm.recv(1024)
+            if not data:
+                raise Exception("Bluetooth device closed the connection")
+            
+            return data
+        
+        with socket.socket(socket.AF_BLUETOOTH, socket.SOCK_STREAM, socket.BTPROTO_RFCOMM) as bt_comm:
+            bt_comm.setblocking(False)
+            await asyncio.get_running_loop().sock_connect(bt_comm, (comm_system.device.addr, comm_system.device.port))
+            
+            comm_system._reset_protocol()
+            comm_system._link_up()
+            
+            await self._pump(comm_system, bt_comm.fileno(), read, bt_comm.sendall)
+    
+    async def _pump(self, comm_system: BaseCommSystem, fd: int, read: Callable[[], bytes], write: Callable[[bytes], object]):
+        loop = asyncio.get_running_loop()
+        finished = loop.create_future()
+        
+        def on_readable():
+            try:
+                data = read()
+                if data:
+                    comm_system._stream_data_process(data)
+            except Exception as e:
+                if not finished.done():
+                    finished.set_exception(e)
+        
+        def on_wakeup():
+            comm_system._clear_wakeup()
+            
+            try:
+                comm_system._send_pending(write)
+            except Exception as e:
+                if not finished.done():
+                    finished.set_exception(e)
+            
+            if not comm_system.connected and not finished.done():
+                finished.set_result(None)
+        
+        loop.add_reader(fd, on_readable)
+        loop.add_reader(comm_system._wakeup_recv, on_wakeup)
+        
+        try:
+            comm_system._send_pending(write)
+            
+            # stop_connection wakes us up, the timeout covers code that only clears connected
+            while comm_system.connected and not finished.done():
+                await asyncio.wait((finished, ), timeout=1)
+            
+            if finished.done():
+                finished.result()
+        finally:
+            loop.remove_reader(fd)
+            loop.remove_reader(comm_system._wakeup_recv)
 
 
 
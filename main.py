@@ -1,29 +1,173 @@
 
-from typing import Any
+from typing import Any, Callable
 from PyQt6.QtWidgets import (
     QWidget, QVBoxLayout, QHBoxLayout,
     QApplication, QMainWindow,
-    QDialog, QComboBox, QLineEdit
+    QDialog, QComboBox, QLineEdit,
+    QCheckBox, QFileDialog, QInputDialog,
+    QPlainTextEdit
 )
 
+import os
 import sys
+import time
+import logging
+import threading
 import asyncio
 import bluetooth as bt_classic
+from collections import OrderedDict, deque
 from bleak import BleakScanner
-from PyQt6.QtCore import pyqtSignal
+from PyQt6.QtCore import QObject, QTimer, pyqtSignal
 from theme.theme import THEME_MANAGER
 from PyQt6.QtGui import QAction, QIntValidator
-from serial.tools.list_ports import comports
 
 from communication import *
 from models.data_models import *
 from models.object_models import *
 from widgets.base_widgets import *
 from widgets.section_widgets import *
+from storage import AttendanceDatabase
 
-class SetupScreen(QDialog):
-    update_signal = pyqtSignal(dict, list)
+DATABASE_PATH = "attendance.db"
+
+class DeviceDiscovery(QObject):
+    found = pyqtSignal(str, str, str)  # "bt", address, name
+    failed = pyqtSignal(str, Exception)  # Scanner, e.g. no adapter or no D-Bus. The other scanner keeps going
+    finished = pyqtSignal()
+    
+    def __init__(self, inquiry_rounds: int = 3, ble_timeout: float = 8.0):
+        super().__init__()
+        self.inquiry_rounds = inquiry_rounds  # Classic inquiry runs in short rounds so it streams and can be cancelled
+        self.ble_timeout = ble_timeout
+        
+        self.cancel_event = threading.Event()
+        self.workers: set[Thread] = set()
+        self.running = False
+    
+    def start(self):
+        self.cancel()
+        
+        cancel_event = self.cancel_event = threading.Event()
+        scans = {"Bluetooth": self._scan_classic, "Bluetooth LE": self._scan_ble}
+        workers = {scanner: Thread(lambda scan=scan: scan(cancel_event)) for scanner, scan in scans.items()}
+        
+        self.running = True
+        pending = [len(workers)]
+        
+        def worker_finished(worker: Thread):
+            self.workers.discard(worker)
+            
+            pending[0] -= 1
+            if not pending[0] and cancel_event is self.cancel_event:
+                self.running = False
+                self.finished.emit()
+        
+        def worker_crashed(scanner: str, e: Exception):
+            if cancel_event is self.cancel_event:
+                self.failed.emit(scanner, e)
+        
+        for scanner, worker in workers.items():
+            worker.crashed.connect(lambda e, scanner=scanner: worker_crashed(scanner, e))
+            worker.finished.connect(lambda worker=worker: worker_finished(worker))
+            self.workers.add(worker)  # Keep finished-but-cancelled runs alive until their threads exit
+            worker.start()
+    
+    def cancel(self):
+        self.cancel_event.set()
+        
+        if self.running:
+            self.running = False
+            self.finished.emit()
+    
+    def _found(self, cancel_event: threading.Event, kind: str, address: str, name: str):
+        if not cancel_event.is_set():
+            self.found.emit(kind, address, name)
+    
+    def _scan_classic(self, cancel_event: threading.Event):
+        names: dict[str, str] = {}
+        
+        for _ in range(self.inquiry_rounds):
+            if cancel_event.is_set():
+                return
+            
+            # duration is in 1.28 s units, names are looked up separately so addresses show up right away
+            new = [addr for addr in bt_classic.discover_devices(duration=2, lookup_names=False) if addr not in names]
+            
+            for addr in new:
+                names[addr] = ""
+                self._found(cancel_event, "bt", addr, "")
+            
+            for addr in new:
+                if cancel_event.is_set():
+                    return
+                
+                names[addr] = bt_classic.lookup_name(addr) or ""
+                if names[addr]:
+                    self._found(cancel_event, "bt", addr, names[addr])
+    
+    def _scan_ble(self, cancel_event: threading.Event):
+        names: dict[str, str] = {}
+        
+        def detected(device, advertisement_data):
+            name = device.name or advertisement_data.local_name or ""
+            
+            # Advertisements repeat many times a second, only report new devices and newly learned names
+            if names.get(device.address) != name and not (name == "" and device.address in names):
+                names[device.address] = name
+                self._found(cancel_event, "bt", device.address, name)
+        
+        async def scan():
+            async with BleakScanner(detection_callback=detected):
+                deadline = time.monotonic() + self.ble_timeout
+                while not cancel_event.is_set() and time.monotonic() < deadline:
+                    await asyncio.sleep(0.1)
+        
+        asyncio.run(scan())
+
+class DiscoveryCache:
+    def __init__(self, ttls: dict[str, float]):
+        self.ttls = ttls
+        
+        # kind -> address -> (name, last seen), least recently seen first
+        self.entries: dict[str, OrderedDict[str, tuple[str, float]]] = {kind: OrderedDict() for kind in ttls}
+    
+    def seen(self, kind: str, address: str, name: str, now: float | None = None):
+        now = time.monotonic() if now is None else now
+        entries = self.entries[kind]
+        
+        previous = entries.pop(address, None)
+        if previous is not None and not name:
+            name = previous[0]  # Scanners that don't know the name don't erase it
+        entries[address] = (name, now)
+        
+        if previous is None:
+            return "added"
+        elif name != previous[0]:
+            return "renamed"
+        return None
     
+    def name(self, kind: str, address: str):
+        return self.entries[kind][address][0]
+    
+    def forget(self, kind: str, address: str):
+        return self.entries[kind].pop(address, None) is not None
+    
+    def expire(self, now: float | None = None):
+        now = time.monotonic() if now is None else now
+        expired = []
+        
+        for kind, entries in self.entries.items():
+            while entries:
+                address, (_, last_seen) = next(iter(entries.items()))
+                if now - last_seen < self.ttls[kind]:
+                    break
+                
+                del entries[address]
+                expired.append((kind, address))
+        
+        return expired
+
+class SetupScreen(QDialog):
     def __init__(self, parent: 'Window'):
         super().__init__(parent=parent)
         
@@ -33,16 +177,34 @@ class SetupScreen(QDialog):
         self.setFixedWidth(700)
         self.setFixedHeight(500)
         
-        self.ble_scanner = BleakScanner()
+        self.discovery = DeviceDiscovery()
+        self.discovery.found.connect(self._device_found)
+        self.discovery.failed.connect(self._discovery_failed)
+        self.discovery.finished.connect(self._discovery_finished)
+        
+        # Scanner -> why its last run failed, shown next to Refresh and logged once per new problem
+        self.log = parent.target_connector.log
+        self.discovery_errors: dict[str, str] = {}
+        self.failed_scanners: set[str] = set()
+        
+        # Bluetooth devices stay listed until they haven't been seen for their TTL, rescans only refresh timestamps.
+        # Serial ports come and go with the hotplug watcher instead of being rescanned
+        self.discovery_cache = DiscoveryCache({"ser": float("inf"), "bt": 30.0})
+        
+        self.port_watcher = parent.port_watcher
+        self.port_watcher.port_added.connect(lambda port: self._device_found("ser", port, ""))
+        self.port_watcher.port_removed.connect(self._port_removed)
+        self.auto_refresh = True
+        self.refresh_interval = 2000
+        
+        self.expiry_timer = QTimer(self)
+        self.expiry_timer.timeout.connect(self._expire_devices)
         
         self.connected = False
         self.data: dict[str, str | int | Literal["bluetooth", "serial"]] = {}
         
         
         
-        self.connection_thread = Thread(self.refresh_all)
-        self.connection_thread.crashed.connect(parent.connection_error_func)
-        
         layout = QVBoxLayout()
         self.setLayout(layout)
         
@@ -62,7 +224,7 @@ class SetupScreen(QDialog):
         _, serial_upper_buttons_layout = create_widget(serial_layout, QHBoxLayout)
         
         serial_refresh_button = QPushButton("Refresh")
-        serial_refresh_button.clicked.connect(lambda: self.refresh("ser", serial_refresh_button))
+        serial_refresh_button.clicked.connect(self.refresh)
         
         connect_button = QPushButton("Connect")
         connect_button.clicked.connect(self.serial_connect_clicked(-1))
@@ -70,13 +232,10 @@ class SetupScreen(QDialog):
         serial_upper_buttons_layout.addWidget(serial_refresh_button, alignment=Qt.AlignmentFlag.AlignTop | Qt.AlignmentFlag.AlignLeft)
         serial_upper_buttons_layout.addWidget(connect_button, alignment=Qt.AlignmentFlag.AlignTop | Qt.AlignmentFlag.AlignRight)
         
-        self.port_options = []
-        
         serial_ports_widget, serial_ports_layout = create_widget(None, QHBoxLayout)
         serial_layout.addWidget(serial_ports_widget)
         
         self.port_selector_widget = QComboBox()
-        self.port_selector_widget.addItems(self.port_options)
         
         serial_ports_layout.addWidget(QLabel("Ports"))
         serial_ports_layout.addWidget(self.port_selector_widget)
@@ -92,17 +251,22 @@ class SetupScreen(QDialog):
         serial_baud_rate_layout.addWidget(QLabel("Baud rate"))
         serial_baud_rate_layout.addWidget(self.baud_rate_selector_widget)
         
+        _, bluetooth_upper_buttons_layout = create_widget(bluetooth_layout, QHBoxLayout)
+        
         bluetooth_refesh_button = QPushButton("Refresh")
-        bluetooth_refesh_button.clicked.connect(lambda: self.refresh("bt", bluetooth_refesh_button))
+        bluetooth_refesh_button.clicked.connect(self.refresh)
         
-        bluetooth_layout.addWidget(bluetooth_refesh_button, alignment=Qt.AlignmentFlag.AlignTop | Qt.AlignmentFlag.AlignLeft)
+        self.discovery_status = QLabel()
+        self.discovery_status.setWordWrap(True)
         
-        self.bluetooth_devices = []
+        bluetooth_upper_buttons_layout.addWidget(bluetooth_refesh_button, alignment=Qt.AlignmentFlag.AlignTop | Qt.AlignmentFlag.AlignLeft)
+        bluetooth_upper_buttons_layout.addWidget(self.discovery_status, 1, alignment=Qt.AlignmentFlag.AlignTop | Qt.AlignmentFlag.AlignLeft)
         
-        bluetooth_devices_widget, self.bluetooth_devices_layout = create_scrollable_widget(None, QVBoxLayout)
+        # address -> (row, name label)
+        self.bluetooth_devices: dict[str, tuple[QWidget, QLabel]] = {}
+        self.refresh_buttons = [serial_refresh_button, bluetooth_refesh_button]
         
-        for index, (addr, name) in enumerate(self.bluetooth_devices):
-            self.add_bt_device(name, addr, index)
+        bluetooth_devices_widget, self.bluetooth_devices_layout = create_scrollable_widget(None, QVBoxLayout)
         
         self.bt_port_edit = QLineEdit()
         self.bt_port_edit.setValidator(QIntValidator())
@@ -121,84 +285,98 @@ class SetupScreen(QDialog):
         # self.main_layout.addWidget(continue_button, alignment=Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignTop)
         self.main_layout.addWidget(self.main_widget)
         
-        self.update_signal.connect(self._update_scan_timeout)
+        self.binary_checkbox = QCheckBox("Use binary framing if the device supports it")
+        self.main_layout.addWidget(self.binary_checkbox, alignment=Qt.AlignmentFlag.AlignLeft)
         
-        self.refresh_tracker = {}
+        self.shared_loop_checkbox = QCheckBox("Run the connection on the shared event loop")
+        self.main_layout.addWidget(self.shared_loop_checkbox, alignment=Qt.AlignmentFlag.AlignLeft)
     
-    def refresh_all(self):
-        while not self.connected:
-            self.update_scans(None)
-            time.sleep(1)
+    def refresh(self):
+        # Stop also ends the background refreshes until Refresh is clicked again
+        self.auto_refresh = not self.discovery.running
+        
+        if self.discovery.running:
+            self.discovery.cancel()
+        else:
+            self.start_discovery()
     
-    def refresh(self, refresh_type: str, refresh_button: QPushButton):
-        if self.refresh_tracker.get(refresh_type, [True, None])[0]:
-            if not self.refresh_tracker.get(refresh_type, False):
-                self.refresh_tracker[refresh_type] = [False, None]
-            
-            self.refresh_tracker[refresh_type][0] = False
-            refresh_button.setDisabled(True)
-            
-            self.refresh_tracker[refresh_type][1] = Thread(lambda: self.update_scans(refresh_type, refresh_type, refresh_button))
-            self.refresh_tracker[refresh_type][1].crashed.connect(print)
-            self.refresh_tracker[refresh_type][1].start()
+    def start_discovery(self):
+        self.failed_scanners = set()
+        self.discovery.start()
+        
+        for refresh_button in self.refresh_buttons:
+            refresh_button.setText("Stop")
     
     def exec(self):
-        # self.update_scans(None)
-        return super().exec()
+        for port in self.port_watcher.ports():
+            self._device_found("ser", port, "")
+        
+        self.auto_refresh = True
+        self.expiry_timer.start(1000)
+        self.start_discovery()
+        
+        try:
+            return super().exec()
+        finally:
+            self.expiry_timer.stop()
+            self.discovery.cancel()
     
-    def _update_scan_timeout(self, data: dict[str, list[tuple[str, str]] | list[str]], args: list):
-        if not args:
-            refresh_type = None
-            load_spinner = None
-        else:
-            refresh_type, refresh_button = args
+    def _discovery_failed(self, scanner: str, e: Exception):
+        message = f"{scanner} scan failed: {e}"
         
-        if data.get("ser", None) is not None and self.port_options != data["ser"]:
-            self.port_options = data["ser"]
-            
-            for _ in range(len(self.port_selector_widget)):
-                self.port_selector_widget.removeItem(0)
-            
-            if self.port_selector_widget.currentText() in self.port_options:
-                self.port_options.insert(0, self.port_options.pop(self.port_options.index(self.port_selector_widget.currentText())))
-            
-            self.port_selector_widget.addItems(self.port_options)
-            if self.port_options:
-                self.port_selector_widget.setCurrentIndex(0)
-        
-        if data.get("bt", None) is not None and dict(self.bluetooth_devices) != dict(data["bt"]):
-            for _ in range(len(self.bluetooth_devices)):
-                prev_widget = self.bluetooth_devices_layout.itemAt(0).widget()
-                self.bluetooth_devices_layout.removeWidget(prev_widget)
-                prev_widget.deleteLater()
-            
-            self.bluetooth_devices = data["bt"]
-            
-            for index, (addr, name) in enumerate(self.bluetooth_devices):
-                self.add_bt_device(name, addr, index)
+        # Auto refresh retries every few seconds, so the same failure is only logged once
+        if self.discovery_errors.get(scanner) != message:
+            self.log.log(logging.WARNING, message)
         
-        if refresh_button is not None:
-            refresh_button.setDisabled(False)
-        if refresh_type is not None:
-            self.refresh_tracker[refresh_type][0] = True
+        self.failed_scanners.add(scanner)
+        self.discovery_errors[scanner] = message
+        self.discovery_status.setText("\n".join(self.discovery_errors.values()))
     
-    def update_scans(self, send_type: str | None = None, *args):
-        data = {}
+    def _discovery_finished(self):
+        for refresh_button in self.refresh_buttons:
+            refresh_button.setText("Refresh")
         
-        if send_type == "bt" or send_type is None:
-            bt_data = bt_classic.discover_devices(lookup_names=True) + [(bl_info.address, bl_info.name) for bl_info in asyncio.run(self.ble_scanner.discover())]
-            data["bt"] = bt_data
-        elif send_type == "ser" or send_type is None:
-            ser_data = [port.name for port in comports()]
-            data["ser"] = ser_data
+        # A scanner that got through this run is working again
+        self.discovery_errors = {scanner: message for scanner, message in self.discovery_errors.items() if scanner in self.failed_scanners}
+        self.discovery_status.setText("\n".join(self.discovery_errors.values()))
         
-        self.update_signal.emit(data, args)
+        if self.auto_refresh and self.isVisible():
+            QTimer.singleShot(self.refresh_interval, self._auto_refresh)
+    
+    def _auto_refresh(self):
+        if self.auto_refresh and self.isVisible() and not self.discovery.running:
+            self.start_discovery()
+    
+    def _device_found(self, kind: str, address: str, name: str):
+        # Devices stream in from all scanners, only the first sighting or a newly learned name touches a widget
+        change = self.discovery_cache.seen(kind, address, name)
+        
+        if change == "added":
+            if kind == "ser":
+                self.port_selector_widget.addItem(address)
+            else:
+                self.bluetooth_devices[address] = self.add_bt_device(self.discovery_cache.name(kind, address), address)
+        elif change == "renamed" and kind == "bt":
+            self.bluetooth_devices[address][1].setText(self.discovery_cache.name(kind, address))
     
-    def add_bt_device(self, name: str, addr: str, index: int):
+    def _port_removed(self, port: str):
+        if self.discovery_cache.forget("ser", port):
+            self.port_selector_widget.removeItem(self.port_selector_widget.findText(port))
+    
+    def _expire_devices(self):
+        for kind, address in self.discovery_cache.expire():
+            if kind == "ser":
+                self.port_selector_widget.removeItem(self.port_selector_widget.findText(address))
+            else:
+                row_widget, _ = self.bluetooth_devices.pop(address)
+                self.bluetooth_devices_layout.removeWidget(row_widget)
+                row_widget.deleteLater()
+    
+    def add_bt_device(self, name: str, addr: str):
         connect_button = QPushButton("Connect")
-        connect_button.clicked.connect(self.serial_connect_clicked(index))
+        connect_button.clicked.connect(self.serial_connect_clicked(addr))
         
-        _, bt_device_layout = create_widget(self.bluetooth_devices_layout, QHBoxLayout)
+        row_widget, bt_device_layout = create_widget(self.bluetooth_devices_layout, QHBoxLayout)
             
         _, info_layout = create_widget(bt_device_layout, QVBoxLayout)
         
@@ -211,19 +389,24 @@ class SetupScreen(QDialog):
         info_layout.addWidget(addr_label)
         
         bt_device_layout.addWidget(connect_button, alignment=Qt.AlignmentFlag.AlignRight)
+        
+        return row_widget, name_label
     
-    def serial_connect_clicked(self, a0: int):
+    def serial_connect_clicked(self, a0: int | str):
         def func():
             self.connected = True
             
+            self.data["binary"] = self.binary_checkbox.isChecked()
+            self.data["shared-loop"] = self.shared_loop_checkbox.isChecked()
+            
             if a0 == -1:
                 self.data["connection-type"] = "serial"
                 self.data["port"] = self.port_selector_widget.currentText()
                 self.data["baud_rate"] = int(self.baud_rate_selector_widget.currentText())
-            elif isinstance(a0, int) and a0 >= 0:
+            elif isinstance(a0, str):
                 self.data["connection-type"] = "bluetooth"
                 self.data["port"] = int(self.bt_port_edit.text())
-                self.data["addr"] = self.bluetooth_devices[a0][1]
+                self.data["addr"] = a0
             
             self.close()
         
@@ -245,6 +428,217 @@ class SetupScreen(QDialog):
             
         return super().closeEvent(a0)
 
+class DebugLogScreen(QDialog):
+    LEVELS = {"Debug": logging.DEBUG, "Info": logging.INFO, "Warning": logging.WARNING, "Error": logging.ERROR}
+    
+    def __init__(self, parent: 'Window', frame_log: FrameLog):
+        super().__init__(parent=parent)
+        
+        self.setWindowTitle("Debug Log")
+        self.resize(800, 500)
+        
+        self.frame_log = frame_log
+        self.last_seq = 0
+        
+        layout = QVBoxLayout()
+        self.setLayout(layout)
+        
+        _, controls_layout = create_widget(layout, QHBoxLayout)
+        
+        self.level_selector = QComboBox()
+        self.level_selector.addItems(list(self.LEVELS))
+        self.level_selector.currentTextChanged.connect(self.reload)
+        
+        self.file_checkbox = QCheckBox("Write to file")
+        self.file_checkbox.toggled.connect(self.toggle_file)
+        
+        self.stats_label = QLabel()
+        
+        controls_layout.addWidget(QLabel("Level"))
+        controls_layout.addWidget(self.level_selector)
+        controls_layout.addWidget(self.file_checkbox)
+        controls_layout.addStretch()
+        controls_layout.addWidget(self.stats_label)
+        
+        self.log_view = QPlainTextEdit()
+        self.log_view.setReadOnly(True)
+        self.log_view.setMaximumBlockCount(frame_log.records.maxlen or 0)
+        layout.addWidget(self.log_view)
+        
+        # Poll while visible, the comm threads never touch the widget
+        self.refresh_timer = QTimer(self)
+        self.refresh_timer.timeout.connect(self.refresh)
+    
+    def showEvent(self, a0):
+        self.reload()
+        self.refresh_timer.start(500)
+        return super().showEvent(a0)
+    
+    def hideEvent(self, a0):
+        self.refresh_timer.stop()
+        return super().hideEvent(a0)
+    
+    def reload(self):
+        self.log_view.clear()
+        self.last_seq = 0
+        self.refresh()
+    
+    def refresh(self):
+        records = self.frame_log.recent(self.last_seq, self.LEVELS[self.level_selector.currentText()])
+        
+        if records:
+            self.last_seq = records[-1][0]
+            self.log_view.appendPlainText("\n".join(f"{time.strftime('%H:%M:%S', time.localtime(created))} {logging.getLevelName(level)} {reader_id} {message}" for _, created, level, reader_id, message in records))
+        
+        stats = self.frame_log.stats()
+        self.stats_label.setText(f"{stats['logged']} logged, {stats['suppressed']} rate limited, {stats['file_dropped']} not written")
+    
+    def toggle_file(self, state: bool):
+        if not state:
+            self.frame_log.stop_file()
+            return
+        
+        path, _ = QFileDialog.getSaveFileName(self, "Log file", "comm.log", "Log files (*.log)")
+        
+        if path:
+            self.frame_log.start_file(path)
+        else:
+            self.file_checkbox.blockSignals(True)
+            self.file_checkbox.setChecked(False)
+            self.file_checkbox.blockSignals(False)
+
+class SaveManager(QObject):
+    saved = pyqtSignal(dict)  # Sizes and timings of a save that finished
+    failed = pyqtSignal(str)
+    
+    def __init__(self, storage: AttendanceDatabase, data: AppData, autosave_interval: int = 60000):
+        super().__init__()
+        self.storage = storage
+        self.data = data
+        
+        # One save at a time, asking again while one runs queues a single follow up
+        self.worker: Thread | None = None
+        self.again = False
+        self.pending_save_as: str | None = None
+        
+        self.history: deque[dict] = deque(maxlen=100)
+        
+        self.autosave_timer = QTimer(self)
+        self.autosave_timer.timeout.connect(self.save)
+        self.set_autosave_interval(autosave_interval)
+    
+    def set_autosave_interval(self, interval: int):
+        # Milliseconds, 0 turns autosave off
+        if interval > 0:
+            self.autosave_timer.start(interval)
+        else:
+            self.autosave_timer.stop()
+    
+    def save(self):
+        if self.worker is not None:
+            self.again = True
+            return
+        
+        # Only the snapshot is taken here, writing happens on the worker while scanning goes on
+        start = time.perf_counter()
+        storage = self.storage
+        changes = storage.take_changes()
+        snapshot_ms = (time.perf_counter() - start) * 1e3
+        
+        def restore():
+            # Written by the next save instead
+            for staff, *_ in changes:
+                storage.staff_changed(staff)
+        
+        self._run("save", lambda: storage.write_changes(changes), snapshot_ms, restore)
+    
+    def save_as(self, path: str):
+        if os.path.abspath(path) == os.path.abspath(self.storage.path):
+            self.save()  # Already the open database, replacing it would delete it and its journal from under us
+            return
+        
+        # A database or journal left at the new name belongs to an older file and is replaced, the open storage's files never are
+        journal_path = os.path.splitext(path)[0] + ".journal"
+        stale_files = [path, path + "-wal", path + "-shm", journal_path, journal_path + ".old"]
+        open_files = self._open_files()
+        if any(os.path.abspath(stale) in open_files for stale in stale_files):
+            self.failed.emit(f"Save as failed: {path} would share its files with the open database {self.storage.path}")
+            return
+        
+        if self.worker is not None:
+            self.pending_save_as = path
+            return
+        
+        # An export: the copy is made from the database on the worker, and the open database keeps being written.
+        # The next launch opens it again, so nothing taken after the copy is lost
+        start = time.perf_counter()
+        storage = self.storage
+        changes = storage.take_changes()
+        snapshot_ms = (time.perf_counter() - start) * 1e3
+        
+        def restore():
+            for staff, *_ in changes:
+                storage.staff_changed(staff)
+        
+        def write():
+            write_start = time.perf_counter()
+            storage.write_changes(changes)  # Folds the journal too, so the copy has every tap up to now
+            
+            for stale in stale_files:
+                if os.path.exists(stale):
+                    os.remove(stale)
+            
+            return {**storage.export(path), "write_ms": (time.perf_counter() - write_start) * 1e3}
+        
+        self._run("save as", write, snapshot_ms, restore)
+    
+    def _open_files(self):
+        storage = self.storage
+        journal_path = storage.journal.path if storage.journal is not None else os.path.splitext(storage.path)[0] + ".journal"
+        files = [storage.path, f"{storage.path}-wal", f"{storage.path}-shm", journal_path, journal_path + ".old"]
+        
+        return {os.path.abspath(file) for file in files}
+    
+    def close(self):
+        # On exit: let a running save finish, then write what is left on this thread
+        if self.worker is not None:
+            self.worker.wait()
+        
+        self.autosave_timer.stop()
+        self.storage.write_changes(self.storage.take_changes())
+        self.storage.close()
+    
+    def _run(self, kind: str, write: Callable[[], dict], snapshot_ms: float, on_failed: Callable[[], None]):
+        start = time.perf_counter()
+        result: list[dict] = []
+        errors: list[Exception] = []
+        
+        worker = self.worker = Thread(lambda: result.append(write()))
+        worker.crashed.connect(errors.append)
+        
+        def finished():
+            worker.wait()  # finished is emitted just before run returns
+            self.worker = None
+            
+            if errors or not result:
+                on_failed()
+                self.failed.emit(f"{kind.capitalize()} failed: {errors[0] if errors else 'no result'}")
+            else:
+                metrics = {"kind": kind, "time": time.time(), "snapshot_ms": snapshot_ms, **result[0], "duration_ms": (time.perf_counter() - start) * 1e3 + snapshot_ms}
+                self.history.append(metrics)
+                self.saved.emit(metrics)
+            
+            if self.pending_save_as is not None:
+                path, self.pending_save_as = self.pending_save_as, None
+                self.save_as(path)
+            elif self.again:
+                self.again = False
+                self.save()
+        
+        worker.finished.connect(finished)
+        worker.start()
+
+
 class Window(QMainWindow):
     comm_signal = pyqtSignal(dict)
     connection_changed = pyqtSignal(bool)
@@ -252,8 +646,21 @@ class Window(QMainWindow):
     def __init__(self) -> None:
         super().__init__()
         
-        self.connection_set_up_screen = SetupScreen(self)
-        self.target_connector = BaseCommSystem(CommDevice(LiveData(self.comm_signal), self.connection_changed, "", None, None), self.connection_error_func)
+        self.port_watcher = SerialHotplugWatcher()
+        self.port_watcher.start()
+        
+        self.comm_engine = AsyncCommEngine()
+        self.target_connector = ReaderRegistry(LiveData(self.comm_signal), self.connection_changed, self.connection_error_func)
+        self.connection_set_up_screen = SetupScreen(self)  # Logs scanner failures to the registry's log
+        
+        # A reader waiting out its backoff reconnects as soon as its port is plugged back in
+        self.port_watcher.port_added.connect(self.target_connector.port_appeared)
+        self.debug_log_screen = DebugLogScreen(self, self.target_connector.log)
+        
+        # Readers reconnect on their own, so outages show up in the status bar instead of a dialog
+        self.link_status_timer = QTimer(self)
+        self.link_status_timer.timeout.connect(self.update_link_status)
+        self.link_status_timer.start(1000)
         
         self.setWindowTitle(f"IFEs Attendance Tracker")
         
@@ -270,27 +677,43 @@ class Window(QMainWindow):
         sidebar_layout.setSpacing(0)
         sidebar_layout.setContentsMargins(0, 0, 0, 0)
         
-        data = AppData(
-            Time(7, 00, 00),
-            Time(8, 00, 00),
-            
-            (AttendanceEntry(Time(7, 00, 00), "Monday", 1, "January", 2025), AttendanceEntry(Time(7, 00, 00), "Monday", 1, "January", 2025)),
-            (AttendanceEntry(Time(7, 00, 00), "Monday", 1, "January", 2025), AttendanceEntry(Time(7, 00, 00), "Monday", 1, "January", 2025)),
-            
-            [],
-            
-            {"t_id1": Teacher("t_id1", None, CharacterName("Emily", "Mbeke", "Chinweotito", "Mbeke"), Department("d_id1", "Humanities"), [Subject("s_id1", "Civic Education", Class("c_id1", "A", "SS3", "SS3 A"), [("Friday", 2), ("Friday", 3)])], "img.png", [])},
-            {"p_id1": Prefect("p_id1", None, CharacterName("Eze", "Emmanuel", "Udochukwu", "Emma"), "Parade Commander", Class("c_id1", "A", "SS3", "SS3 A"), "img.png", {"Friday": ["Morning", "Parade"]}, [])}
-        )
+        # Scans are journaled and card links written as they happen, other staff changes go in with each save. The first run starts from these defaults
+        storage = AttendanceDatabase(DATABASE_PATH)
+        if storage.is_empty():
+            data = AppData(
+                Time(7, 00, 00),
+                Time(8, 00, 00),
+                
+                (AttendanceEntry.at(2025, 1, 1, 7), AttendanceEntry.at(2025, 1, 1, 7)),
+                (AttendanceEntry.at(2025, 1, 1, 7), AttendanceEntry.at(2025, 1, 1, 7)),
+                
+                [],
+                
+                {"t_id1": Teacher("t_id1", None, CharacterName("Emily", "Mbeke", "Chinweotito", "Mbeke"), Department("d_id1", "Humanities"), [Subject("s_id1", "Civic Education", Class("c_id1", "A", "SS3", "SS3 A"), [("Friday", 2), ("Friday", 3)])], "img.png", [])},
+                {"p_id1": Prefect("p_id1", None, CharacterName("Eze", "Emmanuel", "Udochukwu", "Emma"), "Parade Commander", Class("c_id1", "A", "SS3", "SS3 A"), "img.png", {"Friday": ["Morning", "Parade"]}, [])}
+            )
+            storage.save(data)
+        else:
+            data = storage.load()
+        
+        # Taps since the last compaction are replayed from the journal before any widget reads the attendance
+        storage.open_journal(data)
+        
+        self.saver = SaveManager(storage, data)
+        self.saver.saved.connect(self.save_finished)
+        self.saver.failed.connect(lambda e: QMessageBox.warning(self, "Save", e))
+        
+        self.save_status = QLabel()
+        self.statusBar().addPermanentWidget(self.save_status) #type: ignore
         
         # Create stacked widget for content
         staff_widget = TabViewWidget("vertical")
         staff_widget.add("Attendance", AttendanceWidget(data, self.target_connector))
         staff_widget.add("Teachers", TeacherEditorWidget(data, self.target_connector, staff_widget.stack, len(staff_widget.tab_buttons), 5, 6))
         staff_widget.add("Prefects", PrefectEditorWidget(data, self.target_connector, staff_widget.stack, len(staff_widget.tab_buttons), 5, 6))
-        staff_widget.add("Attendance Chart", AttendanceBarWidget(data))
-        staff_widget.add("Punctuality Graph", PunctualityGraphWidget(data))
-        staff_widget.stack.addWidget(CardScanScreenWidget(self.target_connector, staff_widget.stack))
+        staff_widget.add("Attendance Chart", LazyWidget(lambda: AttendanceBarWidget(data)))
+        staff_widget.add("Punctuality Graph", LazyWidget(lambda: PunctualityGraphWidget(data)))
+        staff_widget.stack.addWidget(CardScanScreenWidget(data, self.target_connector, staff_widget.stack))
         staff_widget.stack.addWidget(StaffDataWidget(data, staff_widget.stack))
         
         
@@ -316,25 +739,73 @@ class Window(QMainWindow):
         
         self.connection_set_up_screen.exec()
         
-        self.target_connector.device.port = self.connection_set_up_screen.data.get("port", "")
-        self.target_connector.device.addr = self.connection_set_up_screen.data.get("addr", None)
-        self.target_connector.device.baud_rate = self.connection_set_up_screen.data.get("baud_rate", None)
+        data = self.connection_set_up_screen.data
         
-        if self.connection_set_up_screen.data.get("connection-type", None) is not None:
-            self.target_connector.set_bluetooth(self.connection_set_up_screen.data["connection-type"] == "bluetooth")
-            self.target_connector.set_serial(self.connection_set_up_screen.data["connection-type"] == "serial")
+        if data.get("connection-type", None) is not None:
+            # Each gate's reader is keyed by where it is plugged in, setting up the same one again replaces it
+            reader_id = data["addr"] if data["connection-type"] == "bluetooth" else data["port"]
             
-            self.target_connector.start_connection()
+            reader = self.target_connector.add_reader(reader_id, data.get("port", ""), data.get("addr", None), data.get("baud_rate", None))
+            reader.set_bluetooth(data["connection-type"] == "bluetooth")
+            reader.set_serial(data["connection-type"] == "serial")
+            reader.set_binary(data.get("binary", False))
+            reader.set_engine(self.comm_engine if data.get("shared-loop", False) else None)
+            
+            reader.start_connection()
     
-    def connection_error_func(self, e: Exception):
-        self.target_connector.stop_connection()
+    def connection_error_func(self, e: Exception, reader_id: str | None = None):
+        if reader_id is not None:
+            self.target_connector.stop_reader(reader_id)
+        
         self.connection_set_up_screen.connected = False
         self.connection_set_up_screen.data = {}
         
-        QMessageBox.warning(self, "Connection Error", str(e))
+        QMessageBox.warning(self, "Connection Error", f"{reader_id}: {e}" if reader_id is not None else str(e))
         
         self.activate_connection_screen()
     
+    def update_link_status(self):
+        down = {reader_id: stats for reader_id, stats in self.target_connector.link_stats().items() if stats["down"]}
+        
+        if down:
+            self.statusBar().showMessage(", ".join(f"{reader_id} reconnecting ({stats['current_downtime']:.0f} s down, attempt {stats['attempt']}): {stats['last_error']}" for reader_id, stats in down.items())) #type: ignore
+        else:
+            self.statusBar().clearMessage() #type: ignore
+    
+    def start_capture(self):
+        directory = QFileDialog.getExistingDirectory(self, "Capture directory")
+        
+        if directory:
+            self.target_connector.start_capture(directory)
+    
+    def replay_capture(self):
+        path, _ = QFileDialog.getOpenFileName(self, "Replay capture", "", "Capture logs (*.rfidcap)")
+        if not path:
+            return
+        
+        speed, ok = QInputDialog.getDouble(self, "Replay speed", "Times real time (0 replays as fast as possible)", 1, 0, 1000, 1)
+        if not ok:
+            return
+        
+        reader = self.target_connector.add_reader(f"replay:{os.path.basename(path)}", "")
+        reader.set_replay(path, speed)
+        reader.start_connection()
+    
+    def save_as(self):
+        path, _ = QFileDialog.getSaveFileName(self, "Save a copy as", DATABASE_PATH, "Attendance databases (*.db)")
+        
+        if path:
+            self.saver.save_as(path)
+    
+    def save_finished(self, metrics: dict):
+        self.save_status.setText(f"Saved {time.strftime('%H:%M:%S', time.localtime(metrics['time']))}: {metrics['staff']} staff, {metrics['attendance']} taps, {metrics['bytes'] / 1024:.1f} KiB in {metrics['duration_ms']:.0f} ms")
+    
+    def dump_metrics(self):
+        path, _ = QFileDialog.getSaveFileName(self, "Dump pipeline metrics", "pipeline-metrics.json", "JSON (*.json)")
+        
+        if path:
+            self.target_connector.metrics.dump(path)
+    
     def create_menu_bar(self):
         menubar = self.menuBar()
         
@@ -351,6 +822,11 @@ class Window(QMainWindow):
         
         set_connection = QAction("Set", self)
         break_connection = QAction("Break", self)
+        start_capture = QAction("Start capture", self)
+        stop_capture = QAction("Stop capture", self)
+        replay_capture = QAction("Replay capture", self)
+        dump_metrics = QAction("Dump pipeline metrics", self)
+        debug_log = QAction("Debug log", self)
         
         new_action.setShortcut("Ctrl+N")
         open_action.setShortcut("Ctrl+O")
@@ -362,12 +838,19 @@ class Window(QMainWindow):
         
         exit_action.triggered.connect(self.close)
         set_connection.triggered.connect(self.activate_connection_screen)
-        
-        def _break_connection(): self.target_connector.connected = False
+        start_capture.triggered.connect(self.start_capture)
+        stop_capture.triggered.connect(self.target_connector.stop_capture)
+        replay_capture.triggered.connect(self.replay_capture)
+        dump_metrics.triggered.connect(self.dump_metrics)
+        save_action.triggered.connect(lambda: self.saver.save())
+        save_as_action.triggered.connect(self.save_as)
+        debug_log.triggered.connect(self.debug_log_screen.show)
+        
+        def _break_connection(): self.target_connector.stop_all()
         break_connection.triggered.connect(_break_connection)
         
         file_menu.addActions([new_action, open_action, save_action, save_as_action, exit_action]) #type: ignore
-        connection_menu.addActions([set_connection, break_connection])
+        connection_menu.addActions([set_connection, break_connection, start_capture, stop_capture, replay_capture, dump_metrics, debug_log])
     
     # def closeEvent(self, a0):
     #     response = QMessageBox.question(self, "Quit", "Are you sure you want to quit",
@@ -390,5 +873,7 @@ if __name__ == "__main__":
     window = Window()
     window.showMaximized()
     
-    sys.exit(app.exec())
+    code = app.exec()
+    window.saver.close()
+    sys.exit(code)
 
@@ -1,6 +1,200 @@
 
+import time
+import numpy as np
 from dataclasses import dataclass
+from collections.abc import Callable, Iterable, Sequence
 from models.object_models import *
+from models.object_models import _MONTH_NAMES
+
+
+def local_timestamps(timestamps: np.ndarray):
+    # Epoch seconds moved onto the local wall clock, so // 86400 is AttendanceEntry.day_number and % 86400 the time of day.
+    # UTC offsets only change on quarter hours, so localtime runs once per quarter hour with taps in it, not once per tap
+    quarters, inverse = np.unique(timestamps // 900, return_inverse=True)
+    offsets = np.array([time.localtime(int(quarter) * 900).tm_gmtoff for quarter in quarters], np.int64)
+    return timestamps + offsets[inverse]
+
+def local_months(local: np.ndarray):
+    # Months since January 1970 of each local_timestamps() value, see month_label
+    return local.astype("datetime64[s]").astype("datetime64[M]").astype(np.int64)
+
+def month_label(month: int):
+    # As f"{entry.month} {entry.year}"
+    return f"{_MONTH_NAMES[month % 12]} {1970 + month // 12}"
+
+
+class AttendanceStore(Sequence):
+    # One row per tap instead of an AttendanceEntry per tap, entries are built on access
+    DTYPE = np.dtype([("staff", "<i4"), ("timestamp", "<i8"), ("reader", "<i2")])
+    
+    def __init__(self, capacity: int = 1024):
+        self.rows = np.empty(capacity, self.DTYPE)
+        self.size = 0
+        self.version = 0  # Bumped when the rows are replaced (the lazy load), appends only grow size
+        
+        self.staff: list[Teacher | Prefect] = []
+        self.staff_index: dict[int, int] = {}  # id(staff) -> index
+        self.readers: list[str] = []
+        self.reader_index: dict[str, int] = {}
+        
+        # Set when the rows are still in the database, they are fetched the first time anything reads them.
+        # Called with (start, end) it returns just that timestamp range, see between()
+        self.loader: Callable[..., np.ndarray] | None = None
+    
+    @classmethod
+    def from_entries(cls, entries: Iterable[AttendanceEntry]):
+        store = cls()
+        for entry in entries:
+            store.append(entry.staff, entry.timestamp, entry.reader)
+        
+        return store
+    
+    def __getstate__(self):
+        self.ensure_loaded()
+        return {"rows": self.rows[:self.size].copy(), "staff": self.staff, "readers": self.readers}
+    
+    def __setstate__(self, state: dict):
+        self.rows = state["rows"]
+        self.size = len(self.rows)
+        self.version = 0
+        
+        self.staff = state["staff"]
+        self.staff_index = {id(staff): index for index, staff in enumerate(self.staff)}
+        self.readers = state["readers"]
+        self.reader_index = {reader: index for index, reader in enumerate(self.readers)}
+        self.loader = None
+    
+    def ensure_loaded(self):
+        if self.loader is not None:
+            loader, self.loader = self.loader, None
+            # Taps appended before the load (journal replay, scans) are newer than everything on disk
+            self.rows = np.concatenate((loader(), self.rows[:self.size]))
+            self.size = len(self.rows)
+            self.version += 1
+    
+    def __len__(self):
+        self.ensure_loaded()
+        return self.size
+    
+    def __getitem__(self, index: int):
+        self.ensure_loaded()
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self.size))]
+        
+        if index < 0:
+            index += self.size
+        if not 0 <= index < self.size:
+            raise IndexError("attendance index out of range")
+        
+        return self._entry(*self.rows[index].item())
+    
+    def __iter__(self):
+        # tolist in chunks, converting one numpy row at a time is several times slower
+        self.ensure_loaded()
+        for start in range(0, self.size, 4096):
+            for row in self.rows[start:min(start + 4096, self.size)].tolist():
+                yield self._entry(*row)
+    
+    def between(self, start: int, end: int):
+        # Entries with start <= timestamp < end, without loading the rest of the history if it is still on disk
+        rows = self.rows[:self.size]
+        if self.loader is not None:
+            rows = np.concatenate((self.loader(start, end), rows))
+        
+        rows = rows[(rows["timestamp"] >= start) & (rows["timestamp"] < end)]
+        return [self._entry(*row) for row in rows.tolist()]
+    
+    def column(self, name: str):
+        self.ensure_loaded()
+        return self.rows[name][:self.size]
+    
+    def counts(self):
+        # Taps per staff index, see StaffAttendance.staff_index
+        return np.bincount(self.column("staff"), minlength=len(self.staff))
+    
+    def index_of_staff(self, staff: Teacher | Prefect):
+        index = self.staff_index.get(id(staff))
+        if index is None:
+            index = self.staff_index[id(staff)] = len(self.staff)
+            self.staff.append(staff)
+        
+        return index
+    
+    def append(self, staff: Teacher | Prefect, timestamp: int, reader: str | None = None):
+        # Doesn't need the history loaded, ensure_loaded puts the loaded rows in front
+        if self.size == len(self.rows):
+            grown = np.empty(max(2 * len(self.rows), 1024), self.DTYPE)  # Doubling keeps appends amortized O(1)
+            grown[:self.size] = self.rows[:self.size]
+            self.rows = grown
+        
+        if reader is None:
+            reader_index = -1
+        else:
+            reader_index = self.reader_index.get(reader)
+            if reader_index is None:
+                reader_index = self.reader_index[reader] = len(self.readers)
+                self.readers.append(reader)
+        
+        self.rows[self.size] = (self.index_of_staff(staff), timestamp, reader_index)
+        self.size += 1
+        
+        return self._entry(*self.rows[self.size - 1].item())
+    
+    def _entry(self, staff: int, timestamp: int, reader: int):
+        return AttendanceEntry(timestamp, self.staff[staff], self.readers[reader] if reader >= 0 else None)
+
+class StaffAttendance(Sequence):
+    # Stands in for the per staff attendance list, reads the staff member's rows out of the shared store
+    def __init__(self, store: AttendanceStore, staff: Teacher | Prefect):
+        self.store = store
+        self.staff_index = store.index_of_staff(staff)
+        
+        # Store row indices of this staff member, grown like the store's rows as taps come in
+        self._rows = np.empty(0, np.intp)
+        self._count = 0
+        self._scanned = 0  # Store rows already looked through
+        self._version = -1
+    
+    def rows(self):
+        store = self.store
+        column = store.column("staff")
+        if self._version != store.version:
+            self._count = self._scanned = 0
+            self._version = store.version
+        
+        if self._scanned < store.size:
+            # Only the rows appended since the last read are scanned, not the whole column again
+            new = np.flatnonzero(column[self._scanned:] == self.staff_index) + self._scanned
+            self._scanned = store.size
+            
+            if self._count + len(new) > len(self._rows):
+                grown = np.empty(max(2 * len(self._rows), self._count + len(new), 16), np.intp)
+                grown[:self._count] = self._rows[:self._count]
+                self._rows = grown
+            
+            self._rows[self._count:self._count + len(new)] = new
+            self._count += len(new)
+        
+        return self._rows[:self._count]
+    
+    def timestamps(self):
+        return self.store.column("timestamp")[self.rows()]
+    
+    def __len__(self):
+        return len(self.rows())
+    
+    def __getitem__(self, index: int):
+        if isinstance(index, slice):
+            return [self.store[int(row)] for row in self.rows()[index]]
+        
+        return self.store[int(self.rows()[index])]
+    
+    def __iter__(self):
+        for row in self.store.rows[self.rows()].tolist():
+            yield self.store._entry(*row)
+    
+    def append(self, entry: AttendanceEntry):
+        self.store.append(self.store.staff[self.staff_index], entry.timestamp, entry.reader)
 
 
 @dataclass
@@ -11,8 +205,64 @@ class AppData:
     teacher_timeline_dates: tuple[AttendanceEntry, AttendanceEntry]
     prefect_timeline_dates: tuple[AttendanceEntry, AttendanceEntry]
 
-    attendance_data: list[AttendanceEntry]
+    attendance_data: AttendanceStore | list[AttendanceEntry]  # Lists (e.g. from older saves) are converted on load
     
     teachers: dict[str, Teacher]
     prefects: dict[str, Prefect]
-
+    
+    def __post_init__(self):
+        self.storage = None  # The AttendanceDatabase this was loaded from or saved to, it is told about each change
+        self.rebuild_iud_index()
+        self.attach_attendance()
+    
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["iud_index"]  # Derived, rebuilt on load
+        state.pop("storage", None)
+        return state
+    
+    def __setstate__(self, state: dict):
+        self.__dict__.update(state)
+        self.storage = None
+        self.rebuild_iud_index()
+        self.attach_attendance()
+    
+    def attach_attendance(self):
+        # Taps live once in the store, each staff member's attendance is a view over their rows
+        if not isinstance(self.attendance_data, AttendanceStore):
+            self.attendance_data = AttendanceStore.from_entries(self.attendance_data)
+        
+        for staff in (*self.teachers.values(), *self.prefects.values()):
+            if not isinstance(staff.attendance, StaffAttendance):
+                staff.attendance = StaffAttendance(self.attendance_data, staff)
+    
+    def add_attendance(self, staff: Teacher | Prefect, timestamp: int, reader: str | None = None):
+        entry = self.attendance_data.append(staff, timestamp, reader)
+        if self.storage is not None:
+            self.storage.add_attendance(staff, timestamp, reader)
+        
+        return entry
+    
+    def rebuild_iud_index(self):
+        # Prefects first, they won lookups before the index existed
+        self.iud_index: dict[str, Teacher | Prefect] = {}
+        for staff in (*self.prefects.values(), *self.teachers.values()):
+            if staff.IUD is not None:
+                self.iud_index.setdefault(staff.IUD, staff)
+    
+    def staff_by_iud(self, IUD: str):
+        return self.iud_index.get(IUD)
+    
+    def assign_iud(self, staff: Teacher | Prefect, IUD: str):
+        owner = self.iud_index.get(IUD)
+        if owner is not None and owner is not staff:
+            raise Exception(f"Card {IUD} is already linked to {owner.name.sur} {owner.name.first} (ID: {owner.id})")
+        
+        if staff.IUD is not None and self.iud_index.get(staff.IUD) is staff:
+            del self.iud_index[staff.IUD]
+        
+        staff.IUD = IUD
+        self.iud_index[IUD] = staff
+        
+        if self.storage is not None:
+            self.storage.save_staff(staff)
@@ -1,8 +1,47 @@
 
-from dataclasses import dataclass
+import sys
+from dataclasses import MISSING, dataclass, fields
 from PyQt6.QtCore import pyqtBoundSignal
 
-@dataclass
+
+def _getstate(self):
+    # Same shape as the __dict__ the models pickled before they had slots, so old and new saves load either way
+    # Fields left out of __init__ are caches and are not saved
+    return {field.name: getattr(self, field.name) for field in fields(self) if field.init}
+
+def _setstate(self, state: dict):
+    # Fields added since a save was written fall back to their defaults
+    for field in fields(self):
+        if field.name not in state and field.default is not MISSING:
+            object.__setattr__(self, field.name, field.default)
+        elif field.name not in state and field.default_factory is not MISSING:
+            object.__setattr__(self, field.name, field.default_factory())
+    
+    for name, value in state.items():
+        object.__setattr__(self, name, value)
+
+def slotted(cls=None, /, *, frozen: bool = False):
+    # Models are created per tap and per staff member, slots drop the per-instance __dict__
+    def wrap(cls):
+        # A model can bring its own __setstate__ to upgrade older saves, it should finish with _setstate
+        own_setstate = "__setstate__" in cls.__dict__
+        
+        cls = dataclass(cls, slots=True, frozen=frozen)
+        cls.__getstate__ = _getstate
+        if not own_setstate:
+            cls.__setstate__ = _setstate
+        return cls
+    
+    return wrap if cls is None else wrap(cls)
+
+def intern_fields(obj, *names: str):
+    # Day, month and class names repeat across thousands of records, keep one copy of each
+    for name in names:
+        value = getattr(obj, name)
+        if type(value) is str:
+            object.__setattr__(obj, name, sys.intern(value))
+
+@slotted(frozen=True)
 class Time:
     hour: int
     min: int
@@ -12,13 +51,16 @@ class Time:
 class LiveData:
     data_signal: pyqtBoundSignal
 
-@dataclass
+@slotted(frozen=True)
 class CharacterName:
     sur: str
     first: str
     middle: str
     abrev: str
     other: str | None = None
+    
+    def __post_init__(self):
+        intern_fields(self, "sur", "first", "middle", "abrev", "other")
 
 @dataclass
 class SensorMeta:
@@ -27,9 +69,12 @@ class SensorMeta:
     version: str
     developer: str
 
-@dataclass
+@slotted(frozen=True)
 class Department:
     id: str
     
     name: str
+    
+    def __post_init__(self):
+        intern_fields(self, "id", "name")
 
@@ -1,26 +1,38 @@
 
+import time
 from os import PathLike
 from communication import BaseCommSystem
 from models.data_models import *
-from dataclasses import dataclass
+from models.data_models import _setstate
+from dataclasses import dataclass, field
+from others import DAYS_OF_THE_WEEK, MONTHS_OF_THE_YEAR
 
-@dataclass
+_MONTH_NAMES = list(MONTHS_OF_THE_YEAR)
+_MONTH_NUMBERS = {name: number for number, name in enumerate(_MONTH_NAMES, 1)}
+
+@slotted(frozen=True)
 class Class:
     id: str
     
     level_name: str
     class_name: str
     name: str
+    
+    def __post_init__(self):
+        intern_fields(self, "id", "level_name", "class_name", "name")
 
-@dataclass
+@slotted(frozen=True)
 class Subject:
     id: str  # Not unique
     
     name: str
     cls: Class
     periods: list[tuple[str, int]]
+    
+    def __post_init__(self):
+        intern_fields(self, "id", "name")
 
-@dataclass
+@slotted
 class Teacher:
     id: str
     IUD: str | None
@@ -31,7 +43,7 @@ class Teacher:
     img_path: str | PathLike
     attendance: list["AttendanceEntry"]
 
-@dataclass
+@slotted
 class Prefect:
     id: str
     IUD: str | None
@@ -42,17 +54,80 @@ class Prefect:
     img_path: str | PathLike
     duties: dict[str, list[str]]
     attendance: list["AttendanceEntry"]
+    
+    def __post_init__(self):
+        intern_fields(self, "post_name")
 
 
-@dataclass
+@slotted
 class AttendanceEntry:
-    time: Time
-    day: str
-    date: int
-    month: str
-    year: int
+    timestamp: int  # Epoch seconds, taken when the reader's bytes came off the wire
     
     staff: Teacher | Prefect | None = None
+    reader: str | None = None
+    
+    _local: time.struct_time | None = field(default=None, init=False, repr=False, compare=False)
+    
+    def __post_init__(self):
+        intern_fields(self, "reader")
+    
+    def __setstate__(self, state: dict):
+        if "timestamp" not in state:
+            # Saved before entries held a timestamp
+            t = state.pop("time")
+            state["timestamp"] = int(time.mktime((state.pop("year"), _MONTH_NUMBERS[state.pop("month")], state.pop("date"), t.hour, t.min, int(t.sec), 0, 0, -1)))
+            del state["day"]
+        
+        _setstate(self, state)
+    
+    @classmethod
+    def at(cls, year: int, month: int, date: int, hour: int = 0, minute: int = 0, sec: int = 0, staff: Teacher | Prefect | None = None, reader: str | None = None):
+        return cls(int(time.mktime((year, month, date, hour, minute, sec, 0, 0, -1))), staff, reader)
+    
+    @property
+    def local(self):
+        if self._local is None:
+            object.__setattr__(self, "_local", time.localtime(self.timestamp))
+        return self._local
+    
+    @property
+    def time(self):
+        t = self.local
+        return Time(t.tm_hour, t.tm_min, t.tm_sec)
+    
+    @property
+    def weekday(self):
+        return self.local.tm_wday  # Monday is 0, as in DAYS_OF_THE_WEEK
+    
+    @property
+    def day(self):
+        return DAYS_OF_THE_WEEK[self.local.tm_wday]
+    
+    @property
+    def date(self):
+        return self.local.tm_mday
+    
+    @property
+    def month_number(self):
+        return self.local.tm_mon
+    
+    @property
+    def month(self):
+        return _MONTH_NAMES[self.local.tm_mon - 1]
+    
+    @property
+    def year(self):
+        return self.local.tm_year
+    
+    @property
+    def day_number(self):
+        # Local calendar days since the epoch, consecutive days differ by exactly 1
+        return (self.timestamp + self.local.tm_gmtoff) // 86400
+    
+    @property
+    def week_number(self):
+        # Weeks since the epoch, starting on Monday (the epoch was a Thursday)
+        return (self.day_number + 3) // 7
 
 
 @dataclass
@@ -1,5 +1,7 @@
 
+import time
 from typing import Callable
+from collections import OrderedDict
 from PyQt6.QtWidgets import (
     QWidget, QVBoxLayout, QHBoxLayout,
     QGridLayout, QScrollArea, QLayout
@@ -25,23 +27,17 @@ MONTHS_OF_THE_YEAR = {
 
 
 def get_attendance_time_interval(min_timeline_dates, max_timeline_dates):
-    interval = None
-    start_days = None
-    end_days = None
-    for index, (month, _) in enumerate(MONTHS_OF_THE_YEAR.items()):
-        if min_timeline_dates.month == month:
-            start_days = sum(list(MONTHS_OF_THE_YEAR.values())[:index]) + min_timeline_dates.date
-        if max_timeline_dates.month == month:
-            year_addition = (max_timeline_dates.year - min_timeline_dates.year) * 360
-            end_days = sum(list(MONTHS_OF_THE_YEAR.values())[:index]) + max_timeline_dates.date + year_addition
-        
-        if start_days is not None and end_days is not None:
-            diff = end_days - start_days
-            week_amt = int(diff / 7)
-            interval = week_amt, week_amt % 7
-            break
+    # Whole weeks between the two entries and the days left over
+    diff = max_timeline_dates.day_number - min_timeline_dates.day_number
+    return diff // 7, diff % 7
+
+def get_attendance_days(min_timeline_dates, max_timeline_dates, valid_attendance_days: list[str]):
+    # Days from the first entry to the last, both included, that fall on one of valid_attendance_days.
+    # The days left over after the whole weeks start on the first entry's weekday and can run past Sunday
+    weeks, rem_days = get_attendance_time_interval(min_timeline_dates, max_timeline_dates)
+    remainder_days = [DAYS_OF_THE_WEEK[(min_timeline_dates.weekday + offset) % 7] for offset in range(rem_days + 1)]
     
-    return interval
+    return (weeks * len(valid_attendance_days)) + sum([day in valid_attendance_days for day in remainder_days])
 
 
 def create_widget(parent_layout: QLayout | None, layout_type: type[QHBoxLayout] | type[QVBoxLayout] | type[QGridLayout]):
@@ -81,3 +77,39 @@ class Thread(QThread):
             self.crashed.emit(e)
             self.exit(-1)
 
+class ScanDebouncer:
+    # A card held against a reader is re-read several times a second, only the first read of a burst counts
+    def __init__(self, windows: dict[type, float] | None = None, default_window: float = 30.0):
+        self.windows = windows if windows is not None else {}
+        self.default_window = default_window
+        
+        # IUD -> when its window ends, oldest first so expired entries are popped from the front
+        self.recent: OrderedDict[str, float] = OrderedDict()
+        
+        self.suppressed = 0
+        self.suppressed_by_type: dict[str, int] = {}
+    
+    def window_for(self, staff: object):
+        return self.windows.get(type(staff), self.default_window)
+    
+    def accept(self, IUD: str, staff: object, now: float | None = None):
+        now = time.monotonic() if now is None else now
+        
+        while self.recent:
+            oldest, expires = next(iter(self.recent.items()))
+            if expires > now:
+                break
+            del self.recent[oldest]
+        
+        expires = self.recent.get(IUD)
+        
+        # Sliding window, a card that keeps being read stays suppressed until it is taken away
+        self.recent[IUD] = now + self.window_for(staff)
+        self.recent.move_to_end(IUD)
+        
+        if expires is not None and expires > now:
+            self.suppressed += 1
+            self.suppressed_by_type[type(staff).__name__] = self.suppressed_by_type.get(type(staff).__name__, 0) + 1
+            return False
+        
+        return True
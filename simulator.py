@@ -0,0 +1,313 @@
+
+import os
+import pty
+import sys
+import tty
+import time
+import random
+import argparse
+import threading
+import selectors
+from typing import Callable
+from communication import encode_binary_frame, LineFrameBuffer, BINARY_HANDSHAKE
+
+
+class DeviceSimulator:
+    def __init__(self, iud_rate: float = 1.0, sensor_rate: float = 2.0, sonar_rate: float = 2.0, sonar_points: int = 180, supports_binary: bool = True, all_streams: bool = False):
+        self.iud_rate = iud_rate
+        self.sensor_rate = sensor_rate
+        self.sonar_rate = sonar_rate
+        self.sonar_points = sonar_points
+        self.supports_binary = supports_binary
+        
+        # Like the firmware, sensors stream after SAFETY and the sonar after SECURITY/SECURITY-ACTIVE
+        self.safety_mode = all_streams
+        self.security_active = all_streams
+        self.safety_distance = 30.0
+        self.binary = False
+        
+        self.master_fd: int | None = None
+        self.slave_fd: int | None = None
+        self.port = ""
+        
+        self.running = False
+        self.thread: threading.Thread | None = None
+        
+        self.card_count = 0
+        self.frames_sent: dict[str, int] = {"IUD": 0, "sensors": 0, "sonar": 0}
+        self.frames_dropped = 0
+        self.commands: list[str] = []
+        
+        # Called on the simulator thread with (stream, value, perf_counter at write) for every frame written
+        self.on_frame: Callable[[str, object, float], None] | None = None
+    
+    def start(self):
+        self.master_fd, self.slave_fd = pty.openpty()
+        tty.setraw(self.slave_fd)
+        os.set_blocking(self.master_fd, False)
+        
+        self.port = os.ttyname(self.slave_fd)
+        
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name=f"simulator {self.port}", daemon=True)
+        self.thread.start()
+        
+        return self.port
+    
+    def stop(self):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join()
+        
+        for fd in (self.master_fd, self.slave_fd):
+            if fd is not None:
+                os.close(fd)
+        
+        self.master_fd = None
+        self.slave_fd = None
+    
+    def _run(self):
+        streams = [
+            (self.iud_rate, self._emit_iud),
+            (self.sensor_rate, self._emit_sensors),
+            (self.sonar_rate, self._emit_sonar),
+        ]
+        
+        start = time.perf_counter()
+        due = [start + random.random() / rate if rate > 0 else float("inf") for rate, _ in streams]
+        
+        commands = LineFrameBuffer()
+        
+        with selectors.DefaultSelector() as selector:
+            selector.register(self.master_fd, selectors.EVENT_READ)
+            
+            while self.running:
+                timeout = min(min(due) - time.perf_counter(), 0.1)
+                
+                if selector.select(max(timeout, 0)):
+                    try:
+                        data = os.read(self.master_fd, 1024)
+                    except BlockingIOError:
+                        data = b""
+                    
+                    # Like the firmware: a bare command per write until the binary handshake, newline terminated after it
+                    if self.binary:
+                        for command in commands.feed(data):
+                            self._command(command.decode().strip())
+                    elif data:
+                        self._command(data.decode().strip())
+                
+                now = time.perf_counter()
+                for index, (rate, emit) in enumerate(streams):
+                    if due[index] <= now:
+                        emit()
+                        due[index] += 1 / rate
+                        
+                        # Don't try to catch up after a stall, just resume at the configured rate
+                        if due[index] < now:
+                            due[index] = now + 1 / rate
+    
+    def _command(self, command: str):
+        if not command:
+            return
+        
+        self.commands.append(command)
+        
+        if command == BINARY_HANDSHAKE:
+            if self.supports_binary:
+                self._write(b"PROTOCOL:str(BINARY)|\r\n")
+                self.binary = True
+            return
+        elif command in ("SECURITY", "SECURITY-ACTIVE"):
+            self.security_active = True
+        elif command == "NOT-SECURITY-ACTIVE":
+            self.security_active = False
+        elif command == "SAFETY":
+            self.safety_mode = True
+        elif command.startswith("SAFETY:"):
+            self.safety_distance = float(command.removeprefix("SAFETY:"))
+        
+        self._send_frame("ACK", {"ACK": command})
+    
+    def _write(self, data: bytes):
+        try:
+            os.write(self.master_fd, data)
+        except BlockingIOError:
+            # Nobody is reading the port, a real device would lose these too
+            self.frames_dropped += 1
+            return False
+        
+        return True
+    
+    def _send_frame(self, stream: str, frame: dict[str, str | float | list]):
+        if self.binary:
+            data = encode_binary_frame(frame)
+        else:
+            data = ("|".join(f"{name}:{self._text_value(value)}" for name, value in frame.items()) + "|\r\n").encode()
+        
+        if self._write(data):
+            if stream in self.frames_sent:
+                self.frames_sent[stream] += 1
+            
+            if self.on_frame is not None:
+                self.on_frame(stream, frame, time.perf_counter())
+    
+    def _text_value(self, value: str | float | list):
+        if isinstance(value, str):
+            return f"str({value})"
+        elif isinstance(value, list):
+            return f"collection({','.join(self._text_value(item) for item in value)})"
+        else:
+            return f"number({value:g})"
+    
+    def _emit_iud(self):
+        self.card_count += 1
+        self._send_frame("IUD", {"IUD": f"SIM{self.card_count:08d}"})
+    
+    def _emit_sensors(self):
+        if self.safety_mode:
+            self._send_frame("sensors", {"Gas": float(random.randint(150, 400)), "Fire": float(random.randint(0, 3))})
+    
+    def _emit_sonar(self):
+        if self.security_active:
+            angles = [index * 180 / self.sonar_points for index in range(self.sonar_points)]
+            distances = [round(random.uniform(2, 60), 1) for _ in angles]
+            
+            self._send_frame("sonar", {"angles": angles, "distances": distances})
+
+
+def run_harness(seconds: float, readers: int, binary: bool, shared_loop: bool, **simulator_args):
+    from PyQt6.QtCore import QCoreApplication, QObject, QTimer, pyqtSignal
+    from communication import ReaderRegistry, AsyncCommEngine
+    from models.data_models import LiveData
+    
+    class Hub(QObject):
+        raw = pyqtSignal(dict)
+        connection_changed = pyqtSignal(bool)
+        iud = pyqtSignal(str, str)
+        sensor = pyqtSignal(float)
+        sonar = pyqtSignal(list)
+    
+    app = QCoreApplication.instance() or QCoreApplication(sys.argv)
+    hub = Hub()
+    
+    sent_at: dict[str, float] = {}
+    latencies: list[float] = []
+    received = {"IUD": 0, "sensors": 0, "sonar": 0}
+    errors: list[str] = []
+    measuring = [True]
+    
+    def on_frame(stream: str, frame: dict, stamp: float):
+        if stream == "IUD":
+            sent_at[frame["IUD"]] = stamp
+    
+    def on_iud(IUD: str, reader_id: str):
+        latency = time.perf_counter() - sent_at.pop(IUD, time.perf_counter())
+        if measuring[0]:
+            latencies.append(latency)
+        received["IUD"] += 1
+    
+    def on_sensor(_):
+        received["sensors"] += 1
+    
+    def on_sonar(_):
+        received["sonar"] += 1
+    
+    hub.iud.connect(on_iud)
+    hub.sensor.connect(on_sensor)
+    hub.sonar.connect(on_sonar)
+    
+    registry = ReaderRegistry(LiveData(hub.raw), hub.connection_changed, lambda e, reader_id: errors.append(f"{reader_id}: {e}"))
+    registry.set_data_point("IUD", hub.iud, with_reader=True)
+    registry.set_data_point("Gas", hub.sensor)
+    registry.set_data_point(("angles", "distances"), hub.sonar)
+    
+    engine = AsyncCommEngine() if shared_loop else None
+    
+    simulators = []
+    for index in range(readers):
+        simulator = DeviceSimulator(all_streams=True, **simulator_args)
+        simulator.on_frame = on_frame
+        port = simulator.start()
+        simulators.append(simulator)
+        
+        reader = registry.add_reader(f"sim-{index}", port, None, 115200)
+        reader.init_wait = 0
+        reader.set_serial(True)
+        reader.set_binary(binary)
+        reader.set_engine(engine)
+        reader.start_connection()
+    
+    QTimer.singleShot(int(seconds * 1000), app.quit)
+    start = time.perf_counter()
+    app.exec()
+    elapsed = time.perf_counter() - start
+    measuring[0] = False  # Frames drained below sat in the queue while the loop was stopped
+    
+    # Stop emitting first and let frames already on the wire reach the slots before counting
+    for simulator in simulators:
+        simulator.running = False
+        simulator.thread.join()
+    
+    time.sleep(0.3)
+    app.processEvents()
+    
+    registry.stop_all()
+    time.sleep(1.2)
+    for simulator in simulators:
+        simulator.stop()
+    if engine is not None:
+        engine.stop()
+    
+    sent = {stream: sum(simulator.frames_sent[stream] for simulator in simulators) for stream in received}
+    
+    print(f"{readers} reader(s), {'binary' if binary else 'text'} framing, {'shared loop' if shared_loop else 'thread per reader'}, {elapsed:.1f} s")
+    for stream in received:
+        print(f"  {stream:8s} sent {sent[stream]:6d}  received {received[stream]:6d}  {received[stream] / elapsed:8.1f}/s")
+    
+    if latencies:
+        latencies.sort()
+        print(f"  IUD tap-to-slot latency  p50 {latencies[len(latencies) // 2] * 1e3:.2f} ms  p95 {latencies[int(len(latencies) * 0.95)] * 1e3:.2f} ms  p99 {latencies[int(len(latencies) * 0.99)] * 1e3:.2f} ms  max {latencies[-1] * 1e3:.2f} ms")
+    
+    metrics = registry.metrics.snapshot()
+    print(f"  pipeline {metrics['frames_per_sec']:.1f} frames/s  {metrics['bytes_per_sec'] / 1024:.1f} KiB/s")
+    for stage, summary in metrics["stages"].items():
+        print(f"    {stage:18s} n {summary['count']:6d}  p50 {summary['p50_us']:8.1f} us  p95 {summary['p95_us']:8.1f} us  p99 {summary['p99_us']:8.1f} us")
+    
+    for error in errors:
+        print(f"  error {error}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simulated RFID/sensor reader on a pseudo-terminal")
+    parser.add_argument("--iud-rate", type=float, default=1.0, help="card taps per second")
+    parser.add_argument("--sensor-rate", type=float, default=2.0, help="Gas/Fire frames per second")
+    parser.add_argument("--sonar-rate", type=float, default=2.0, help="angles/distances sweeps per second")
+    parser.add_argument("--sonar-points", type=int, default=180)
+    parser.add_argument("--no-binary", action="store_true", help="ignore the binary framing handshake")
+    parser.add_argument("--all-streams", action="store_true", help="stream sensors and sonar without waiting for SAFETY/SECURITY")
+    parser.add_argument("--harness", type=float, metavar="SECONDS", help="connect readers to the simulators and report throughput and latency")
+    parser.add_argument("--readers", type=int, default=1, help="simulated readers in harness mode")
+    parser.add_argument("--binary", action="store_true", help="negotiate binary framing in harness mode")
+    parser.add_argument("--shared-loop", action="store_true", help="use the shared event loop in harness mode")
+    args = parser.parse_args()
+    
+    simulator_args = {
+        "iud_rate": args.iud_rate,
+        "sensor_rate": args.sensor_rate,
+        "sonar_rate": args.sonar_rate,
+        "sonar_points": args.sonar_points,
+        "supports_binary": not args.no_binary,
+    }
+    
+    if args.harness is not None:
+        run_harness(args.harness, args.readers, args.binary, args.shared_loop, **simulator_args)
+    else:
+        simulator = DeviceSimulator(all_streams=args.all_streams, **simulator_args)
+        print(f"Simulated reader on {simulator.start()}, Ctrl+C to stop")
+        
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            simulator.stop()
@@ -0,0 +1,697 @@
+import os
+import json
+import time
+import zlib
+import struct
+import sqlite3
+import threading
+import numpy as np
+from models.collection_data_models import *
+
+SCHEMA_VERSION = 1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS settings (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS departments (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS classes (
+    id TEXT PRIMARY KEY,
+    level_name TEXT NOT NULL,
+    class_name TEXT NOT NULL,
+    name TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS staff (
+    key INTEGER PRIMARY KEY,
+    kind TEXT NOT NULL,
+    id TEXT NOT NULL,
+    iud TEXT,
+    sur TEXT NOT NULL,
+    first TEXT NOT NULL,
+    middle TEXT NOT NULL,
+    abrev TEXT NOT NULL,
+    other TEXT,
+    img_path TEXT NOT NULL,
+    department_id TEXT REFERENCES departments (id),
+    post_name TEXT,
+    class_id TEXT REFERENCES classes (id),
+    duties TEXT,
+    UNIQUE (kind, id)
+);
+
+CREATE TABLE IF NOT EXISTS subjects (
+    staff INTEGER NOT NULL REFERENCES staff (key),
+    position INTEGER NOT NULL,
+    id TEXT NOT NULL,
+    name TEXT NOT NULL,
+    class_id TEXT NOT NULL REFERENCES classes (id),
+    periods TEXT NOT NULL,
+    PRIMARY KEY (staff, position)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS readers (
+    key INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+
+CREATE TABLE IF NOT EXISTS attendance (
+    staff INTEGER NOT NULL REFERENCES staff (key),
+    timestamp INTEGER NOT NULL,
+    reader INTEGER REFERENCES readers (key)
+);
+
+CREATE INDEX IF NOT EXISTS attendance_timestamp ON attendance (timestamp);
+CREATE INDEX IF NOT EXISTS attendance_staff ON attendance (staff, timestamp);
+"""
+
+
+JOURNAL_MAGIC = b"RFIDJNL1"
+
+_RECORD_HEADER = struct.Struct("<HI")  # body length, crc32 of the body
+_RECORD_BODY = struct.Struct("<QqB")  # seq, timestamp, staff kind, then "staff id\0reader" in utf-8
+_STAFF_KINDS = ("teacher", "prefect")
+
+
+def encode_journal_record(seq: int, timestamp: int, kind: int, staff_id: str, reader: str | None):
+    body = _RECORD_BODY.pack(seq, timestamp, kind) + f"{staff_id}\0{reader or ''}".encode()
+    return _RECORD_HEADER.pack(len(body), zlib.crc32(body)) + body
+
+def read_journal(path: str):
+    # Returns the records and how many bytes of the file hold good ones, reading stops at a record torn by a crash
+    with open(path, "rb") as file:
+        data = file.read()
+    
+    if not data.startswith(JOURNAL_MAGIC):
+        if JOURNAL_MAGIC.startswith(data):
+            return [], 0  # Crashed while the header was written
+        raise Exception(f"{path} is not an attendance journal")
+    
+    records: list[tuple[int, int, int, str, str | None]] = []
+    offset = len(JOURNAL_MAGIC)
+    while offset + _RECORD_HEADER.size <= len(data):
+        length, crc = _RECORD_HEADER.unpack_from(data, offset)
+        body = data[offset + _RECORD_HEADER.size:offset + _RECORD_HEADER.size + length]
+        if len(body) != length or zlib.crc32(body) != crc:
+            break
+        
+        seq, timestamp, kind = _RECORD_BODY.unpack_from(body)
+        staff_id, _, reader = body[_RECORD_BODY.size:].decode().partition("\0")
+        records.append((seq, timestamp, kind, staff_id, reader or None))
+        offset += _RECORD_HEADER.size + length
+    
+    return records, offset
+
+def _fsync_dir(path: str):
+    # Makes a create, rename or delete of path survive a power cut
+    fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class AttendanceJournal:
+    # Taps are appended here from the GUI thread and written and fsynced in batches on a writer thread.
+    # A tap counts as acknowledged once durable_seq reaches its seq; compaction folds the journal into the database
+    def __init__(self, path: str, database_path: str, compact_interval: float = 300.0, compact_records: int = 10000):
+        self.path = path
+        self.old_path = path + ".old"  # Rotated out, waiting to be folded into the database
+        self.database_path = database_path
+        self.compact_interval = compact_interval
+        self.compact_records = compact_records
+        
+        self.condition = threading.Condition()
+        self.pending: list[bytes] = []
+        self.seq = 0  # Last seq handed out
+        self.durable_seq = 0  # Every record up to here is on disk
+        self.running = False
+        self._rotate = False
+        self._stop = threading.Event()
+        self.compact_lock = threading.Lock()  # Saves compact too, from their own worker
+        
+        self.fd: int | None = None
+        self.size = 0
+        self.unfolded = 0  # Records in the live file
+        
+        self.writer: threading.Thread | None = None
+        self.compactor: threading.Thread | None = None
+        
+        self.batches = 0
+        self.records = 0
+        self.fsync_ns_max = 0
+        self.compactions = 0
+        self.compaction_ms = 0.0
+        self.last_error: Exception | None = None
+    
+    def recover(self, data: AppData, folded_seq: int):
+        # Replays records the database doesn't have yet on top of it, returns how many were applied
+        self.seq = folded_seq
+        replayed = 0
+        
+        for path in (self.old_path, self.path):
+            if not os.path.exists(path):
+                continue
+            
+            records, valid = read_journal(path)
+            if path == self.path and valid < os.path.getsize(path):
+                # The torn record was never fsynced, so never acknowledged. Cut it off so appends follow the last good one
+                with open(path, "r+b") as file:
+                    file.truncate(valid)
+                    os.fsync(file.fileno())
+            
+            for seq, timestamp, kind, staff_id, reader in records:
+                if seq <= folded_seq:
+                    continue
+                
+                staff = (data.teachers if kind == 0 else data.prefects).get(staff_id)
+                if staff is not None:
+                    data.attendance_data.append(staff, timestamp, reader)
+                    replayed += 1
+                
+                self.seq = max(self.seq, seq)
+                if path == self.path:
+                    self.unfolded += 1
+        
+        self.durable_seq = self.seq
+        return replayed
+    
+    def start(self):
+        self._open()
+        
+        self.running = True
+        self._stop.clear()
+        self.writer = threading.Thread(target=self._write_loop, name="attendance journal", daemon=True)
+        self.compactor = threading.Thread(target=self._compact_loop, name="attendance journal compaction", daemon=True)
+        self.writer.start()
+        self.compactor.start()
+    
+    def close(self):
+        # Compaction goes first, it needs the writer to rotate. The writer drains what is pending before it exits
+        self._stop.set()
+        if self.compactor is not None:
+            self.compactor.join()
+        
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+        if self.writer is not None:
+            self.writer.join()
+        
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+    
+    def append(self, staff: Teacher | Prefect, timestamp: int, reader: str | None = None):
+        kind = 0 if isinstance(staff, Teacher) else 1
+        
+        with self.condition:
+            self.seq += 1
+            self.pending.append(encode_journal_record(self.seq, timestamp, kind, staff.id, reader))
+            self.condition.notify_all()
+            
+            return self.seq
+    
+    def wait_durable(self, seq: int, timeout: float | None = None):
+        with self.condition:
+            return self.condition.wait_for(lambda: self.durable_seq >= seq, timeout)
+    
+    def stats(self):
+        return {
+            "seq": self.seq,
+            "durable_seq": self.durable_seq,
+            "batches": self.batches,
+            "records": self.records,
+            "fsync_ms_max": self.fsync_ns_max / 1e6,
+            "unfolded": self.unfolded,
+            "compactions": self.compactions,
+            "compaction_ms": self.compaction_ms,
+            "last_error": str(self.last_error) if self.last_error is not None else None,
+        }
+    
+    def _open(self):
+        self.fd = os.open(self.path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        self.size = os.fstat(self.fd).st_size
+        
+        if self.size == 0:
+            os.write(self.fd, JOURNAL_MAGIC)
+            os.fsync(self.fd)
+            _fsync_dir(self.path)
+            self.size = len(JOURNAL_MAGIC)
+    
+    def _write_loop(self):
+        while True:
+            with self.condition:
+                while self.running and not self.pending and not self._rotate:
+                    self.condition.wait()
+                if not self.running and not self.pending and not self._rotate:
+                    break
+                
+                # Everything queued while the last fsync ran goes out in this one, so busy gates share fsyncs
+                batch, self.pending = self.pending, []
+                batch_seq = self.seq
+                rotate = self._rotate
+            
+            if batch:
+                try:
+                    self._write(b"".join(batch))
+                except OSError as e:
+                    self.last_error = e
+                    with self.condition:
+                        self.pending[:0] = batch
+                    time.sleep(1)
+                    continue
+                
+                with self.condition:
+                    self.durable_seq = batch_seq
+                    self.condition.notify_all()
+                
+                self.batches += 1
+                self.records += len(batch)
+                self.unfolded += len(batch)
+            
+            if rotate:
+                try:
+                    self._rotate_file()
+                except OSError as e:
+                    self.last_error = e
+                
+                with self.condition:
+                    self._rotate = False
+                    self.condition.notify_all()
+    
+    def _write(self, data: bytes):
+        start_size = self.size
+        try:
+            written = 0
+            while written < len(data):
+                written += os.write(self.fd, data[written:])
+            
+            start = time.perf_counter_ns()
+            os.fsync(self.fd)
+            self.fsync_ns_max = max(self.fsync_ns_max, time.perf_counter_ns() - start)
+        except OSError:
+            # A half written batch would end the journal early on recovery, take it back before retrying
+            os.ftruncate(self.fd, start_size)
+            raise
+        
+        self.size = start_size + len(data)
+    
+    def _rotate_file(self):
+        # On the writer thread between batches, so no record is split across the two files
+        os.close(self.fd)
+        self.fd = None
+        os.replace(self.path, self.old_path)
+        self._open()
+        self.unfolded = 0
+    
+    def _compact_loop(self):
+        last = time.monotonic()
+        while not self._stop.wait(1):
+            # A rotated file left by a crash is folded straight away
+            if os.path.exists(self.old_path) or self.unfolded >= self.compact_records or (self.unfolded and time.monotonic() - last >= self.compact_interval):
+                try:
+                    self.compact()
+                except Exception as e:
+                    self.last_error = e
+                last = time.monotonic()
+    
+    def compact(self):
+        # Off the GUI thread: rotate the live file out and fold it into the database in one transaction.
+        # Returns how many taps and journal bytes were folded
+        with self.compact_lock:
+            start = time.perf_counter()
+            
+            if not os.path.exists(self.old_path):
+                with self.condition:
+                    if not self.unfolded and not self.pending:
+                        return 0, 0
+                    
+                    self._rotate = True
+                    self.condition.notify_all()
+                    self.condition.wait_for(lambda: not self._rotate)
+            
+            folded = (0, 0)
+            if os.path.exists(self.old_path):
+                folded = self._fold(self.old_path)
+            
+            self.compactions += 1
+            self.compaction_ms = (time.perf_counter() - start) * 1e3
+            
+            return folded
+    
+    def _fold(self, path: str):
+        size = os.path.getsize(path)
+        records, _ = read_journal(path)
+        
+        connection = sqlite3.connect(self.database_path)
+        try:
+            # The journal file is deleted right after, so this commit has to be on disk first
+            connection.execute("PRAGMA synchronous = FULL")
+            
+            with connection:
+                row = connection.execute("SELECT value FROM settings WHERE key = 'journal_seq'").fetchone()
+                folded_seq = json.loads(row[0]) if row is not None else 0
+                
+                # Records at or below journal_seq are already in, from an earlier fold or a full save
+                records = [record for record in records if record[0] > folded_seq]
+                if records:
+                    connection.executemany("INSERT OR IGNORE INTO readers (name) VALUES (?)", {(reader, ) for *_, reader in records if reader is not None})
+                    connection.executemany(
+                        "INSERT INTO attendance SELECT key, ?, (SELECT key FROM readers WHERE name = ?) FROM staff WHERE kind = ? AND id = ?",
+                        [(timestamp, reader, _STAFF_KINDS[kind], staff_id) for _, timestamp, kind, staff_id, reader in records]
+                    )
+                    connection.execute("INSERT OR REPLACE INTO settings VALUES ('journal_seq', ?)", (json.dumps(max(record[0] for record in records)), ))
+        finally:
+            connection.close()
+        
+        os.remove(path)
+        _fsync_dir(path)
+        
+        return len(records), size
+
+
+class AttendanceDatabase:
+    def __init__(self, path: str | os.PathLike):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        
+        # WAL keeps each scan's commit to an append on the log, and readers don't block the writer.
+        # NORMAL only syncs at checkpoints: an app crash loses nothing, a power cut can lose the last few scans
+        self.connection.execute("PRAGMA journal_mode = WAL")
+        self.connection.execute("PRAGMA synchronous = NORMAL")
+        
+        version = self.connection.execute("PRAGMA user_version").fetchone()[0]
+        if version > SCHEMA_VERSION:
+            self.connection.close()
+            raise Exception(f"{path} was written by a newer version (schema {version}, this reads up to {SCHEMA_VERSION})")
+        
+        with self.connection:
+            self.connection.executescript(SCHEMA)
+            self.connection.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        
+        # Database keys of the objects in the AppData this database is attached to
+        self.staff_keys: dict[int, int] = {}  # id(staff) -> staff.key
+        self.staff_by_key: dict[int, Teacher | Prefect] = {}
+        self.reader_keys: dict[str, int] = {}
+        
+        self.journal: AttendanceJournal | None = None
+        self.dirty_staff: dict[int, Teacher | Prefect] = {}  # id(staff) -> staff changed since the last save
+    
+    def close(self):
+        if self.journal is not None:
+            self.journal.close()
+        self.connection.close()
+    
+    def open_journal(self, data: AppData, path: str | None = None, **journal_args):
+        # Taps then go to the journal instead of a database transaction each, returns how many were replayed
+        path = path if path is not None else os.path.splitext(self.path)[0] + ".journal"
+        row = self.connection.execute("SELECT value FROM settings WHERE key = 'journal_seq'").fetchone()
+        
+        self.journal = AttendanceJournal(path, self.path, **journal_args)
+        replayed = self.journal.recover(data, json.loads(row[0]) if row is not None else 0)
+        self.journal.start()
+        
+        return replayed
+    
+    def is_empty(self):
+        return self.connection.execute("SELECT 1 FROM staff LIMIT 1").fetchone() is None
+    
+    def save(self, data: AppData):
+        # Rewrites everything, for a new database. Scans and staff changes after this are written as they happen or on the next save
+        self.write_snapshot(self.snapshot(data), self.journal.seq if self.journal is not None else 0)
+        data.storage = self
+    
+    def snapshot(self, data: AppData):
+        # On the GUI thread: plain copies of everything, so another thread can write them while scanning goes on
+        store = data.attendance_data
+        store.ensure_loaded()
+        
+        staff_list = list(store.staff)
+        known = {id(staff) for staff in staff_list}
+        staff_list.extend(staff for staff in (*data.teachers.values(), *data.prefects.values()) if id(staff) not in known)
+        
+        return {
+            "settings": [
+                ("teacher_cit", json.dumps([data.teacher_cit.hour, data.teacher_cit.min, data.teacher_cit.sec])),
+                ("prefect_cit", json.dumps([data.prefect_cit.hour, data.prefect_cit.min, data.prefect_cit.sec])),
+                ("teacher_timeline_dates", json.dumps([entry.timestamp for entry in data.teacher_timeline_dates])),
+                ("prefect_timeline_dates", json.dumps([entry.timestamp for entry in data.prefect_timeline_dates])),
+            ],
+            "staff": [self._staff_snapshot(staff) for staff in staff_list],
+            "readers": list(store.readers),
+            "rows": store.rows[:store.size].copy(),
+        }
+    
+    def write_snapshot(self, snapshot: dict, journal_seq: int = 0):
+        # journal_seq is the last journaled tap the snapshot's rows include, so compaction doesn't add it twice
+        with self.connection:
+            for table in ("attendance", "readers", "subjects", "staff", "classes", "departments", "settings"):
+                self.connection.execute(f"DELETE FROM {table}")
+            
+            self.connection.executemany("INSERT INTO settings VALUES (?, ?)", [*snapshot["settings"], ("journal_seq", json.dumps(journal_seq))])
+            
+            self.staff_keys = {}
+            self.staff_by_key = {}
+            for key, (staff, _, *values) in enumerate(snapshot["staff"], 1):
+                self._remember(staff, self._write_staff(self.connection, key, *values))
+            
+            # Store indices map straight onto keys, so the rows go in without a per-row lookup
+            self.reader_keys = {reader: key for key, reader in enumerate(snapshot["readers"], 1)}
+            self.connection.executemany("INSERT INTO readers VALUES (?, ?)", [(key, reader) for reader, key in self.reader_keys.items()])
+            
+            rows = snapshot["rows"]
+            readers = [reader + 1 if reader >= 0 else None for reader in rows["reader"].tolist()]
+            self.connection.executemany("INSERT INTO attendance VALUES (?, ?, ?)", zip((rows["staff"] + 1).tolist(), rows["timestamp"].tolist(), readers))
+    
+    def staff_changed(self, staff: Teacher | Prefect):
+        # Written by the next save
+        self.dirty_staff[id(staff)] = staff
+    
+    def save_staff(self, staff: Teacher | Prefect):
+        # Written at once, for changes a crash must not lose, e.g. a card link whose taps would otherwise be dropped as unknown
+        _, key, *values = self._staff_snapshot(staff)
+        with self.connection:
+            self._remember(staff, self._write_staff(self.connection, key, *values))
+        
+        self.dirty_staff.pop(id(staff), None)
+    
+    def take_changes(self):
+        # On the GUI thread: the changed staff as plain values. Changed attendance is whatever the journal holds
+        changes = [self._staff_snapshot(staff) for staff in self.dirty_staff.values()]
+        self.dirty_staff.clear()
+        
+        return changes
+    
+    def write_changes(self, changes: list):
+        # On a save worker with its own connection, while the GUI thread keeps scanning
+        start = time.perf_counter()
+        size = 0
+        
+        connection = sqlite3.connect(self.path)
+        try:
+            connection.execute("PRAGMA synchronous = FULL")
+            with connection:
+                for staff, key, row, departments, classes, subjects in changes:
+                    self._remember(staff, self._write_staff(connection, key, row, departments, classes, subjects))
+                    size += sum(len(str(value)) for value in row if value is not None) + sum(len(subject[4]) for subject in subjects or ())
+        finally:
+            connection.close()
+        
+        taps, journal_bytes = self.journal.compact() if self.journal is not None else (0, 0)
+        
+        return {"staff": len(changes), "attendance": taps, "bytes": size + journal_bytes, "write_ms": (time.perf_counter() - start) * 1e3}
+    
+    def export(self, path: str):
+        # On a save worker: a copy of what is on disk through SQLite's backup API, this database stays open and keeps being written
+        source = sqlite3.connect(self.path)
+        target = sqlite3.connect(path)
+        try:
+            source.backup(target)
+            staff, attendance = target.execute("SELECT (SELECT count(*) FROM staff), (SELECT count(*) FROM attendance)").fetchone()
+        finally:
+            target.close()
+            source.close()
+        
+        return {"staff": staff, "attendance": attendance, "bytes": os.path.getsize(path)}
+    
+    def load(self):
+        settings = {key: json.loads(value) for key, value in self.connection.execute("SELECT key, value FROM settings")}
+        departments = {department_id: Department(department_id, name) for department_id, name in self.connection.execute("SELECT id, name FROM departments")}
+        classes = {row[0]: Class(*row) for row in self.connection.execute("SELECT id, level_name, class_name, name FROM classes")}
+        
+        subjects: dict[int, list[Subject]] = {}
+        for key, subject_id, name, class_id, periods in self.connection.execute("SELECT staff, id, name, class_id, periods FROM subjects ORDER BY staff, position"):
+            subjects.setdefault(key, []).append(Subject(subject_id, name, classes[class_id], [tuple(period) for period in json.loads(periods)]))
+        
+        teachers: dict[str, Teacher] = {}
+        prefects: dict[str, Prefect] = {}
+        self.staff_keys = {}
+        self.staff_by_key = {}
+        
+        for key, kind, staff_id, iud, sur, first, middle, abrev, other, img_path, department_id, post_name, class_id, duties in self.connection.execute("SELECT * FROM staff ORDER BY key"):
+            name = CharacterName(sur, first, middle, abrev, other)
+            if kind == "teacher":
+                staff = teachers[staff_id] = Teacher(staff_id, iud, name, departments[department_id], subjects.get(key, []), img_path, [])
+            else:
+                staff = prefects[staff_id] = Prefect(staff_id, iud, name, post_name, classes[class_id], img_path, json.loads(duties), [])
+            
+            self._remember(staff, key)
+        
+        self.reader_keys = {name: key for key, name in self.connection.execute("SELECT key, name FROM readers ORDER BY key")}
+        
+        store = AttendanceStore()
+        store.staff = list(self.staff_by_key.values())
+        store.staff_index = {id(staff): index for index, staff in enumerate(store.staff)}
+        store.readers = list(self.reader_keys)
+        store.reader_index = {reader: index for index, reader in enumerate(store.readers)}
+        # Rows added after this come from the journal, which puts them in the store as well, so loads stop here
+        last_rowid = self.connection.execute("SELECT ifnull(max(rowid), 0) FROM attendance").fetchone()[0]
+        store.loader = lambda start=None, end=None: self._load_attendance(store, last_rowid, start, end)
+        
+        data = AppData(
+            Time(*settings["teacher_cit"]),
+            Time(*settings["prefect_cit"]),
+            
+            tuple(AttendanceEntry(timestamp) for timestamp in settings["teacher_timeline_dates"]),
+            tuple(AttendanceEntry(timestamp) for timestamp in settings["prefect_timeline_dates"]),
+            
+            store,
+            
+            teachers,
+            prefects
+        )
+        data.storage = self
+        
+        return data
+    
+    def _load_attendance(self, store: AttendanceStore, last_rowid: int, start: int | None = None, end: int | None = None):
+        # Lookup tables from database keys to store indices convert the whole column at once
+        staff_keys = {self.staff_keys[id(staff)]: index for index, staff in enumerate(store.staff) if id(staff) in self.staff_keys}
+        staff_lookup = np.full(max(staff_keys, default=0) + 1, -1, "<i4")
+        staff_lookup[list(staff_keys)] = list(staff_keys.values())
+        
+        # Readers added to the table since load() (by journal compaction) are picked up here
+        for key, name in self.connection.execute("SELECT key, name FROM readers ORDER BY key"):
+            self.reader_keys[name] = key
+            if name not in store.reader_index:
+                store.reader_index[name] = len(store.readers)
+                store.readers.append(name)
+        
+        # Readers only seen in taps that are still in the journal have no key yet, no row on disk uses them
+        reader_keys = {self.reader_keys[reader]: index for index, reader in enumerate(store.readers) if reader in self.reader_keys}
+        reader_lookup = np.full(max(reader_keys, default=0) + 1, -1, "<i2")
+        reader_lookup[list(reader_keys)] = list(reader_keys.values())
+        
+        where, params = "rowid <= ?", (last_rowid, )
+        if start is not None:
+            # The unary + keeps SQLite on the timestamp index instead of walking the rowids
+            where, params = "timestamp >= ? AND timestamp < ? AND +rowid <= ?", (start, end, last_rowid)
+        
+        count = self.connection.execute(f"SELECT count(*) FROM attendance WHERE {where}", params).fetchone()[0]
+        rows = np.fromiter(self.connection.execute(f"SELECT staff, timestamp, ifnull(reader, 0) FROM attendance WHERE {where} ORDER BY rowid", params), AttendanceStore.DTYPE, count)
+        
+        rows["staff"] = staff_lookup[rows["staff"]]
+        rows["reader"] = reader_lookup[rows["reader"]]
+        
+        return rows
+    
+    def add_attendance(self, staff: Teacher | Prefect, timestamp: int, reader: str | None = None):
+        if self.journal is not None:
+            # Compaction finds staff by (kind, id), so they have to be in the database first
+            if id(staff) not in self.staff_keys:
+                with self.connection:
+                    self._staff_key(staff)
+            
+            self.journal.append(staff, timestamp, reader)
+            return
+        
+        # One small transaction per scan, a crash loses at most the scan being written
+        with self.connection:
+            self.connection.execute("INSERT INTO attendance VALUES (?, ?, ?)", (self._staff_key(staff), timestamp, self._reader_key(reader)))
+    
+    def attendance_between(self, start: int, end: int, staff: Teacher | Prefect | None = None):
+        # Entries with start <= timestamp < end, read from disk without loading the rest of the history
+        query = "SELECT attendance.staff, attendance.timestamp, readers.name FROM attendance LEFT JOIN readers ON readers.key = attendance.reader WHERE attendance.timestamp >= ? AND attendance.timestamp < ?"
+        
+        if staff is None:
+            rows = self.connection.execute(query + " ORDER BY attendance.timestamp", (start, end))
+        elif id(staff) in self.staff_keys:
+            rows = self.connection.execute(query + " AND attendance.staff = ? ORDER BY attendance.timestamp", (start, end, self.staff_keys[id(staff)]))
+        else:
+            return []
+        
+        return [AttendanceEntry(timestamp, self.staff_by_key[key], reader) for key, timestamp, reader in rows]
+    
+    def _staff_key(self, staff: Teacher | Prefect):
+        key = self.staff_keys.get(id(staff))
+        if key is None:
+            _, _, *values = self._staff_snapshot(staff)
+            key = self._write_staff(self.connection, None, *values)
+            self._remember(staff, key)
+        
+        return key
+    
+    def _reader_key(self, reader: str | None):
+        if reader is None:
+            return None
+        
+        key = self.reader_keys.get(reader)
+        if key is None:
+            # The journal's compaction adds readers from its own connection
+            self.connection.execute("INSERT OR IGNORE INTO readers (name) VALUES (?)", (reader, ))
+            key = self.reader_keys[reader] = self.connection.execute("SELECT key FROM readers WHERE name = ?", (reader, )).fetchone()[0]
+        
+        return key
+    
+    def _remember(self, staff: Teacher | Prefect, key: int):
+        self.staff_keys[id(staff)] = key
+        self.staff_by_key[key] = staff
+    
+    def _staff_snapshot(self, staff: Teacher | Prefect):
+        # Plain values, the row and what it refers to, taken on the GUI thread
+        name = staff.name
+        if isinstance(staff, Teacher):
+            row = ("teacher", staff.id, staff.IUD, name.sur, name.first, name.middle, name.abrev, name.other, str(staff.img_path), staff.department.id, None, None, None)
+            departments = [(staff.department.id, staff.department.name)]
+            classes = [subject.cls for subject in staff.subjects]
+            subjects = [(position, subject.id, subject.name, subject.cls.id, json.dumps(subject.periods)) for position, subject in enumerate(staff.subjects)]
+        elif isinstance(staff, Prefect):
+            row = ("prefect", staff.id, staff.IUD, name.sur, name.first, name.middle, name.abrev, name.other, str(staff.img_path), None, staff.post_name, staff.cls.id, json.dumps(staff.duties))
+            departments = []
+            classes = [staff.cls]
+            subjects = None
+        else:
+            raise Exception(f"Type: {type(staff)} is not supported")
+        
+        return staff, self.staff_keys.get(id(staff)), row, departments, [(cls.id, cls.level_name, cls.class_name, cls.name) for cls in classes], subjects
+    
+    @staticmethod
+    def _write_staff(connection: sqlite3.Connection, key: int | None, row: tuple, departments: list, classes: list, subjects: list | None):
+        # Callers hold the transaction
+        connection.executemany("INSERT OR REPLACE INTO departments VALUES (?, ?)", departments)
+        connection.executemany("INSERT OR REPLACE INTO classes VALUES (?, ?, ?, ?)", classes)
+        
+        if key is not None:
+            connection.execute("INSERT OR REPLACE INTO staff VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", (key, *row))
+        else:
+            # A staff member saved by an earlier session keeps their key, and with it their attendance rows
+            key = connection.execute(
+                "INSERT INTO staff VALUES (NULL, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (kind, id) DO UPDATE SET iud = excluded.iud, sur = excluded.sur, first = excluded.first, middle = excluded.middle, abrev = excluded.abrev, other = excluded.other, "
+                "img_path = excluded.img_path, department_id = excluded.department_id, post_name = excluded.post_name, class_id = excluded.class_id, duties = excluded.duties "
+                "RETURNING key",
+                row
+            ).fetchone()[0]
+        
+        if subjects is not None:
+            connection.execute("DELETE FROM subjects WHERE staff = ?", (key, ))
+            connection.executemany("INSERT INTO subjects VALUES (?, ?, ?, ?, ?, ?)", [(key, *subject) for subject in subjects])
+        
+        return key
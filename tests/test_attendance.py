@@ -0,0 +1,63 @@
+import os
+import time
+import pytest
+import numpy as np
+from models.collection_data_models import *
+from models.collection_data_models import local_months, local_timestamps, month_label
+from others import get_attendance_days
+
+DAY = 86400
+
+
+@pytest.fixture(params=["UTC", "Africa/Lagos", "Europe/London", "America/St_Johns"])
+def timezone(request):
+    saved = os.environ.get("TZ")
+    os.environ["TZ"] = request.param
+    time.tzset()
+    
+    yield request.param
+    
+    if saved is None:
+        del os.environ["TZ"]
+    else:
+        os.environ["TZ"] = saved
+    time.tzset()
+
+def make_store():
+    name = CharacterName("Sur", "First", "Middle", "Abbr")
+    staff = [Prefect(f"p{i}", f"P{i}", name, "Post", Class("c", "SS3", "A", "SS3 A"), "img.png", {}, []) for i in range(3)]
+    
+    # Taps every 7 hours 13 minutes across both DST changes of a year
+    start = AttendanceEntry.at(2025, 1, 1, 6).timestamp
+    store = AttendanceStore()
+    for index in range(1300):
+        store.append(staff[index % 3], start + index * (7 * 3600 + 13 * 60), None)
+    
+    return store, staff
+
+
+def test_local_columns_match_the_entries(timezone):
+    store, _ = make_store()
+    local = local_timestamps(store.column("timestamp"))
+    
+    assert (local // DAY).tolist() == [entry.day_number for entry in store]
+    assert [(int(s) // 3600, int(s) // 60 % 60, int(s) % 60) for s in local % DAY] == [(entry.time.hour, entry.time.min, entry.time.sec) for entry in store]
+    assert [month_label(month) for month in local_months(local).tolist()] == [f"{entry.month} {entry.year}" for entry in store]
+
+def test_staff_columns_match_their_attendance(timezone):
+    store, staff = make_store()
+    counts = store.counts()
+    
+    for member in staff:
+        attendance = StaffAttendance(store, member)
+        assert counts[attendance.staff_index] == len(attendance)
+        assert attendance.timestamps().tolist() == [entry.timestamp for entry in attendance]
+
+@pytest.mark.parametrize("start, end", [((2025, 1, 10), (2025, 1, 13)), ((2025, 1, 8), (2025, 1, 28)), ((2025, 1, 6), (2025, 1, 8)), ((2025, 1, 12), (2025, 1, 12))])
+@pytest.mark.parametrize("valid_days", [["Monday", "Friday"], ["Saturday", "Sunday"], ["Wednesday"]])
+def test_attendance_days_count_from_the_start_weekday(start, end, valid_days):
+    # Fri 10th to Mon 13th is Fri, Sat, Sun, Mon, not the first four days of a week
+    first, last = AttendanceEntry.at(*start, 7), AttendanceEntry.at(*end, 7)
+    days = [AttendanceEntry(first.timestamp + offset * DAY).day for offset in range(last.day_number - first.day_number + 1)]
+    
+    assert get_attendance_days(first, last, valid_days) == sum(day in valid_days for day in days)
@@ -0,0 +1,110 @@
+import os
+import sys
+import time
+import pytest
+from PyQt6.QtCore import QCoreApplication, QObject, pyqtSignal
+from communication import AsyncCommEngine, BaseCommSystem, CommDevice, ReaderRegistry
+from models.data_models import LiveData
+
+app = QCoreApplication.instance() or QCoreApplication([])
+
+pytestmark = pytest.mark.skipif(not sys.platform.startswith("linux"), reason="Simulated ports are ptys")
+
+
+class _Device(QObject):
+    data = pyqtSignal(dict)
+    connection_changed = pyqtSignal(bool)
+
+
+@pytest.fixture
+def port():
+    import pty
+    import tty
+    
+    master, slave = pty.openpty()
+    tty.setraw(slave)
+    
+    yield os.ttyname(slave)
+    
+    os.close(master)
+    os.close(slave)
+
+def wait_for(condition, timeout: float = 5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_engine_stop_unwinds_runs(port: str):
+    device = _Device()
+    comm_system = BaseCommSystem(CommDevice(LiveData(device.data), device.connection_changed, port, None, 115200), print)
+    comm_system.init_wait = 0
+    comm_system.set_serial(True)
+    
+    engine = AsyncCommEngine()
+    comm_system.set_engine(engine)
+    comm_system.start_connection()
+    wait_for(lambda: comm_system.link_up_since is not None)
+    
+    engine.stop()
+    
+    # A run only drops its entry once it has unwound, closing the port and removing its fd readers
+    assert engine.connections == {}
+
+def make_registry():
+    device = _Device()
+    states: list[bool] = []
+    device.connection_changed.connect(states.append)
+    
+    registry = ReaderRegistry(LiveData(device.data), device.connection_changed, lambda e, reader_id: print(reader_id, e))
+    registry._device = device  # Keeps the signals alive
+    
+    return registry, states
+
+def start_reader(registry: ReaderRegistry, port: str, engine: AsyncCommEngine | None):
+    reader = registry.add_reader("gate", port, None, 115200)
+    reader.init_wait = 0
+    reader.set_serial(True)
+    reader.set_engine(engine)
+    reader.start_connection()
+    wait_for(lambda: reader.link_up_since is not None)
+    
+    return reader
+
+@pytest.mark.parametrize("shared_loop", [False, True])
+def test_replaced_reader_releases_its_sockets(port: str, shared_loop: bool):
+    registry, states = make_registry()
+    engine = AsyncCommEngine() if shared_loop else None
+    
+    old = start_reader(registry, port, engine)
+    fds = len(os.listdir("/proc/self/fd"))
+    for _ in range(5):
+        start_reader(registry, port, engine)
+    
+    wait_for(lambda: old._wakeup_recv.fileno() == -1 and old._wakeup_send.fileno() == -1)
+    assert not old.connected
+    
+    # One reader open now, as before, plus the serial port the last replacement may not have closed yet
+    wait_for(lambda: len(os.listdir("/proc/self/fd")) <= fds)
+    
+    registry.remove_reader("gate")
+    if engine is not None:
+        engine.stop()
+
+def test_replaced_reader_cannot_disconnect_its_successor(port: str):
+    registry, states = make_registry()
+    
+    old = start_reader(registry, port, None)
+    start_reader(registry, port, None)
+    old.connection_thread.wait(5000)
+    
+    # A late callback from the old run, e.g. its link going down as it unwinds
+    old.device.connection_changed.emit(False)
+    
+    assert registry.connected
+    assert registry.connected_readers == {"gate"}
+    assert states[-1] is True
+    
+    registry.remove_reader("gate")
+    assert not registry.connected
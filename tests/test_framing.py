@@ -0,0 +1,160 @@
+import random
+import pytest
+from PyQt6.QtCore import QCoreApplication, QObject, pyqtSignal
+from communication import BINARY_HANDSHAKE, BaseCommSystem, BinaryFrameDecoder, CommDevice, LineFrameBuffer, encode_binary_frame, parse_frame
+from models.data_models import LiveData
+
+app = QCoreApplication.instance() or QCoreApplication([])
+
+TEXT_FRAMES = [{"IUD": f"CARD{i}"} for i in range(40)]
+HANDSHAKE_REPLY = b"PROTOCOL:str(BINARY)|\r\n"
+# Halves and small ints survive the f32 round trip exactly
+BINARY_FRAMES = [{"IUD": f"B{i}"} if i % 3 else {"angles": [float(x) for x in range(20)], "distances": [x / 2 for x in range(20)]} for i in range(120)]
+
+
+class _Device(QObject):
+    data = pyqtSignal(dict)
+    connection_changed = pyqtSignal(bool)
+
+
+def chunks(data: bytes, rng: random.Random, max_size: int = 64):
+    index = 0
+    while index < len(data):
+        size = rng.randint(1, max_size)
+        yield data[index:index + size]
+        index += size
+
+def text_stream(frames: list[dict]):
+    # Readers end lines with CRLF, the simulator with LF
+    endings = ("\r\n", "\n")
+    return b"".join(f"IUD:str({frame['IUD']})|{endings[index % 2]}".encode() for index, frame in enumerate(frames))
+
+def make_comm_system():
+    device = _Device()
+    received: list[dict] = []
+    device.data.connect(received.append)
+    
+    comm_system = BaseCommSystem(CommDevice(LiveData(device.data), device.connection_changed, "test"), print)
+    comm_system._device = device  # Keeps the signals alive
+    
+    return comm_system, received
+
+
+@pytest.mark.parametrize("seed", range(25))
+def test_line_buffer_random_chunks(seed: int):
+    rng = random.Random(seed)
+    lines = [bytes(rng.randrange(32, 127) for _ in range(rng.randint(0, 80))) for _ in range(200)]
+    
+    buffer = LineFrameBuffer()
+    got = [line for chunk in chunks(b"".join(line + b"\n" for line in lines), rng) for line in buffer.feed(chunk)]
+    
+    assert got == lines
+    assert buffer.drain() == b""
+
+@pytest.mark.parametrize("seed", range(25))
+def test_binary_decoder_random_chunks(seed: int):
+    rng = random.Random(seed)
+    
+    decoder = BinaryFrameDecoder()
+    got = [frame for chunk in chunks(b"".join(map(encode_binary_frame, BINARY_FRAMES)), rng) for frame in decoder.feed(chunk)]
+    
+    assert got == BINARY_FRAMES
+    assert decoder.crc_errors == 0
+
+@pytest.mark.parametrize("seed", range(25))
+def test_stream_switches_to_binary_mid_read(seed: int):
+    rng = random.Random(seed)
+    stream = text_stream(TEXT_FRAMES) + HANDSHAKE_REPLY + b"".join(map(encode_binary_frame, BINARY_FRAMES))
+    
+    comm_system, received = make_comm_system()
+    comm_system.set_binary(True)
+    comm_system._reset_protocol()
+    for chunk in chunks(stream, rng):
+        comm_system._stream_data_process(chunk)
+    
+    assert received == [*TEXT_FRAMES, {"PROTOCOL": "BINARY"}, *BINARY_FRAMES]
+    assert comm_system.binary_active
+    assert comm_system.frame_errors == 0
+
+def test_line_buffer_overflow():
+    buffer = LineFrameBuffer()
+    
+    assert list(buffer.feed(b"x" * (64 * 1024 + 1))) == []
+    assert buffer.overflows == 1
+    assert buffer.drain() == b""
+    
+    # The stream picks up again at the next delimiter after the dropped run
+    assert list(buffer.feed(b"tail of the noise\nIUD:str(A)|\n")) == [b"tail of the noise", b"IUD:str(A)|"]
+
+def test_stream_recovers_after_overflow():
+    comm_system, received = make_comm_system()
+    
+    comm_system._stream_data_process(b"\xff" * (64 * 1024 + 1))
+    comm_system._stream_data_process(b"\nIUD:str(A)|\r\n")
+    
+    assert received == [{"IUD": "A"}]
+    assert comm_system.line_buffer.overflows == 1
+
+@pytest.mark.parametrize("seed", range(10))
+def test_binary_decoder_resyncs_after_corrupt_frame(seed: int):
+    rng = random.Random(seed)
+    frames = [encode_binary_frame(frame) for frame in BINARY_FRAMES[:30]]
+    
+    corrupt = bytearray(frames[10])
+    corrupt[rng.randrange(4, len(corrupt) - 2)] ^= 0xFF  # Somewhere in the payload
+    frames[10] = bytes(corrupt)
+    
+    decoder = BinaryFrameDecoder()
+    got = [frame for chunk in chunks(b"".join(frames), rng) for frame in decoder.feed(chunk)]
+    
+    assert got == BINARY_FRAMES[:10] + BINARY_FRAMES[11:30]
+    assert decoder.crc_errors >= 1
+
+def test_bad_text_frame_is_skipped():
+    comm_system, received = make_comm_system()
+    
+    comm_system._stream_data_process(b"IUD:str(A)|\r\nIUD:str(\xff\xfe)|\r\nIUD:bogus(1)|\r\nIUD:str(B)|\r\n")
+    
+    assert received == [{"IUD": "A"}, {"IUD": "B"}]
+    assert comm_system.frame_errors == 2
+
+def test_text_mode_sends_each_command_bare():
+    comm_system, _ = make_comm_system()
+    comm_system.send_message("SAFETY")
+    comm_system.send_message("SAFETY:30")
+    
+    writes: list[bytes] = []
+    comm_system._send_pending(writes.append)
+    
+    assert writes == [b"SAFETY", b"SAFETY:30"]
+
+def test_binary_mode_sends_newline_terminated_batches():
+    comm_system, _ = make_comm_system()
+    comm_system.set_binary(True)
+    comm_system._reset_protocol()
+    
+    writes: list[bytes] = []
+    comm_system._send_pending(writes.append)
+    
+    # Commands only get a terminator once the device has answered the handshake
+    comm_system._stream_data_process(HANDSHAKE_REPLY)
+    comm_system.send_message("SAFETY:30")
+    comm_system.send_message("SECURITY")
+    comm_system._send_pending(writes.append)
+    
+    assert writes == [BINARY_HANDSHAKE.encode(), b"SAFETY:30\nSECURITY\n"]
+
+@pytest.mark.parametrize("data, frame", [
+    ("IUD:str(04A3B2C1D0)", {"IUD": "04A3B2C1D0"}),
+    ("Gas:number(312)|Fire:number(0)|", {"Gas": 312.0, "Fire": 0.0}),
+    (" Room : str(Lab (B)) | Temp: number( 21.5 ) ", {"Room": "Lab (B)", "Temp": 21.5}),
+    ("IUD:str(A)|angles:collection(number(1),number(2))|Fire:number(1)", {"IUD": "A", "angles": [1.0, 2.0], "Fire": 1.0}),
+    ("Mixed:collection(str(a),number(2),collection())", {"Mixed": ["a", 2.0, []]}),
+])
+def test_parse_frame(data: str, frame: dict):
+    assert parse_frame(data) == frame
+
+@pytest.mark.parametrize("data", ["IUD:str(A)B", "IUD:str(A),Fire:number(1)", "Gas:number(x)", "IUD str(A)", "IUD:text(A)"])
+def test_parse_frame_rejects_malformed(data: str):
+    with pytest.raises(Exception):
+        parse_frame(data)
@@ -0,0 +1,81 @@
+import pytest
+from models.collection_data_models import *
+from storage import AttendanceDatabase
+
+START = AttendanceEntry.at(2025, 1, 6, 7).timestamp
+
+
+def make_data():
+    name = CharacterName("Sur", "First", "Middle", "Abbr")
+    teachers = {f"t{i}": Teacher(f"t{i}", f"T{i}", name, Department("d", "Dept"), [], "img.png", []) for i in range(3)}
+    prefects = {f"p{i}": Prefect(f"p{i}", f"P{i}", name, "Post", Class("c", "SS3", "A", "SS3 A"), "img.png", {}, []) for i in range(3)}
+    
+    entry = AttendanceEntry.at(2025, 1, 6)
+    return AppData(Time(7, 0, 0), Time(8, 0, 0), (entry, entry), (entry, entry), [], teachers, prefects)
+
+def tap_all(data: AppData, offset: int):
+    for index, staff in enumerate([*data.teachers.values(), *data.prefects.values()]):
+        data.add_attendance(staff, START + offset + index, f"gate-{index % 2}")
+
+def reopen(path):
+    database = AttendanceDatabase(path)
+    data = database.load()
+    database.open_journal(data)
+    
+    return database, data
+
+@pytest.fixture
+def opened(tmp_path):
+    database = AttendanceDatabase(tmp_path / "attendance.db")
+    data = make_data()
+    database.save(data)
+    database.open_journal(data)
+    
+    yield database, data
+    
+    database.close()
+
+
+def test_card_link_survives_a_crash(opened, tmp_path):
+    _, data = opened
+    data.assign_iud(data.teachers["t1"], "NEWCARD")
+    
+    # No save and no close, as if the app died right after the card was linked
+    crashed = AttendanceDatabase(tmp_path / "attendance.db")
+    loaded = crashed.load()
+    crashed.close()
+    
+    assert loaded.teachers["t1"].IUD == "NEWCARD"
+    assert loaded.staff_by_iud("NEWCARD") is loaded.teachers["t1"]
+
+def test_taps_after_save_as_survive_a_restart(opened, tmp_path):
+    database, data = opened
+    tap_all(data, 0)
+    
+    # What SaveManager.save_as runs on its worker
+    database.write_changes(database.take_changes())
+    exported = database.export(str(tmp_path / "copy.db"))
+    
+    tap_all(data, 100)
+    data.assign_iud(data.prefects["p2"], "AFTER")
+    database.close()
+    
+    # The next launch opens the same database again, it has everything
+    database, data = reopen(tmp_path / "attendance.db")
+    assert len(data.attendance_data) == 12
+    assert [entry.timestamp - START for entry in data.teachers["t0"].attendance] == [0, 100]
+    assert data.prefects["p2"].IUD == "AFTER"
+    database.close()
+    
+    # The copy has what there was at the Save As
+    copy, copied = reopen(tmp_path / "copy.db")
+    assert exported["attendance"] == len(copied.attendance_data) == 6
+    assert copied.prefects["p2"].IUD == "P2"
+    
+    # Writing to the copy leaves the original alone
+    tap_all(copied, 200)
+    copy.close()
+    
+    database, data = reopen(tmp_path / "attendance.db")
+    assert len(data.attendance_data) == 12
+    database.close()
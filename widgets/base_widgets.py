@@ -94,6 +94,22 @@ class LabeledField(QWidget):
     def get_widget(self):
         return self.widget.findChild(QWidget)
 
+class LazyWidget(QWidget):
+    # Builds the page the first time it is shown, so pages over the whole attendance history don't load it at startup
+    def __init__(self, build: Callable[[], QWidget], parent=None):
+        super().__init__(parent)
+        self.build = build
+        
+        self.main_layout = QVBoxLayout(self)
+        self.main_layout.setContentsMargins(0, 0, 0, 0)
+    
+    def showEvent(self, a0):
+        if self.build is not None:
+            build, self.build = self.build, None
+            self.main_layout.addWidget(build())
+        
+        super().showEvent(a0)
+
 class CharacterNameWidget(QWidget):
     def __init__(self, name: CharacterName):
         super().__init__()
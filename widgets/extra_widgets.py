@@ -1,8 +1,10 @@
 
+import numpy as np
 from typing import Literal
+from calendar import monthrange
 from PyQt6.QtWidgets import (
     QWidget, QVBoxLayout, QPushButton,
-    QLabel, QStackedWidget
+    QLabel, QStackedWidget, QMessageBox
 )
 
 from PyQt6.QtCore import Qt
@@ -78,71 +80,55 @@ class StaffDataWidget(BaseExtraWidget):
             graph_title = f"{staff.name.sur} {staff.name.first}'s Monthly Cummulative Punctuality Graph"
             week_days = list(set(flatten([[day for day, _ in s.periods] for s in staff.subjects])))
             timeline_dates = self.data.teacher_timeline_dates
+            cit = self.data.teacher_cit
         elif isinstance(staff, Prefect):
             bar_title = f"{staff.name.sur} {staff.name.first}'s ({staff.post_name}) Monthly Cummulative Attendance Chart"
             graph_title = f"{staff.name.sur} {staff.name.first}'s ({staff.post_name}) Monthly Average Punctuality Graph"
             week_days = list(staff.duties.keys())
             timeline_dates = self.data.prefect_timeline_dates
+            cit = self.data.prefect_cit
         
-        months = []
-        percentile_values = []
+        # The staff member's taps on the local clock, split into months by NumPy instead of an entry per tap
+        local = local_timestamps(staff.attendance.timestamps())
+        months, month_of_tap, monthly_attendance = np.unique(local_months(local), return_inverse=True, return_counts=True)
+        month_names = [month_label(month) for month in months.tolist()]
         
         self.attendance_widget = BarWidget(bar_title, "Time (Months)", "Attendace (%)")
         self.attendance_widget.bar_canvas.axes.set_ylim(0, 100)
         
-        if staff.attendance:
-            monthly_attendance_data = {}
-            for attendance in staff.attendance:
-                monthly_attendance_data[f"{attendance.month} {attendance.year}"] = monthly_attendance_data.get(f"{attendance.month} {attendance.year}", 0) + 1
+        if len(local):
+            start = timeline_dates[0]
+            month_end = AttendanceEntry.at(start.year, start.month_number, monthrange(start.year, start.month_number)[1], start.time.hour, start.time.min)
+            monthly_dta = get_attendance_days(start, month_end, week_days)
             
-            for date, monthly_attendance in monthly_attendance_data.items():
-                month_end = AttendanceEntry(**timeline_dates[1])
-                month_end.date = MONTHS_OF_THE_YEAR[timeline_dates[0].day]
-                month_end.year = timeline_dates[0].year
-                month_end.day = DAYS_OF_THE_WEEK[DAYS_OF_THE_WEEK.index(timeline_dates[0].day) + ((month_end.date - timeline_dates[0].date) % 7)]
-                start_week_amt, rem_days = get_attendance_time_interval(timeline_dates[0], month_end)
-                monthly_dta = (start_week_amt * len(week_days)) + len([d for d in week_days if d in rem_days])
-                
-                months.append(date)
-                percentile_values.append(monthly_attendance * 100 / monthly_dta)
-            
-            self.attendance_widget.add_data(f"{staff.name} Attendance Data", "red", (months, percentile_values))
+            self.attendance_widget.add_data(f"{staff.name} Attendance Data", "red", (month_names, (monthly_attendance * 100 / monthly_dta).tolist()))
         
         self.main_layout.addWidget(self.attendance_widget)
         
         self.punctuality_widget = GraphWidget(graph_title, "Time", "Punctuality (Minutes)")
         
-        if staff.attendance:
-            prev_date = f"{staff.attendance[0].month} {staff.attendance[0].year}"
-            
-            date_months_mapping: dict[str, list[tuple[int, Time]]] = {}
-            for attendance in staff.attendance:
-                date = f"{attendance.month} {attendance.year}"
-                
-                if date != prev_date:
-                    date_months_mapping[date] = [(attendance.date, attendance.time)]
-                else:
-                    date_months_mapping[date].append((attendance.date, attendance.time))
-                
-                prev_date = date
+        if len(local):
+            # Day of the month of each tap, from the first day of its month
+            month_first_days = months.astype("datetime64[M]").astype("datetime64[D]").astype(np.int64)
+            dates = local // 86400 - month_first_days[month_of_tap] + 1
             
-            plot_data: list[tuple[str, list[float]]] = []
-            for date, month_time in date_months_mapping.items():
-                x_data = [date for date, _ in month_time]
-                months_data = [(((self.data.prefect_cit.hour - t.hour) * 60) + (self.data.prefect_cit.min - t.min) + ((self.data.prefect_cit.hour - t.hour) / 60)) for _, t in month_time]
-                plot_data.append((date, x_data, months_data))
+            seconds = local % 86400
+            punctuality = (cit.hour - seconds // 3600) * 60 + (cit.min - seconds // 60 % 60) + (cit.sec - seconds % 60) / 60
             
-            for index, (date, x, y) in enumerate(plot_data):
-                self.punctuality_widget.plot(x, y, label=date, marker='o', color=list(get_named_colors_mapping().values())[index])
+            for index, date in enumerate(month_names):
+                in_month = month_of_tap == index
+                self.punctuality_widget.plot(dates[in_month].tolist(), punctuality[in_month].tolist(), label=date, marker='o', color=list(get_named_colors_mapping().values())[index])
         
         self.main_layout.addWidget(self.punctuality_widget)
 
 class CardScanScreenWidget(BaseExtraWidget):
     comm_signal = pyqtSignal(str)
     
-    def __init__(self, comm_device: BaseCommSystem, parent_widget: QStackedWidget):
+    def __init__(self, data: AppData, comm_device: BaseCommSystem, parent_widget: QStackedWidget):
         super().__init__(parent_widget, "static")
         
+        self.data = data
+        
         self.setStyleSheet("""
             QLabel {
                 font-size: 30px;
@@ -187,7 +173,12 @@ class CardScanScreenWidget(BaseExtraWidget):
     
     def scanned(self, data: str):
         if self.parent_widget.indexOf(self) == self.parent_widget.currentIndex():
-            self.staff.IUD = data
+            try:
+                self.data.assign_iud(self.staff, data)
+            except Exception as e:
+                QMessageBox.warning(self, "Card already linked", str(e))
+                return
+            
             self.iud_label.setText(self.staff.IUD)
             
             self.finished()
@@ -7,6 +7,8 @@ from PyQt6.QtWidgets import (
 )
 
 import time
+import logging
+import numpy as np
 from communication import BaseCommSystem
 from typing import Literal
 from PyQt6.QtCore import Qt
@@ -109,13 +111,15 @@ class BaseListWidget(QWidget):
 
 
 class AttendanceWidget(BaseListWidget):
-    comm_signal = pyqtSignal(str)
+    comm_signal = pyqtSignal(str, str, object)  # IUD, reader id, epoch seconds at read (object, an int signal is C int)
     
     def __init__(self, data: AppData, comm_system: BaseCommSystem):
         super().__init__()
         
         self.data = data
         self.attendance_dict = {}
+        self.debouncer = ScanDebouncer({Teacher: 60.0, Prefect: 30.0})
+        self.comm_log = comm_system.log
         
         _, cit_layout = create_widget(self.main_layout, QHBoxLayout)
         
@@ -137,13 +141,15 @@ class AttendanceWidget(BaseListWidget):
         
         _, self.attendance_layout = create_widget(self.main_layout, QVBoxLayout)
         
-        for attendance in self.data.attendance_data:
+        # Today's taps, the rest of the history stays on disk until a chart or staff page reads it
+        year, month, date = time.localtime()[:3]
+        for attendance in self.data.attendance_data.between(AttendanceEntry.at(year, month, date).timestamp, AttendanceEntry.at(year, month, date + 1).timestamp):
             self.add_attendance_log(attendance)
         
         self.main_layout.addStretch()
         
-        self.comm_signal.connect(self.add_new_attendance_log)
-        comm_system.set_data_point("IUD", self.comm_signal)
+        self.comm_signal.connect(comm_system.metrics.timed_slot("attendance", self.add_new_attendance_log))
+        comm_system.set_data_point("IUD", self.comm_signal, with_reader=True, with_time=True)
     
     def add_attendance_log(self, attendance_entry: AttendanceEntry):
         if isinstance(attendance_entry.staff, Teacher):
@@ -155,24 +161,19 @@ class AttendanceWidget(BaseListWidget):
         
         self.attendance_layout.addWidget(widget)
     
-    def add_new_attendance_log(self, IUD: str):
-        staff = next((prefect for _, prefect in self.data.prefects.items() if prefect.IUD == IUD), None)
-        if staff is None:
-            staff = next((teacher for _, teacher in self.data.teachers.items() if teacher.IUD == IUD), None)
+    def add_new_attendance_log(self, IUD: str, reader_id: str | None = None, read_time: int | None = None):
+        staff = self.data.staff_by_iud(IUD)
         
         if staff is not None:
-            day, month, date, t, year = time.ctime().split()
-            hour, min, sec = t.split(":")
+            if not self.debouncer.accept(IUD, staff):
+                self.comm_log.log(logging.DEBUG, f"Duplicate tap from {IUD} suppressed ({self.debouncer.suppressed} so far)", reader_id or "")
+                return
             
-            day = next((dotw for dotw in DAYS_OF_THE_WEEK if day in dotw))
-            month = next((moty for moty in MONTHS_OF_THE_YEAR if month in moty))
-            
-            entry = AttendanceEntry(Time(int(hour), int(min), int(sec)), day, int(date), month, int(year), staff)
+            # Stored once, staff.attendance sees the new row through its view
+            # Stamped in the comm thread, so a busy GUI doesn't make taps look late
+            entry = self.data.add_attendance(staff, read_time if read_time else int(time.time()), reader_id)
             
             self.add_attendance_log(entry)
-            
-            staff.attendance.append(entry)
-            self.data.attendance_data.append(entry)
 
 
 class PrefectEditorWidget(BaseListWidget):
@@ -203,25 +204,23 @@ class AttendanceBarWidget(BaseListWidget):
         prefect_names = []
         prefects_attendance_data = []
         
-        prefect_interval = get_attendance_time_interval(*data.prefect_timeline_dates)
-        teacher_interval = get_attendance_time_interval(*data.teacher_timeline_dates)
+        # One bincount over the staff column instead of an entry per tap
+        counts = data.attendance_data.counts()
         
-        for staff_attendance_data in data.attendance_data:
-            if isinstance(staff_attendance_data.staff, Prefect):
-                percentage_attendance = self.get_percentage_attendance(staff_attendance_data.staff.attendance, list(staff_attendance_data.staff.duties.keys()), prefect_interval)
-                
-                prefect_names.append(staff_attendance_data.staff.name)
-                prefects_attendance_data.append(percentage_attendance)
-            elif isinstance(staff_attendance_data.staff, Teacher):
-                days_tba = list(set(flatten([[day for day, _ in s.periods] for s in staff_attendance_data.staff.subjects])))
-                
-                percentage_attendance = self.get_percentage_attendance(staff_attendance_data.staff.attendance, days_tba, teacher_interval)
+        for prefect in data.prefects.values():
+            attendance_count = counts[prefect.attendance.staff_index]
+            if attendance_count:
+                prefect_names.append(prefect.name)
+                prefects_attendance_data.append(self.get_percentage_attendance(attendance_count, list(prefect.duties.keys()), data.prefect_timeline_dates))
+        
+        for teacher in data.teachers.values():
+            attendance_count = counts[teacher.attendance.staff_index]
+            if attendance_count:
+                days_tba = list(set(flatten([[day for day, _ in s.periods] for s in teacher.subjects])))
                 
-                if staff_attendance_data.staff.department.id in teacher_data:
-                    teacher_data[staff_attendance_data.staff.department.id][1][0].append(staff_attendance_data.staff.name)
-                    teacher_data[staff_attendance_data.staff.department.id][1][1].append(percentage_attendance)
-                else:
-                    teacher_data[staff_attendance_data.staff.department.id] = (staff_attendance_data.staff.department.name, [(staff_attendance_data.staff.name), percentage_attendance])
+                names, percentages = teacher_data.setdefault(teacher.department.id, (teacher.department.name, ([], [])))[1]
+                names.append(teacher.name)
+                percentages.append(self.get_percentage_attendance(attendance_count, days_tba, data.teacher_timeline_dates))
         
         if prefects_attendance_data:
             prefect_info_widget = BarWidget("Cummulative Prefect Attendance", "Prefect Names", "Yearly Attendance (%)")
@@ -249,11 +248,10 @@ class AttendanceBarWidget(BaseListWidget):
             label.setAlignment(Qt.AlignmentFlag.AlignCenter)
             self.main_layout.addWidget(LabeledField("Teacher Attendance", label, height_size_policy=QSizePolicy.Policy.Maximum), alignment=Qt.AlignmentFlag.AlignTop)
     
-    def get_percentage_attendance(self, attendance: list[AttendanceEntry], valid_attendance_days: list[str], interval: tuple[int, int]):
-        remainder_days = sum([day in valid_attendance_days for day in DAYS_OF_THE_WEEK[:interval[1] + 1]])
-        max_attendance = (len(valid_attendance_days) * interval[0]) + remainder_days
+    def get_percentage_attendance(self, attendance_count: int, valid_attendance_days: list[str], timeline_dates: tuple[AttendanceEntry, AttendanceEntry]):
+        max_attendance = get_attendance_days(*timeline_dates, valid_attendance_days)
         
-        percentage_attendance = len(attendance) * 100 / max_attendance
+        percentage_attendance = int(attendance_count) * 100 / max_attendance
         
         return percentage_attendance
 
@@ -266,11 +264,16 @@ class PunctualityGraphWidget(BaseListWidget):
         teacher_data = {}
         prefects_data = {}
         
-        for staff_attendance_data in self.data.attendance_data:
-            if isinstance(staff_attendance_data.staff, Prefect):
-                prefects_data[staff_attendance_data.staff.IUD] = self.get_punctuality_data(staff_attendance_data.staff)
-            elif isinstance(staff_attendance_data.staff, Teacher):
-                teacher_data[staff_attendance_data.staff.department.id][1][staff_attendance_data.staff.IUD] = self.get_punctuality_data(staff_attendance_data.staff)
+        # Every tap moved onto the local clock at once, each staff member's weeks are then sums over their rows
+        local = local_timestamps(self.data.attendance_data.column("timestamp"))
+        
+        for prefect in self.data.prefects.values():
+            if len(prefect.attendance):
+                prefects_data[prefect.IUD] = self.get_punctuality_data(prefect, local, self.data.prefect_cit)
+        
+        for teacher in self.data.teachers.values():
+            if len(teacher.attendance):
+                teacher_data.setdefault(teacher.department.id, (teacher.department.name, {}))[1][teacher.IUD] = self.get_punctuality_data(teacher, local, self.data.teacher_cit)
         
         # sub_data = {
         #     "prefect_id 1": ("Emma", [0, 0, 0, 1, 1, 2, 2, -1, -1, -3, 0, -2, 0, 0, 1, 1, 1, 2, 2, 3, 3, 3]),
@@ -309,31 +312,18 @@ class PunctualityGraphWidget(BaseListWidget):
             label.setAlignment(Qt.AlignmentFlag.AlignCenter)
             self.main_layout.addWidget(LabeledField("Departmental Punctuality", label, height_size_policy=QSizePolicy.Policy.Maximum), alignment=Qt.AlignmentFlag.AlignTop)
     
-    def get_punctuality_data(self, staff: Teacher | Prefect):
-        prefects_plot_data: list[float] = []
-        
-        weeks: list[list[Time]] = []
-        
-        prev_day = DAYS_OF_THE_WEEK[0]
-        prev_dt = 1
-        
-        for attendance in staff.attendance:
-            if ((DAYS_OF_THE_WEEK.index(attendance.day) > DAYS_OF_THE_WEEK.index(prev_day)) or
-                (prev_dt != attendance.date and
-                 DAYS_OF_THE_WEEK.index(attendance.day) == DAYS_OF_THE_WEEK.index(prev_day))
-                ):
-                weeks.append([attendance.time])
-            else:
-                weeks[-1].append(attendance.time)
-            
-            prev_day = attendance.day
-            prev_dt = attendance.date
+    def get_punctuality_data(self, staff: Teacher | Prefect, local: np.ndarray, cit: Time):
+        staff_local = local[staff.attendance.rows()]
+        
+        seconds = staff_local % 86400
+        hours, minutes, secs = seconds // 3600, seconds // 60 % 60, seconds % 60
+        punctuality = (cit.hour - hours) * 60 + (cit.min - minutes) * 60 + (cit.sec - secs) / 60
         
-        for week_time in weeks:
-            weekly_punctuality = sum([(self.data.prefect_cit.hour - t.hour) * 60 + (self.data.prefect_cit.min - t.min) * 60 + (self.data.prefect_cit.sec - t.sec) / 60 for t in week_time])
-            prefects_plot_data.append(weekly_punctuality)
+        # A week starts wherever the week number changes from the tap before
+        weeks = (staff_local // 86400 + 3) // 7
+        week_starts = np.flatnonzero(np.diff(weeks, prepend=weeks[0] - 1))
         
-        return staff.name, prefects_plot_data
+        return staff.name, np.add.reduceat(punctuality, week_starts).tolist()
 
 
 
@@ -375,7 +365,7 @@ class _SensorMetaInfoWidget(QWidget):
         self.main_layout.addWidget(LabeledField("Meta Info", widget_2_1, QSizePolicy.Policy.Maximum, QSizePolicy.Policy.Maximum))
 
 class SensorWidget(QWidget):
-    comm_signal = pyqtSignal(int)
+    comm_signal = pyqtSignal(float)
     
     def __init__(self, sensor: Sensor):
         super().__init__()
@@ -405,8 +395,8 @@ class SensorWidget(QWidget):
         
         self.reading_slider = QSlider(Qt.Orientation.Horizontal)
         
-        self.comm_signal.connect(lambda data: self.reading_slider.setValue(data))
-        self.sensor.comm_system.set_data_point(sensor.meta_data.sensor_type, self.comm_signal)
+        self.comm_signal.connect(lambda data: self.reading_slider.setValue(int(data)))
+        self.sensor.comm_system.set_data_point(sensor.meta_data.sensor_type, self.comm_signal, coalesce=True)
         
         self.reading_slider.setDisabled(True)
         self.reading_slider.setValue(0)
@@ -473,7 +463,7 @@ class UltrasonicSonarWidget(QWidget):
         safety_slider.valueChanged.connect(self.safety_slider_moved)
         
         self.cmm_signal.connect(lambda args: self.sonar_widget.update_sonar(args[0], args[1]))
-        self.sonar.comm_system.set_data_point(("angles", "distances"), self.cmm_signal)
+        self.sonar.comm_system.set_data_point(("angles", "distances"), self.cmm_signal, coalesce=True)
         
         sonar_layout.addWidget(self.sonar_widget)
         sonar_layout.addWidget(LabeledField("Safety Distance", safety_slider, QSizePolicy.Policy.Minimum, QSizePolicy.Policy.Maximum))